@@ -0,0 +1,175 @@
+# aggregation.py
+
+from itertools import combinations
+
+import numpy as np
+
+from fact_store import MISSING
+
+MEASURES = ["sum", "avg", "count"]
+
+# Acima deste número de células o índice misto é compactado com np.unique,
+# evitando alocar arrays do tamanho do produto cartesiano das dimensões.
+DENSE_GROUP_LIMIT = 1 << 22
+# Mesmo abaixo do limite, o caminho denso só compensa quando o produto cartesiano não é
+# muito maior que o número de linhas (arrays esparsos custam memória e o flatnonzero final)
+DENSE_GROUP_FACTOR = 4
+DENSE_GROUP_MIN = 1 << 12
+
+
+def dense_groups(size, rows):
+    """True se `size` células cabem em arrays densos para agrupar `rows` linhas."""
+    return size <= min(DENSE_GROUP_LIMIT, max(DENSE_GROUP_MIN, DENSE_GROUP_FACTOR * rows))
+
+
+def group_index(code_arrays, cardinalities):
+    """
+    Converte os códigos de 1..n dimensões em um único índice de grupo (base mista):
+    idx = ((c0 * card1) + c1) * card2 + c2 ...
+
+    Retorna (índice int64, máscara das linhas válidas). Linhas em que alguma
+    dimensão está ausente (MISSING) ficam de fora do agrupamento.
+    """
+    n = len(code_arrays[0]) if code_arrays else 0
+    flat = np.zeros(n, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    for codes, card in zip(code_arrays, cardinalities):
+        valid &= codes != MISSING
+        flat *= card
+        flat += codes
+    if not valid.all():
+        flat = flat[valid]
+    return flat, valid
+
+
+def grouped_sum_count(flat, values, size, counts=None):
+    """
+    Soma e contagem por grupo em uma única passada (np.bincount).
+    Se `counts` for informado, os valores já são somas parciais e as contagens
+    são somadas como pesos (roll-up de acumuladores).
+    """
+    sums = np.bincount(flat, weights=values, minlength=size)
+    if counts is None:
+        counts = np.bincount(flat, minlength=size)
+    else:
+        counts = np.bincount(flat, weights=counts, minlength=size).astype(np.int64)
+    return sums, counts
+
+
+def group_partials(code_arrays, cardinalities, values, counts=None):
+    """
+    Estado parcial mesclável de uma agregação: (índice plano dos grupos não vazios,
+    somas, contagens). Partes calculadas sobre fatias distintas dos fatos podem ser
+    combinadas com `merge_partials`.
+    """
+    flat, valid = group_index(code_arrays, cardinalities)
+    if not valid.all():
+        values = values[valid]
+        if counts is not None:
+            counts = counts[valid]
+
+    size = int(np.prod(cardinalities, dtype=np.int64)) if cardinalities else 1
+    if dense_groups(size, len(flat)):
+        sums, counts = grouped_sum_count(flat, values, size, counts)
+        groups = np.flatnonzero(counts)
+        return groups, sums[groups], counts[groups]
+    groups, inverse = np.unique(flat, return_inverse=True)
+    sums, counts = grouped_sum_count(inverse, values, len(groups), counts)
+    return groups, sums, counts
+
+
+def merge_partials(partials, cardinalities):
+    """Combina estados parciais (grupos, somas, contagens) no formato de `aggregate_codes`."""
+    flat = np.concatenate([p[0] for p in partials])
+    sums = np.concatenate([p[1] for p in partials])
+    counts = np.concatenate([p[2] for p in partials])
+    groups, inverse = np.unique(flat, return_inverse=True)
+    sums, counts = grouped_sum_count(inverse, sums, len(groups), counts)
+    return unravel_groups(groups, cardinalities), sums, counts
+
+
+def unravel_groups(groups, cardinalities):
+    """Índice plano dos grupos -> lista de arrays de códigos (um por dimensão)."""
+    return list(np.unravel_index(groups, cardinalities)) if cardinalities else []
+
+
+def aggregate_codes(code_arrays, cardinalities, values, counts=None):
+    """
+    Agrupa os valores pelas dimensões codificadas.
+
+    Retorna (grupos, somas, contagens): `grupos` é a lista de arrays de códigos
+    (um por dimensão) dos grupos não vazios, alinhada com somas/contagens.
+    Com `counts`, reagrupa acumuladores já agregados (roll-up).
+    """
+    groups, sums, counts = group_partials(code_arrays, cardinalities, values, counts)
+    return unravel_groups(groups, cardinalities), sums, counts
+
+
+def apply_measure(sums, counts, measure):
+    """Calcula a medida final a partir dos acumuladores (soma, contagem)."""
+    if measure == "sum":
+        return sums
+    elif measure == "avg":
+        return sums / counts
+    else: # count
+        return counts
+
+
+def build_result(group_codes, dictionaries, measure_values):
+    """Monta o dict {(valor_dim1, ...): medida} consumido pela UI e pelo visualizer."""
+    columns = [[values[c] for c in codes.tolist()] for codes, values in zip(group_codes, dictionaries)]
+    keys = zip(*columns) if columns else [()] * len(measure_values)
+    return dict(zip(keys, measure_values.tolist()))
+
+
+def cube_sets(dims):
+    """Conjuntos de agrupamento de CUBE(dims): todos os subconjuntos, do mais fino ao total geral ()."""
+    return [combo for k in range(len(dims), -1, -1) for combo in combinations(dims, k)]
+
+
+def rollup_sets(dims):
+    """Conjuntos de ROLLUP(dims): prefixos (a, b, c), (a, b), (a,) e o total geral ()."""
+    return [tuple(dims[:k]) for k in range(len(dims), -1, -1)]
+
+
+def grand_total(sums, counts):
+    """Acumuladores do total geral () no formato de aggregate_codes (um grupo, ou nenhum se vazio)."""
+    if not counts.sum():
+        return [], sums[:0], counts[:0]
+    return [], np.array([sums.sum()]), np.array([counts.sum()], dtype=np.int64)
+
+
+def pivot_table(dims, measure, answers):
+    """
+    Tabela dinâmica com subtotais a partir das respostas de um CUBE(dims)
+    ({(dimensões, medida): (resultado, erro)}, ver OLAPModel.aggregate_sets).
+
+    Linhas: combinações de dims[:-1] (com subtotal a cada valor da primeira quando
+    são duas) e o total geral; colunas: valores de dims[-1] e o total da linha.
+    Com uma só dimensão, as linhas são os seus valores e a coluna é a medida.
+
+    Returns:
+        (cabeçalho, linhas): cada linha é (rótulos, valores, subtotal?); None = célula vazia.
+    """
+    def result(ds):
+        return answers.get((tuple(ds), measure), (None, None))[0] or {}
+
+    row_dims, col_dims = (list(dims), []) if len(dims) == 1 else (list(dims[:-1]), [dims[-1]])
+    columns = [k[0] for k in result(col_dims)] if col_dims else []
+    full, row_totals = result(dims), result(row_dims)
+    header = row_dims + [str(c) for c in columns] + ["TOTAL" if columns else measure]
+
+    rows = []
+    keys = list(row_totals)
+    subtotals, first_totals = result(row_dims[:1] + col_dims), result(row_dims[:1])
+    for i, key in enumerate(keys):
+        rows.append((list(key), [full.get(key + (c,)) for c in columns] + [row_totals[key]], False))
+        # Fim do bloco de um valor da primeira dimensão: subtotal
+        if len(row_dims) == 2 and (i + 1 == len(keys) or keys[i + 1][0] != key[0]):
+            rows.append(([key[0], "Subtotal"], [subtotals.get((key[0], c)) for c in columns]
+                         + [first_totals.get((key[0],))], True))
+
+    totals = result(col_dims)
+    rows.append((["TOTAL"] + [""] * (len(row_dims) - 1),
+                 [totals.get((c,)) for c in columns] + [result([]).get(())], True))
+    return header, rows
@@ -0,0 +1,129 @@
+# background.py
+
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+
+class Cancelled(Exception):
+    """Levantada dentro de uma tarefa quando o usuário pede o cancelamento."""
+
+
+class Task:
+    """Operação em execução no worker; a função recebe a Task para reportar progresso e checar cancelamento."""
+
+    def __init__(self, description, events):
+        self.description = description
+        self._events = events
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check(self):
+        """Interrompe a tarefa (Cancelled) se o cancelamento foi pedido."""
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def progress(self, message, fraction=None):
+        """Envia uma mensagem de progresso à UI (fraction em 0..1 ou None = indeterminado)."""
+        self.check()
+        self._events.put(("progress", self, (message, fraction)))
+
+
+class BackgroundRunner:
+    """
+    Executa operações do modelo em uma thread de trabalho, uma por vez e na ordem
+    de envio, e devolve resultados/progresso para a thread do Tk via `root.after`.
+    Nenhum callback é chamado fora da thread do Tk.
+    """
+
+    # Intervalo de consulta da fila (~60 quadros por segundo)
+    POLL_MS = 16
+
+    def __init__(self, root, on_state=None, on_progress=None):
+        self.root = root
+        self.on_state = on_state
+        self.on_progress = on_progress
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="olap-worker")
+        self._events = queue.Queue()
+        self._tasks = []
+        self.root.after(self.POLL_MS, self._poll)
+
+    @property
+    def busy(self):
+        return bool(self._tasks)
+
+    def submit(self, description, fn, on_done=None, on_error=None, on_cancel=None):
+        """Agenda fn(task) no worker; on_done(resultado) / on_error(exc) / on_cancel() rodam na thread do Tk."""
+        task = Task(description, self._events)
+        self._tasks.append(task)
+        self._executor.submit(self._run, task, fn, (on_done, on_error, on_cancel))
+        return task
+
+    def cancel(self):
+        """Cancela a tarefa em execução e as que aguardam na fila."""
+        for task in self._tasks:
+            task.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _run(self, task, fn, callbacks):
+        if task.cancelled:
+            self._events.put(("cancelled", task, callbacks))
+            return
+        self._events.put(("started", task, None))
+        try:
+            result = fn(task)
+            task.check()
+        except Cancelled:
+            self._events.put(("cancelled", task, callbacks))
+        except Exception as e:
+            self._events.put(("error", task, (callbacks, e)))
+        else:
+            self._events.put(("done", task, (callbacks, result)))
+
+    def _poll(self):
+        try:
+            while True:
+                kind, task, payload = self._events.get_nowait()
+                self._dispatch(kind, task, payload)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _dispatch(self, kind, task, payload):
+        if kind == "started":
+            if self.on_state:
+                self.on_state(task)
+            return
+        if kind == "progress":
+            if self.on_progress and not task.cancelled:
+                self.on_progress(task, *payload)
+            return
+
+        if task in self._tasks:
+            self._tasks.remove(task)
+        if kind == "cancelled":
+            on_cancel = payload[2]
+            if on_cancel:
+                on_cancel()
+        else:
+            (on_done, on_error, on_cancel), value = payload
+            if task.cancelled:
+                # Resultado chegou depois do cancelamento: é descartado
+                if on_cancel:
+                    on_cancel()
+            elif kind == "done" and on_done:
+                on_done(value)
+            elif kind == "error" and on_error:
+                on_error(value)
+        if self.on_state:
+            self.on_state(self._tasks[0] if self._tasks else None)
@@ -0,0 +1,283 @@
+# benchmark.py
+
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+# Sem display: o benchmark nunca abre janelas (Tk ou Matplotlib interativo)
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from data_model import OLAPModel
+from visualizer import visualize_result
+
+# Quantidades de fatos (10^3 .. 10^7) e conjuntos de cardinalidades das três dimensões
+DEFAULT_SIZES = [10 ** k for k in range(3, 8)]
+DEFAULT_CARDINALITIES = [(4, 5, 5), (50, 20, 12), (1000, 100, 30)]
+DIMENSION_NAMES = ("PRODUTO", "REGIÃO", "MÊS")
+
+# Acima destes limites o caso é pulado (JSON é lento em 10^7; gráficos com muitos grupos)
+JSON_MAX_FACTS = 1_000_000
+PLOT_MAX_GROUPS = 10_000
+
+# Lentidão tolerada em relação à baseline antes de acusar regressão (0.2 = 20%)
+DEFAULT_TOLERANCE = 0.2
+# Diferenças absolutas menores que isto são ruído de medição, não regressão
+MIN_DELTA_SECONDS = 0.001
+
+# Sufixo dos casos respondidos pelos acumuladores ativos (comparados ao caso sem o sufixo)
+RUNNING_SUFFIX = "/running"
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, cardinalities=DEFAULT_CARDINALITIES, repeat=3,
+                   json_max=JSON_MAX_FACTS, plot_max=PLOT_MAX_GROUPS, seed=0, log=print):
+    """
+    Executa todos os casos para cada combinação de tamanho x cardinalidades.
+
+    Returns:
+        dict: {"meta": {...}, "results": [registro, ...]}; cada registro tem nome do caso,
+        fatos, cardinalidades, segundos (melhor de `repeat`), pico de RSS (MB) e vazão.
+    """
+    results = []
+    for cards in cardinalities:
+        for num_facts in sizes:
+            model = _build_model(num_facts, cards, seed)
+            for record in _model_cases(model, repeat, json_max, plot_max):
+                record.update({"facts": num_facts, "cardinalities": list(cards)})
+                results.append(record)
+                if log:
+                    log(_format_record(record))
+            del model
+    return {"meta": _environment(repeat), "results": results}
+
+
+def _build_model(num_facts, cards, seed):
+    model = OLAPModel({}, [], {})
+    model.generate_data(num_facts, dict(zip(DIMENSION_NAMES, cards)), seed=seed)
+    return model
+
+
+def _model_cases(model, repeat, json_max, plot_max):
+    n = len(model.facts)
+    last = DIMENSION_NAMES[-1]
+    # Filtro na última dimensão: agrupamentos de 1-2 dims não incluem a coluna filtrada
+    filters = {last: model.dimensions[last][0]}
+
+    for k in (1, 2, 3):
+        dims = list(DIMENSION_NAMES[:k])
+        for label, active in (("unfiltered", {}), ("filtered", filters)):
+            model.set_filters(active)
+            seconds, rss = _measure(lambda: _cold_aggregate(model, dims), repeat)
+            yield _record(f"aggregate/{label}/{k}d", seconds, rss, n, "facts/s")
+            # Mesma consulta respondida pelos acumuladores ativos (sem o cache de resultados)
+            seconds, rss = _measure(lambda: _running_aggregate(model, dims), repeat)
+            yield _record(f"aggregate/{label}/{k}d{RUNNING_SUFFIX}", seconds, rss, n, "facts/s")
+    model.set_filters({})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, ext in (("binary", ".olap"), ("json", ".json")):
+            if fmt == "json" and n > json_max:
+                continue
+            path = os.path.join(tmp, "cube" + ext)
+            seconds, rss = _measure(lambda: model.save_cube(path), repeat)
+            yield _record(f"io/save/{fmt}", seconds, rss, n, "facts/s")
+            reader = OLAPModel({}, [], {})
+            # Carga + uma agregação completa: o binário mapeado só é lido quando consultado
+            seconds, rss = _measure(lambda: _load_and_scan(reader, path), repeat)
+            yield _record(f"io/load/{fmt}", seconds, rss, n, "facts/s")
+
+    for k in (1, 2, 3):
+        dims = list(DIMENSION_NAMES[:k])
+        result, _ = model.aggregate_data(dims, "sum")
+        groups = len(result or {})
+        if not groups or groups > plot_max:
+            continue
+        try:
+            seconds, rss = _measure(lambda: _render(dims, result), repeat)
+        except Exception as e:
+            # Uma falha de desenho não interrompe o restante do benchmark
+            plt.close("all")
+            yield {"name": f"visualize/{k}d", "error": f"{type(e).__name__}: {e}"}
+            continue
+        yield _record(f"visualize/{k}d", seconds, rss, groups, "groups/s")
+
+
+def _cold_aggregate(model, dims):
+    # Sem cache de resultados nem acumuladores ativos: mede a varredura de fato
+    model.cache.clear()
+    model.running.clear()
+    return model.aggregate_data(dims, "sum")
+
+
+def _running_aggregate(model, dims):
+    # O aquecimento de _measure deixa a agregação acompanhada; só o cache é descartado
+    model.cache.clear()
+    return model.aggregate_data(dims, "sum")
+
+
+def _load_and_scan(model, path):
+    model.load_cube(path)
+    model.aggregate_data([DIMENSION_NAMES[0]], "sum")
+
+
+def _render(dims, result):
+    # A figura persiste entre chamadas, como na aplicação
+    visualize_result(dims, result, "sum")
+    plt.gcf().canvas.draw()
+
+
+def _measure(fn, repeat):
+    """Melhor tempo de `repeat` execuções (após um aquecimento) e o pico de RSS do caso."""
+    fn()
+    _reset_peak_rss()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best, _peak_rss_mb()
+
+
+def _record(name, seconds, rss, items, unit):
+    return {"name": name, "seconds": seconds, "peak_rss_mb": rss,
+            "throughput": items / seconds if seconds else 0.0, "unit": unit}
+
+
+def _reset_peak_rss():
+    # Linux: "5" em clear_refs zera o pico (VmHWM); nos demais o pico é o do processo
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: KB no Linux, bytes no macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _environment(repeat):
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "repeat": repeat,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _format_record(record):
+    if "error" in record:
+        return f"{record['name']:<32} {record['facts']:>10,} {str(tuple(record['cardinalities'])):<16} ERRO: {record['error']}"
+    return (f"{record['name']:<32} {record['facts']:>10,} {str(tuple(record['cardinalities'])):<16}"
+            f" {record['seconds'] * 1000:>10.2f} ms {record['peak_rss_mb']:>8.1f} MB"
+            f" {record['throughput']:>14,.0f} {record['unit']}")
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, min_delta=MIN_DELTA_SECONDS):
+    """
+    Compara dois relatórios caso a caso (nome, fatos, cardinalidades).
+
+    Returns:
+        list: (chave, segundos da baseline, segundos atuais, razão, regressão?) dos casos em comum.
+    """
+    def key(record):
+        return record["name"], record["facts"], tuple(record["cardinalities"])
+
+    before = {key(r): r for r in baseline["results"]}
+    rows = []
+    for record in current["results"]:
+        old = before.get(key(record))
+        if old is None or "error" in record or "error" in old:
+            continue
+        ratio = record["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        slower = ratio > 1 + tolerance and record["seconds"] - old["seconds"] > min_delta
+        rows.append((key(record), old["seconds"], record["seconds"], ratio, slower))
+    return rows
+
+
+def check_running(report, tolerance=DEFAULT_TOLERANCE, min_delta=MIN_DELTA_SECONDS):
+    """
+    Confere, no próprio relatório, que responder pelos acumuladores ativos não é mais
+    lento que recalcular a mesma agregação.
+
+    Returns:
+        list: (chave do caso recalculado, segundos recalculando, segundos pelos acumuladores)
+        dos casos em que os acumuladores foram mais lentos.
+    """
+    def key(record, name):
+        return name, record["facts"], tuple(record["cardinalities"])
+
+    cold = {key(r, r["name"]): r["seconds"] for r in report["results"] if "error" not in r}
+    slower = []
+    for record in report["results"]:
+        if "error" in record or not record["name"].endswith(RUNNING_SUFFIX):
+            continue
+        case = key(record, record["name"][:-len(RUNNING_SUFFIX)])
+        if case in cold and record["seconds"] > cold[case] * (1 + tolerance) and \
+                record["seconds"] - cold[case] > min_delta:
+            slower.append((case, cold[case], record["seconds"]))
+    return slower
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do modelo OLAP, da E/S de cubos e do visualizador (sem display).")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="quantidades de fatos separadas por vírgula (padrão: 10^3..10^7)")
+    parser.add_argument("--cards", action="append",
+                        help="cardinalidades das 3 dimensões, ex. 50x20x12 (pode repetir)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json-max", type=int, default=JSON_MAX_FACTS,
+                        help="maior cubo gravado/lido também em JSON")
+    parser.add_argument("--plot-max", type=int, default=PLOT_MAX_GROUPS,
+                        help="maior número de grupos desenhado pelo visualizador")
+    parser.add_argument("--output", "-o", help="grava o relatório JSON neste arquivo")
+    parser.add_argument("--baseline", help="relatório anterior para comparação")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="lentidão tolerada em relação à baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s.strip()]
+    cards = ([tuple(int(c) for c in spec.lower().split("x")) for spec in args.cards]
+             if args.cards else DEFAULT_CARDINALITIES)
+
+    report = run_benchmarks(sizes, cards, args.repeat, args.json_max, args.plot_max)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    slow_running = check_running(report, args.tolerance)
+    for (name, facts, cards_), cold, hit in slow_running:
+        print(f"{name:<32} {facts:>10,} {str(cards_):<16} acumuladores {hit * 1000:.2f} ms"
+              f" > recálculo {cold * 1000:.2f} ms  << REGRESSÃO")
+    if not args.baseline:
+        return 1 if slow_running else 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(report, baseline, args.tolerance)
+    regressions = [row for row in rows if row[4]]
+    print(f"\n{'caso':<32} {'fatos':>10} {'cards':<16} {'baseline':>11} {'atual':>11} {'razão':>7}")
+    for (name, facts, cards_), old, new, ratio, slower in rows:
+        flag = "  << REGRESSÃO" if slower else ""
+        print(f"{name:<32} {facts:>10,} {str(cards_):<16} {old * 1000:>8.2f} ms {new * 1000:>8.2f} ms"
+              f" {ratio:>6.2f}x{flag}")
+    print(f"\n{len(regressions)} regressão(ões) acima de {args.tolerance:.0%} em {len(rows)} casos comparados.")
+    return 1 if regressions or slow_running else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# bitmap_index.py
+
+import numpy as np
+
+_INITIAL_BYTES = 128
+
+# Dimensões com mais valores que isto não ganham bitmaps: cada valor seleciona poucos
+# fatos e o filtro varre a coluna de códigos (==/np.isin) em vez de guardar n/8 bytes por valor
+BITMAP_MAX_CARDINALITY = 256
+
+
+class BitmapIndex:
+    """
+    Índice bitmap por valor de dimensão sobre o FactStore.
+
+    Cada bitmap é o vetor compactado (np.packbits, ordem 'little') dos fatos com um
+    código `c` da dimensão. Os bitmaps são montados sob demanda, só para os valores
+    efetivamente filtrados, e depois mantidos a cada novo fato; dimensões acima de
+    BITMAP_MAX_CARDINALITY são resolvidas por varredura da coluna de códigos.
+    Os filtros são avaliados por predicates.FilterPlan, que combina os bitmaps.
+    """
+
+    def __init__(self, facts):
+        self.facts = facts
+        self.rebuild()
+
+    def rebuild(self):
+        """Descarta os bitmaps montados; eles voltam a ser montados no próximo filtro."""
+        self._size = len(self.facts)
+        self._capacity = _nbytes(self._size) + _INITIAL_BYTES
+        # dimensão -> {código: bitmap com `_capacity` bytes}
+        self._bitmaps = {}
+
+    def invalidate(self):
+        """Adia a reinicialização para o primeiro filtro (ex.: colunas mapeadas em memória)."""
+        self._bitmaps = None
+
+    def append(self, row):
+        """Registra nos bitmaps já montados o fato da posição `row` (recém-adicionado ao FactStore)."""
+        if self._bitmaps is None:
+            return
+        self._reserve(_nbytes(row + 1))
+        byte, bit = row >> 3, np.uint8(1 << (row & 7))
+        for dim in list(self._bitmaps):
+            if not self.indexed(dim):
+                # A dimensão passou do limite de cardinalidade: volta a ser varrida
+                del self._bitmaps[dim]
+                continue
+            bitmap = self._bitmaps[dim].get(int(self.facts.codes(dim)[row]))
+            if bitmap is not None:
+                bitmap[byte] |= bit
+        self._size = row + 1
+
+    def indexed(self, dim):
+        """True se os filtros em `dim` usam bitmaps (dimensão existente e de cardinalidade baixa)."""
+        return dim in self.facts.dimensions and len(self.facts.dimensions[dim]) <= BITMAP_MAX_CARDINALITY
+
+    def bitmap(self, dim, code):
+        """Bitmap compactado dos fatos com `code` em `dim`, montado no primeiro uso."""
+        self._ensure()
+        nbytes = _nbytes(self._size)
+        if not self.indexed(dim):
+            return np.packbits(self.facts.codes(dim)[:self._size] == code, bitorder="little")
+        built = self._bitmaps.setdefault(dim, {})
+        bitmap = built.get(code)
+        if bitmap is None:
+            packed = np.packbits(self.facts.codes(dim)[:self._size] == code, bitorder="little")
+            bitmap = built[code] = np.zeros(self._capacity, dtype=np.uint8)
+            bitmap[:len(packed)] = packed
+        return bitmap[:nbytes]
+
+    def select_codes(self, dim, codes):
+        """Bitmap compactado dos fatos cujo código em `dim` está em `codes` (OR)."""
+        self._ensure()
+        nbytes = _nbytes(self._size)
+        if dim not in self.facts.dimensions:
+            return np.zeros(nbytes, dtype=np.uint8)
+        card = len(self.facts.dimensions[dim])
+        codes = [c for c in np.asarray(codes).tolist() if 0 <= c < card]
+        if not codes:
+            return np.zeros(nbytes, dtype=np.uint8)
+        if not self.indexed(dim):
+            column = self.facts.codes(dim)[:self._size]
+            return np.packbits(np.isin(column, codes), bitorder="little")
+        selected = self.bitmap(dim, codes[0]).copy()
+        for code in codes[1:]:
+            np.bitwise_or(selected, self.bitmap(dim, code), out=selected)
+        return selected
+
+    def contains(self, selected, rows):
+        """Máscara: quais das posições `rows` têm o bit ligado no bitmap compactado."""
+        return ((selected[rows >> 3] >> (rows & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def positions(self, selected):
+        """Posições (int64) dos bits ligados em um bitmap compactado."""
+        bits = np.unpackbits(selected, count=self._size, bitorder="little")
+        return np.flatnonzero(bits)
+
+    @property
+    def nbytes(self):
+        return sum(b.nbytes for built in (self._bitmaps or {}).values() for b in built.values())
+
+    # ----------------------------------------------------
+    # ---------- Funções Auxiliares ----------
+    # ----------------------------------------------------
+
+    def _ensure(self):
+        if self._bitmaps is None:
+            self.rebuild()
+
+    def _reserve(self, nbytes):
+        if nbytes <= self._capacity:
+            return
+        capacity = max(nbytes, self._capacity * 2)
+        for built in self._bitmaps.values():
+            for code, bitmap in built.items():
+                grown = np.zeros(capacity, dtype=np.uint8)
+                grown[:self._capacity] = bitmap
+                built[code] = grown
+        self._capacity = capacity
+
+
+def _nbytes(rows):
+    return (rows + 7) // 8
@@ -0,0 +1,111 @@
+# bulk_import.py
+
+import csv
+from itertools import islice
+import re
+import time
+
+import numpy as np
+
+from cube_io import CHUNK_SIZE
+from fact_store import MISSING
+
+
+def import_csv(path, facts, columns=None, measure="valor", delimiter=None, decimal=".",
+               chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Importa fatos de um arquivo delimitado (CSV/TSV) em blocos, direto nas colunas do FactStore.
+
+    Args:
+        path (str): Arquivo com linha de cabeçalho.
+        facts (FactStore): Destino; valores novos estendem os dicionários das dimensões.
+        columns (dict, optional): Dimensão -> coluna do arquivo. Padrão: todas as colunas, exceto a medida.
+        measure (str): Coluna com o valor da venda.
+        delimiter (str, optional): Separador; detectado automaticamente se None.
+        decimal (str): Separador decimal da medida ("," para planilhas em pt-BR). Com um
+            separador diferente de ".", o ponto só é aceito como separador de milhar em
+            posições válidas ("1.234,5"); um valor como "12.5" conta como inválido.
+        progress (callable, optional): progress(linhas_lidas, rejeitadas) a cada bloco.
+
+    Returns:
+        dict: linhas lidas/importadas/rejeitadas, tempo, linhas por segundo e valores novos por dimensão.
+    """
+    started = time.perf_counter()
+    report = {"read": 0, "imported": 0, "rejected": 0, "new_values": {}}
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if delimiter is None:
+            sample = f.read(64 * 1024)
+            f.seek(0)
+            delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [h.strip() for h in next(reader)]
+
+        if measure not in header:
+            raise ValueError(f"Coluna da medida '{measure}' não encontrada no cabeçalho.")
+        if columns is None:
+            columns = {h: h for h in header if h != measure}
+        missing = [c for c in columns.values() if c not in header]
+        if missing:
+            raise ValueError(f"Colunas inexistentes no arquivo: {', '.join(missing)}.")
+
+        positions = {dim: header.index(col) for dim, col in columns.items()}
+        measure_pos = header.index(measure)
+        sizes = {dim: len(facts.dimensions.get(dim, [])) for dim in columns}
+
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            report["read"] += len(rows)
+            rows = [r for r in rows if len(r) == len(header)]
+            valores, ok = _parse_floats([r[measure_pos] for r in rows], decimal)
+            if not ok.all():
+                rows = [r for r, good in zip(rows, ok.tolist()) if good]
+                valores = valores[ok]
+            codes = {dim: _encode_column(facts, dim, [r[pos].strip() for r in rows])
+                     for dim, pos in positions.items()}
+            facts.append_columns(codes, valores)
+
+            report["imported"] += len(rows)
+            report["rejected"] = report["read"] - report["imported"]
+            if progress:
+                progress(report["read"], report["rejected"])
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = elapsed
+    report["rows_per_sec"] = report["read"] / elapsed if elapsed else 0.0
+    report["new_values"] = {dim: len(facts.dimensions[dim]) - n for dim, n in sizes.items()
+                            if len(facts.dimensions[dim]) > n}
+    return report
+
+
+def _parse_floats(strings, decimal):
+    """Converte a coluna da medida; retorna (valores, máscara das linhas válidas)."""
+    if decimal != ".":
+        # Ponto fora dos grupos de milhar: o valor vira "nan" e a linha é rejeitada
+        grouped = re.compile(rf"^\s*[+-]?\d{{1,3}}(?:\.\d{{3}})+(?:{re.escape(decimal)}\d*)?\s*$")
+        strings = [("nan" if "." in s and not grouped.match(s) else s.replace(".", "")).replace(decimal, ".")
+                   for s in strings]
+    try:
+        values = np.array(strings, dtype=np.float64)
+        return values, np.isfinite(values)
+    except ValueError:
+        # Há valores malformados no bloco: converte um a um para identificá-los
+        values = np.empty(len(strings), dtype=np.float64)
+        for i, s in enumerate(strings):
+            try:
+                values[i] = float(s)
+            except ValueError:
+                values[i] = np.nan
+        return values, np.isfinite(values)
+
+
+def _encode_column(facts, dim, strings):
+    """
+    Códigos de uma coluna de texto: cada valor distinto do bloco é codificado uma única vez.
+    Células vazias ficam como ausentes.
+    """
+    uniques, inverse = np.unique(np.array(strings, dtype=object), return_inverse=True)
+    mapping = np.array([facts.encode(dim, v) if v else MISSING for v in uniques.tolist()], dtype=np.int64)
+    return mapping[inverse]
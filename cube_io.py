@@ -0,0 +1,330 @@
+# cube_io.py
+
+import codecs
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+FORMAT_NAME = "olap-cube"
+FORMAT_VERSION = 2
+
+# Fatos processados por bloco (lidos ou gravados de cada vez)
+CHUNK_SIZE = 50000
+
+# Tamanho dos blocos de leitura do formato JSON antigo
+_READ_BLOCK = 1 << 20
+
+_HEADER_PREFIX = b'{"format": "' + FORMAT_NAME.encode() + b'"'
+
+# Formato binário colunar: extensão, assinatura, versão e alinhamento das seções
+BINARY_EXTENSION = ".olap"
+BINARY_MAGIC = b"OLAPCUBE"
+BINARY_VERSION = 1
+_ALIGNMENT = 64
+# Início do arquivo: assinatura + versão (uint32) + reservado (uint32)
+_PREAMBLE = struct.Struct("<8sII")
+# Fim do arquivo: posição (uint64), tamanho (uint32) e CRC32 (uint32) do rodapé + assinatura
+_TRAILER = struct.Struct("<QII8s")
+
+
+def write_cube(path, dimensions, facts, chunk_size=CHUNK_SIZE, progress=None, hierarchies=None):
+    """
+    Grava o cubo em JSON compacto, um fato por linha com os valores das dimensões
+    como códigos. O arquivo continua sendo JSON válido:
+
+        {"format": "olap-cube", "version": 2, "dimensions": {...}, "columns": [...], "facts": [
+        [0,3,1,120.5],
+        ...
+        ]}
+
+    `progress(feitos, total)` é chamado a cada bloco com o número de fatos gravados.
+    As hierarquias de dimensões (se houver) vão no cabeçalho. O cubo é gravado em
+    `path + ".tmp"` e só substitui `path` no fim: uma falha ou um cancelamento (exceção
+    levantada por `progress`) mantém o arquivo anterior intacto.
+    """
+    dims = list(dimensions)
+    total = len(facts)
+    header = {"format": FORMAT_NAME, "version": FORMAT_VERSION,
+              "dimensions": dimensions, "columns": dims + ["valor"]}
+    if hierarchies:
+        header["hierarchies"] = hierarchies
+
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header)[:-1] + ', "facts": [\n')
+            for start in range(0, total, chunk_size):
+                stop = min(start + chunk_size, total)
+                columns = [facts.codes(d)[start:stop].tolist() for d in dims]
+                valores = facts.values[start:stop].tolist()
+                lines = ["[" + ",".join(map(str, row)) + ("," if dims else "") + repr(v) + "]"
+                         for *row, v in zip(*columns, valores)]
+                f.write(",\n".join(lines))
+                f.write(",\n" if stop < total else "\n")
+                if progress:
+                    progress(stop, total)
+            f.write("]}\n")
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return total
+
+
+def read_cube(path, dimensions, facts, chunk_size=CHUNK_SIZE, progress=None, hierarchies=None):
+    """
+    Lê um cubo em blocos para dentro de `dimensions`/`facts` (que devem estar vazios)
+    e, se informado, das hierarquias salvas para `hierarchies`.
+    Aceita o formato compacto e o JSON antigo ({"dimensions": ..., "facts": [{...}, ...]}).
+
+    `progress(bytes_lidos, bytes_total)` é chamado a cada bloco.
+    """
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        first = f.readline()
+        if first.startswith(_HEADER_PREFIX):
+            return _read_compact(f, first, dimensions, facts, chunk_size, total, progress, hierarchies)
+        f.seek(0)
+        return _read_legacy(f, dimensions, facts, chunk_size, total, progress, hierarchies)
+
+
+def _read_compact(f, header_line, dimensions, facts, chunk_size, total, progress, hierarchies):
+    header = json.loads(header_line.rstrip() + b"]}")
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"Versão de cubo não suportada: {header['version']}.")
+
+    dimensions.update(header["dimensions"])
+    if hierarchies is not None:
+        hierarchies.update(header.get("hierarchies", {}))
+    facts.reset()
+    dims = header["columns"][:-1]
+
+    def flush(lines):
+        rows = np.array(json.loads(b"[" + b",".join(lines) + b"]"), dtype=np.float64)
+        rows = rows.reshape(len(lines), len(dims) + 1)
+        codes = {d: rows[:, i].astype(np.int64) for i, d in enumerate(dims)}
+        facts.append_columns(codes, rows[:, -1])
+        if progress:
+            progress(f.tell(), total)
+
+    lines = []
+    for line in f:
+        line = line.strip()
+        if line == b"]}":
+            break
+        lines.append(line.rstrip(b","))
+        if len(lines) >= chunk_size:
+            flush(lines)
+            lines = []
+    if lines:
+        flush(lines)
+    return len(facts)
+
+
+def _read_legacy(f, dimensions, facts, chunk_size, total, progress, hierarchies):
+    """JSON antigo: percorre o objeto de topo e decodifica os fatos um a um, sem json.load."""
+    reader = _StreamReader(f)
+    reader.expect("{")
+    while True:
+        if reader.peek() == "}":
+            break
+        key = reader.decode()
+        reader.expect(":")
+        if key == "facts":
+            reader.expect("[")
+            chunk = []
+            while reader.peek() != "]":
+                chunk.append(reader.decode())
+                if reader.peek() == ",":
+                    reader.expect(",")
+                if len(chunk) >= chunk_size:
+                    facts.extend(chunk)
+                    chunk = []
+                    if progress:
+                        progress(reader.bytes_read, total)
+            reader.expect("]")
+            facts.extend(chunk)
+        elif key == "dimensions":
+            for name, values in reader.decode().items():
+                # Fatos podem ter estendido os dicionários antes (chave "facts" primeiro)
+                facts.set_dimension(name, values)
+        elif key == "hierarchies" and hierarchies is not None:
+            hierarchies.update(reader.decode())
+        else:
+            reader.decode()
+        if reader.peek() == ",":
+            reader.expect(",")
+    if progress:
+        progress(total, total)
+    return len(facts)
+
+
+class _StreamReader:
+    """Decodificador JSON incremental sobre um arquivo binário (UTF-8) lido em blocos."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def peek(self):
+        self._skip_ws()
+        if self.pos >= len(self.buf):
+            raise ValueError("Fim inesperado do arquivo JSON.")
+        return self.buf[self.pos]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON inválido: esperado '{char}' na posição {self.bytes_read}.")
+        self.pos += 1
+
+    def decode(self):
+        self._skip_ws()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # Um número no fim do buffer pode estar truncado: só aceita com delimitador depois
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def _skip_ws(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return
+            self._fill()
+
+    def _fill(self):
+        block = self.f.read(_READ_BLOCK)
+        self.bytes_read += len(block)
+        self.eof = not block
+        # Descarta o que já foi consumido para manter a memória limitada ao bloco
+        self.buf = self.buf[self.pos:] + self._utf8.decode(block, final=self.eof)
+        self.pos = 0
+
+
+def is_binary_cube(path):
+    """Verdadeiro se o arquivo começa com a assinatura do formato binário."""
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def write_binary_cube(path, dimensions, facts, chunk_size=CHUNK_SIZE, progress=None, hierarchies=None):
+    """
+    Grava o cubo no formato binário colunar:
+
+        preâmbulo | coluna dim 1 | ... | coluna "valor" | rodapé JSON | trailer
+
+    Cada coluna é o array bruto (little-endian) alinhado em 64 bytes. O rodapé
+    guarda as dimensões (dicionários), as hierarquias, o número de fatos e, por coluna, dtype,
+    posição e CRC32; o trailer guarda posição, tamanho e CRC32 do rodapé.
+    """
+    total = len(facts)
+    columns = [(d, facts.codes(d)) for d in dimensions] + [("valor", facts.values)]
+    footer = {"dimensions": dimensions, "rows": total, "columns": []}
+    if hierarchies:
+        footer["hierarchies"] = hierarchies
+    done = 0
+
+    # Grava em arquivo temporário: o cubo atual pode estar mapeado a partir de `path`,
+    # e uma falha ou cancelamento não pode truncar o arquivo anterior
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(BINARY_MAGIC, BINARY_VERSION, 0))
+            for name, column in columns:
+                _pad(f)
+                dtype = column.dtype.newbyteorder("<")
+                entry = {"name": name, "dtype": dtype.str, "offset": f.tell(), "crc32": 0}
+                for start in range(0, total, chunk_size):
+                    data = column[start:start + chunk_size].astype(dtype, copy=False).tobytes()
+                    entry["crc32"] = zlib.crc32(data, entry["crc32"])
+                    f.write(data)
+                    done += len(data)
+                    if progress:
+                        progress(done, total * sum(c.itemsize for _, c in columns))
+                footer["columns"].append(entry)
+
+            _pad(f)
+            offset = f.tell()
+            data = json.dumps(footer).encode("utf-8")
+            f.write(data)
+            f.write(_TRAILER.pack(offset, len(data), zlib.crc32(data), BINARY_MAGIC))
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return total
+
+
+def read_binary_cube(path, dimensions, facts, verify=False, progress=None, hierarchies=None):
+    """
+    Abre um cubo binário mapeando as colunas em memória (np.memmap): a abertura
+    é quase instantânea e só as páginas tocadas pelas consultas são lidas.
+    Com `verify=True` o CRC32 de cada coluna é conferido (lê o arquivo inteiro).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        magic, version, _ = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError("Arquivo não é um cubo binário.")
+        if version > BINARY_VERSION:
+            raise ValueError(f"Versão de cubo binário não suportada: {version}.")
+        f.seek(size - _TRAILER.size)
+        offset, length, crc, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != BINARY_MAGIC:
+            raise ValueError("Cubo binário truncado (trailer ausente).")
+        f.seek(offset)
+        data = f.read(length)
+    if zlib.crc32(data) != crc:
+        raise ValueError("Checksum do cabeçalho do cubo binário não confere.")
+    footer = json.loads(data)
+
+    rows = footer["rows"]
+    columns = {}
+    for i, entry in enumerate(footer["columns"]):
+        dtype = np.dtype(entry["dtype"])
+        if rows:
+            column = np.memmap(path, dtype=dtype, mode="r", offset=entry["offset"], shape=(rows,))
+        else:
+            column = np.zeros(0, dtype=dtype)
+        if verify and zlib.crc32(column) != entry["crc32"]:
+            raise ValueError(f"Checksum da coluna '{entry['name']}' não confere.")
+        columns[entry["name"]] = column
+        if progress:
+            progress(i + 1, len(footer["columns"]))
+
+    dimensions.update(footer["dimensions"])
+    if hierarchies is not None:
+        hierarchies.update(footer.get("hierarchies", {}))
+    values = columns.pop("valor")
+    facts.attach_columns(columns, values)
+    return rows
+
+
+def _discard(path):
+    """Remove um arquivo temporário de gravação interrompida (se existir)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % _ALIGNMENT))
@@ -0,0 +1,153 @@
+# cube_lattice.py
+
+from itertools import combinations
+
+import numpy as np
+
+from aggregation import aggregate_codes
+from fact_store import MISSING, code_dtype
+
+
+class Cuboid:
+    """
+    Um nó do reticulado: acumuladores (soma, contagem) agrupados por um conjunto de dimensões.
+    Os códigos usam o dicionário de cada dimensão; o código `cardinalidade` representa "ausente".
+    """
+
+    def __init__(self, dims, codes, cards, sums, counts):
+        self.dims = tuple(dims)
+        self.codes = dict(zip(self.dims, codes))
+        self.cards = dict(zip(self.dims, cards))
+        self.sums = sums
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def nbytes(self):
+        return self.sums.nbytes + self.counts.nbytes + sum(c.nbytes for c in self.codes.values())
+
+    def rollup(self, dims):
+        """Deriva um cuboide mais grosso reagrupando este (sem tocar nos fatos)."""
+        return _build(dims, [self.codes[d] for d in dims], [self.cards[d] for d in dims],
+                      self.sums, self.counts)
+
+
+class MaterializedCube:
+    """
+    Cubo de dados materializado (opcional) sobre o OLAPModel.
+
+    O cuboide base (todas as dimensões) é calculado uma única vez a partir dos fatos;
+    os cuboides mais grossos escolhidos são derivados do menor cuboide mais fino já
+    calculado. As consultas são respondidas pelo cuboide mais barato que as cobre.
+    """
+
+    def __init__(self, model, cuboids=None, budget_bytes=None):
+        self.model = model
+        self.requested = [tuple(c) for c in cuboids] if cuboids else None
+        self.budget_bytes = budget_bytes
+        self.cuboids = {}
+        self.stale = True
+
+    def invalidate(self):
+        """Marca o cubo como desatualizado; ele é recalculado na próxima consulta."""
+        self.stale = True
+        self.cuboids = {}
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.cuboids.values())
+
+    def materialize(self):
+        """Calcula o cuboide base e os cuboides selecionados dentro do orçamento de memória."""
+        self.cuboids = {}
+        dims = tuple(self.model.dimensions)
+        if not dims:
+            self.stale = False
+            return []
+
+        # 1. Cuboide base, direto dos fatos ("ausente" vira o código extra `cardinalidade`)
+        facts = self.model.facts
+        cards = [len(self.model.dimensions[d]) + 1 for d in dims]
+        codes = []
+        for d, card in zip(dims, cards):
+            c = facts.codes(d).astype(code_dtype(card))
+            c[c == MISSING] = card - 1
+            codes.append(c)
+        base = _build(dims, codes, cards, facts.values)
+        budget = self.budget_bytes
+        if budget is not None and base.nbytes > budget:
+            raise ValueError(f"O cuboide base ({base.nbytes / 2**20:.1f} MB) não cabe no orçamento.")
+        self.cuboids[dims] = base
+
+        # 2. Seleção dos demais cuboides (menores primeiro) até esgotar o orçamento
+        remaining = None if budget is None else budget - base.nbytes
+        selected = []
+        for cuboid_dims in sorted(self._candidates(dims), key=lambda c: self._estimate(c, base)):
+            size = self._estimate(cuboid_dims, base)
+            if remaining is not None:
+                if size > remaining:
+                    continue
+                remaining -= size
+            selected.append(cuboid_dims)
+
+        # 3. Deriva do mais fino para o mais grosso, sempre a partir do menor pai já calculado
+        for cuboid_dims in sorted(selected, key=len, reverse=True):
+            parent = self.covering(cuboid_dims)
+            self.cuboids[cuboid_dims] = parent.rollup(cuboid_dims)
+
+        self.stale = False
+        return list(self.cuboids)
+
+    def covering(self, dims):
+        """Cuboide materializado de menor tamanho que contém todas as dimensões pedidas."""
+        needed = set(dims)
+        best = None
+        for cuboid in self.cuboids.values():
+            if needed.issubset(cuboid.dims) and (best is None or len(cuboid) < len(best)):
+                best = cuboid
+        return best
+
+    def answer(self, dims, filters):
+        """
+        Responde (grupos, somas, contagens) para as dimensões e filtros pedidos,
+        ou None se nenhum cuboide cobrir a consulta.
+        """
+        if self.stale:
+            self.materialize()
+        cuboid = self.covering(list(dims) + list(filters))
+        if cuboid is None:
+            return None
+
+        # Slice sobre o cuboide e descarte dos grupos com dimensão ausente
+        mask = np.ones(len(cuboid), dtype=bool)
+        for dim, val in filters.items():
+            code = self.model.facts.lookup(dim, val)
+            if code is None:
+                mask[:] = False
+                break
+            mask &= cuboid.codes[dim] == code
+        for dim in dims:
+            mask &= cuboid.codes[dim] != cuboid.cards[dim] - 1
+
+        code_arrays = [cuboid.codes[d][mask] for d in dims]
+        cards = [cuboid.cards[d] - 1 for d in dims]
+        return aggregate_codes(code_arrays, cards, cuboid.sums[mask], cuboid.counts[mask])
+
+    def _candidates(self, dims):
+        if self.requested is not None:
+            return [c for c in self.requested if set(c).issubset(dims) and c != dims]
+        return [c for k in range(1, len(dims)) for c in combinations(dims, k)]
+
+    def _estimate(self, cuboid_dims, base):
+        """Limite superior do tamanho em bytes de um cuboide antes de calculá-lo."""
+        groups = min(int(np.prod([base.cards[d] for d in cuboid_dims], dtype=np.int64)), len(base))
+        per_group = 16 + sum(base.codes[d].itemsize for d in cuboid_dims)
+        return groups * per_group
+
+
+def _build(dims, code_arrays, cards, sums, counts=None):
+    groups, sums, counts = aggregate_codes(code_arrays, cards, sums, counts)
+    codes = [g.astype(code_dtype(card)) for g, card in zip(groups, cards)]
+    return Cuboid(dims, codes, cards, sums, counts)
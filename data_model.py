@@ -1,67 +1,782 @@
 # data_model.py
 
-from collections import defaultdict
-import random
+import contextlib
+import functools
+import os
+import threading
 import numpy as np
 
+from aggregation import aggregate_codes, apply_measure, build_result, grand_total
+from bitmap_index import BitmapIndex
+from bulk_import import import_csv
+from cube_io import (BINARY_EXTENSION, CHUNK_SIZE, is_binary_cube, read_binary_cube, read_cube,
+                     write_binary_cube, write_cube)
+from cube_lattice import MaterializedCube
+from fact_store import MISSING, FactStore
+from generator import generate_cube
+from hierarchy import level_maps, rollup, validate_level
+from incremental import RunningAggregates
+from parallel import DEFAULT_THRESHOLD, ParallelAggregator
+from predicates import VALUE_FIELD, CodeCounts, FilterPlan, is_equality, parse_filters
+from profiling import NULL_TRACE, Profiler
+from result_cache import ResultCache
+from sketches import merge_sketch_partials, parse_measure, sketch_aggregate, sketch_partials, sketch_result
+from sqlite_store import SQLiteStore, is_sqlite_path
+
+
+def synchronized(method):
+    """Serializa o método no lock do modelo (mutações não concorrem com agregações em andamento)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# Dimensões usadas pelo botão de dados de exemplo (seed)
+SAMPLE_DIMENSIONS = {
+    "PRODUTO": ["CAMISA", "CALÇA", "TENIS", "BERMUDA"],
+    "REGIÃO": ["NORTE", "SUL", "LESTE", "OESTE", "CENTRO"],
+    "MÊS": ["JAN", "FEV", "MAR", "ABR", "MAI"]
+}
+# Hierarquia de exemplo sobre MÊS (roll-up para trimestre)
+SAMPLE_HIERARCHY = ("MÊS", "TRIMESTRE", {"JAN": "T1", "FEV": "T1", "MAR": "T1", "ABR": "T2", "MAI": "T2"})
+
+# Armazenamentos dos fatos: colunas NumPy em memória ou banco SQLite (ver sqlite_store.py)
+BACKENDS = ("memory", "sqlite")
+
+
 class OLAPModel:
     # 1. REMOVIDO: min_valor_seed e max_valor_seed do __init__
-    def __init__(self, dimensions, facts, filters):
+    def __init__(self, dimensions, facts, filters, cache_entries=128, cache_bytes=None,
+                 backend="memory", db_path=""):
         self.dimensions = dimensions
-        self.facts = facts
+        # Hierarquias sobre as dimensões (dimensão base -> níveis), ver hierarchy.py
+        self.hierarchies = {}
         self.filters = filters
-    
+        # Protege fatos/dimensões/filtros quando o modelo é usado a partir de uma thread de trabalho
+        self.lock = threading.RLock()
+        # Versão dos fatos (incrementada a cada mutação) e cache LRU de resultados
+        self.version = 0
+        self.cache = ResultCache(cache_entries, cache_bytes)
+        # Agregação particionada em vários processos (opcional)
+        self.parallel = None
+        # Instrumentação por estágio (desligada por padrão); trace da consulta em andamento e da última
+        self.profiler = Profiler()
+        self._trace = NULL_TRACE
+        self.last_trace = NULL_TRACE
+        # Verificação de cancelamento da consulta em andamento (ver aggregate_data)
+        self._cancel = None
+        # Os fatos ficam em um armazenamento colunar (códigos por dimensão + "valor" float64)
+        # ou, com backend="sqlite", em um banco SQLite em `db_path` ("" = temporário)
+        if backend not in BACKENDS:
+            raise ValueError(f"Armazenamento desconhecido: {backend}.")
+        if backend == "sqlite":
+            store = SQLiteStore(dimensions, db_path, hierarchies=self.hierarchies)
+            store.extend(facts)
+            self._bind_storage(store)
+        else:
+            self._bind_storage(facts if isinstance(facts, FactStore) else FactStore(dimensions, facts))
+
+    @property
+    def backend(self):
+        """Armazenamento atual dos fatos: "memory" ou "sqlite"."""
+        return "sqlite" if isinstance(self.facts, SQLiteStore) else "memory"
+
+    def _bind_storage(self, facts):
+        """
+        Passa a usar `facts` como armazenamento. Índice bitmap, acumuladores e cubo
+        materializado só existem em memória: no SQLite, filtros e agrupamentos são do banco.
+        """
+        self.facts = facts
+        memory = isinstance(facts, FactStore)
+        # Índice bitmap por valor de dimensão (Slice & Dice)
+        self.index = BitmapIndex(facts) if memory else None
+        # Contagens por código das dimensões (seletividade dos filtros), por versão dos fatos
+        self.code_counts = CodeCounts(facts) if memory else None
+        # Acumuladores (soma, contagem) das agregações ativas, mantidos a cada novo fato
+        self.running = RunningAggregates(facts) if memory else None
+        # Cubo materializado opcional (reticulado de cuboides)
+        self.cube = None
+
+    @synchronized
+    def add_dimension(self, name, values):
+        """Cria ou redefine uma dimensão, remapeando os fatos já existentes."""
+        self.facts.set_dimension(name, values)
+        if self.backend == "memory":
+            self.index.rebuild()
+            self.running.clear()
+        self._invalidate()
+        return self.dimensions[name]
+
+    @synchronized
+    def add_fact(self, fact):
+        """Adiciona um fato (dict dimensão -> valor, mais a medida "valor"). No SQLite, entra no lote pendente."""
+        self.facts.append(fact)
+        if self.backend == "memory":
+            row = len(self.facts) - 1
+            self.index.append(row)
+            self.running.add_row(row)
+        self._invalidate()
+        return len(self.facts)
+
+    @synchronized
+    def add_facts(self, facts):
+        """Anexa fatos em lote; as agregações ativas são atualizadas de uma vez só."""
+        if self.backend == "sqlite":
+            self.facts.extend(facts)
+            self._invalidate()
+            return len(self.facts)
+        start = len(self.facts)
+        for fact in facts:
+            self.facts.append(fact)
+            self.index.append(len(self.facts) - 1)
+        self.running.add_rows(start, len(self.facts))
+        self._invalidate()
+        return len(self.facts)
+
+    @synchronized
+    def import_csv(self, path, columns=None, measure="valor", delimiter=None, decimal=".", progress=None):
+        """
+        Importa fatos em massa de um arquivo delimitado, anexando direto nas colunas.
+        Retorna o relatório da importação (linhas/s, rejeitadas, valores novos por dimensão).
+        """
+        start = len(self.facts)
+        try:
+            return import_csv(path, self.facts, columns, measure, delimiter, decimal, progress=progress)
+        finally:
+            # Blocos já anexados permanecem: estruturas derivadas acompanham o que entrou
+            if self.backend == "memory":
+                self.index.invalidate()
+                self.running.add_rows(start, len(self.facts))
+            self._invalidate()
+
+    @synchronized
+    def materialize_cube(self, cuboids=None, budget_mb=None):
+        """
+        Materializa o cuboide base e os cuboides escolhidos (todos, se None) dentro
+        do orçamento de memória. Retorna o MaterializedCube criado.
+        """
+        if self.backend == "sqlite":
+            raise ValueError("O cubo materializado exige o armazenamento em memória (no SQLite o banco agrega).")
+        budget_bytes = None if budget_mb is None else int(budget_mb * 2**20)
+        cube = MaterializedCube(self, cuboids, budget_bytes)
+        cube.materialize()
+        self.cube = cube
+        return cube
+
+    @synchronized
+    def enable_parallel(self, workers=None, threshold=DEFAULT_THRESHOLD):
+        """
+        Liga a agregação em vários processos. Consultas com menos de `threshold`
+        fatos selecionados continuam no caminho serial.
+        """
+        self.disable_parallel()
+        self.parallel = ParallelAggregator(workers, threshold)
+        return self.parallel
+
+    @synchronized
+    def disable_parallel(self):
+        if self.parallel is not None:
+            self.parallel.shutdown()
+            self.parallel = None
+
+    @synchronized
+    def drop_cube(self):
+        """Descarta o cubo materializado; as consultas voltam a varrer os fatos."""
+        self.cube = None
+
+    @synchronized
     def generate_sample_data(self):
-        """Gera dimensões e fatos de exemplo (seed) usando valores fixos internos."""
+        """Gera dimensões e fatos de exemplo (seed): preset de `generate_data` com 75 fatos."""
         
         # Valores Mínimo/Máximo fixos
         min_valor = 50.0  # Valor padrão fixo
         max_valor = 500.0 # Valor padrão fixo
         
-        # 1. Dimensões de Exemplo
-        self.dimensions.clear()
-        self.dimensions.update({
-            "PRODUTO": ["CAMISA", "CALÇA", "TENIS", "BERMUDA"],
-            "REGIÃO": ["NORTE", "SUL", "LESTE", "OESTE", "CENTRO"],
-            "MÊS": ["JAN", "FEV", "MAR", "ABR", "MAI"]
-        })
-        
-        # 2. Fatos de Exemplo 
-        self.facts.clear()
-        num_facts = 75
-        
-        for i in range(num_facts):
-            fact = {}
-            for dim_name, dim_values in self.dimensions.items():
-                fact[dim_name] = random.choice(dim_values)
-                
-            # Geração de valor usando os valores fixos internos
-            fact["valor"] = round(random.uniform(min_valor, max_valor), 2)
-            self.facts.append(fact)
-            
-        return len(self.facts)
+        count = self.generate_data(75, SAMPLE_DIMENSIONS, values=("uniform", min_valor, max_valor))
+        self.add_level(*SAMPLE_HIERARCHY)
+        return count
 
-    def aggregate_data(self, dims, measure):
-        """Aplica filtro, agrupa e calcula a medida (sum, avg, count)."""
-        
-        # 1. Aplica o filtro (Slice)
-        filtered_facts = [f for f in self.facts if all(f[dim] == val for dim, val in self.filters.items())]
+    @synchronized
+    def generate_data(self, num_facts, dimensions, skew=None, values=("uniform", 50.0, 500.0),
+                      seed=None, progress=None):
+        """
+        Gera um cubo sintético (vetorizado, em blocos) substituindo dimensões e fatos.
+        Veja generator.generate_cube para o formato de `dimensions`, `skew` e `values`.
+        """
+        try:
+            self.hierarchies.clear()
+            return generate_cube(self.facts, num_facts, dimensions, skew, values, seed, progress=progress)
+        finally:
+            if self.backend == "memory":
+                self.index.invalidate()
+                self.running.clear()
+            self._invalidate()
+
+    @synchronized
+    def add_level(self, child, level, parents):
+        """
+        Declara um nível de hierarquia acima de `child` (dimensão base ou nível mais alto
+        de uma hierarquia existente). `parents` mapeia cada membro de `child` para o seu
+        membro em `level` (ex.: {"JAN": "T1", ...}). O nível pode ser usado como dimensão
+        nas agregações e nos filtros.
+        """
+        base = validate_level(self.dimensions, self.hierarchies, child, level, parents)
+        self.hierarchies.setdefault(base, {})[level] = dict(parents)
+        self._invalidate()
+        return base
+
+    @synchronized
+    def remove_hierarchy(self, base):
+        """Remove todos os níveis declarados sobre a dimensão `base`."""
+        if self.hierarchies.pop(base, None) is not None:
+            self._invalidate()
+
+    @synchronized
+    def level_members(self):
+        """Níveis de hierarquia e seus membros: {nível: [membros]}."""
+        return {level: list(members) for level, (_, members, _) in level_maps(self.dimensions, self.hierarchies).items()}
+
+    @synchronized
+    def aggregate_data(self, dims, measure, cancel=None):
+        """
+        Aplica filtro, agrupa e calcula a medida (sum, avg, count), usando o cache de resultados.
+        `cancel()` é chamado antes de cada estágio e a cada bloco lido; para interromper a
+        consulta, ele levanta uma exceção (ex.: background.Task.check), que é propagada.
+        """
+        with self._tracing(f"{measure.upper()} por {', '.join(dims)}", cancel) as trace:
+            key = ResultCache.make_key(self.filters, dims, measure, self.version)
+            with trace.stage("cache") as stage:
+                cached = self.cache.get(key)
+                stage.set(hit=cached is not None)
+            if cached is not None:
+                return cached
+            answer = self._compute_aggregate(dims, measure)
+            self.cache.put(key, answer)
+            return answer
+
+    @synchronized
+    def enable_profiling(self, memory=False):
+        """
+        Liga a instrumentação por estágio das consultas (tempo, linhas, grupos); `memory`
+        mede também o pico de memória de cada estágio com tracemalloc (bem mais lento).
+        """
+        self.profiler.enable(memory)
+
+    @synchronized
+    def disable_profiling(self):
+        self.profiler.disable()
+
+    @synchronized
+    def profile_next_query(self):
+        """A próxima consulta é capturada pelo cProfile (relatório em last_trace.profile)."""
+        self.profiler.capture_next()
+
+    def profile_records(self, query=None):
+        """Registros da instrumentação (dicts), de todas as consultas ou só da consulta `query`."""
+        return self.profiler.read(query)
+
+    @contextlib.contextmanager
+    def _tracing(self, label, cancel=None):
+        """Trace da consulta: os estágios internos (_filter_rows, _group_rows...) registram nele."""
+        trace = self.last_trace = self._trace = self.profiler.trace(label)
+        self._cancel = cancel
+        try:
+            with trace:
+                yield trace
+        finally:
+            self._trace = NULL_TRACE
+            self._cancel = None
+
+    def _stage(self, name, **fields):
+        """Estágio da consulta em andamento; antes de começar, atende a um pedido de cancelamento."""
+        self._check_cancel()
+        return self._trace.stage(name, **fields)
+
+    def _check_cancel(self):
+        if self._cancel is not None:
+            self._cancel()
+
+    @synchronized
+    def aggregate_sets(self, grouping_sets, measures, cancel=None):
+        """
+        Várias agregações de uma vez, como GROUPING SETS do SQL (use aggregation.cube_sets /
+        rollup_sets para CUBE e ROLLUP; () é o total geral).
+
+        As medidas exatas (sum, avg, count) de todos os conjuntos saem de uma única
+        varredura dos fatos filtrados: ela agrupa pela união das dimensões (base) e
+        cada conjunto, subtotal ou total geral é um roll-up desse resultado. Medidas
+        aproximadas (sketches) não se reagrupam e são calculadas conjunto a conjunto.
+
+        `cancel` funciona como em aggregate_data.
+
+        Returns:
+            dict: {(dimensões, medida): (resultado, erro)}, resultado no formato de aggregate_data.
+        """
+        sets = list(dict.fromkeys(tuple(dims) for dims in grouping_sets))
+        with self._tracing(f"GROUPING SETS ({len(sets)} conjuntos, {', '.join(measures)})", cancel):
+            return self._aggregate_sets(sets, measures)
 
-        if not filtered_facts:
+    def _aggregate_sets(self, sets, measures):
+        answers, pending = {}, []
+        levels = level_maps(self.dimensions, self.hierarchies) if self.hierarchies else {}
+        for dims in sets:
+            for measure in measures:
+                self._check_cancel()
+                key = ResultCache.make_key(self.filters, dims, measure, self.version)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    answers[dims, measure] = cached
+                elif parse_measure(measure) is not None or not self._known_dims(dims, levels):
+                    answers[dims, measure] = self._compute_aggregate(list(dims), measure)
+                    self.cache.put(key, answers[dims, measure])
+                else:
+                    pending.append((dims, measure, key))
+        if not pending:
+            return answers
+
+        fine = list(dict.fromkeys(levels[d][0] if d in levels else d for dims, _, _ in pending for d in dims))
+        # Fatos sem valor em alguma dimensão da união ainda contam nos conjuntos que não a usam
+        if self.backend == "sqlite":
+            # NULL vira o grupo extra no próprio GROUP BY (sem dimensões: o total geral)
+            missing = True
+            accumulators = self._group_sql(fine, self.filters, levels, missing=True)
+        elif not fine:
+            missing = False
+            # Só o total geral: soma e contagem dos fatos filtrados
+            rows = self._filter_rows(self.filters, levels)
+            with self._stage("group", path="total") as stage:
+                values = self.facts.values if rows is None else self.facts.values[rows]
+                accumulators = [], np.array([values.sum()]), np.array([len(values)], dtype=np.int64)
+                stage.set(rows=len(values), groups=1)
+        elif any(len(self.facts) and self.facts.codes(d).min() == MISSING for d in fine):
+            missing = True
+            accumulators = self._group_rows(fine, self._filter_rows(self.filters, levels), missing=True)
+        else:
+            missing = False
+            accumulators = self._group_fine(fine, self.filters, levels)
+        projected = {}
+        for dims, measure, key in pending:
+            if dims not in projected:
+                projected[dims] = self._project(fine, accumulators, dims, levels, missing)
+            groups, sums, counts = projected[dims]
+            if not len(counts):
+                answer = None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+            else:
+                with self._stage("measure", groups=len(counts)):
+                    answer = build_result(groups, self._dictionaries(dims, levels), apply_measure(sums, counts, measure)), None
+            answers[dims, measure] = answer
+            self.cache.put(key, answer)
+        return answers
+
+    def cache_stats(self):
+        """Acertos/falhas e memória ocupada pelo cache de resultados."""
+        return self.cache.stats()
+
+    def _compute_aggregate(self, dims, measure):
+        """Aplica filtro, agrupa e calcula a medida (sum, avg, count) de forma vetorizada."""
+
+        levels = level_maps(self.dimensions, self.hierarchies) if self.hierarchies else {}
+
+        # Dimensão inexistente: nenhum fato tem valor nela (e ela não é criada pela consulta)
+        if not self._known_dims(dims, levels):
+            return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+
+        # Percentis e contagens distintas: sketches por grupo (não usam acumuladores nem o cubo)
+        spec = parse_measure(measure)
+        if spec is not None:
+            if spec[0] == "distinct" and spec[1] not in self.dimensions and spec[1] not in levels:
+                return None, f"Dimensão inexistente para contagem distinta: {spec[1]}."
+            groups, values, counts = self._sketch_group(dims, self.filters, spec, levels)
+            if not len(counts):
+                return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+            with self._stage("measure", groups=len(counts)):
+                return build_result(groups, self._dictionaries(dims, levels), values), None
+
+        # Níveis de hierarquia: roll-up do resultado mais fino ou drill-down sob o membro pai
+        if any(d in levels for d in list(dims) + list(self.filters)):
+            groups, sums, counts = self._group_levels(dims, self.filters, levels)
+            if not len(counts):
+                return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+            with self._stage("measure", groups=len(counts)):
+                return build_result(groups, self._dictionaries(dims, levels), apply_measure(sums, counts, measure)), None
+
+        # 0. Agregação ativa mantida incrementalmente (ou cubo / varredura filtrada pelo plano)
+        groups, sums, counts = self._group_fine(dims, self.filters, levels)
+
+        if not len(counts):
             return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
 
-        # 2. Agrupar dados
-        data = defaultdict(list)
-        for f in filtered_facts:
-            key = tuple(f[d] for d in dims)
-            data[key].append(f["valor"])
-            
         # 3. Calcular a Medida
-        if measure == "sum":
-            result = {k: sum(v) for k,v in data.items()}
-        elif measure == "avg":
-            result = {k: sum(v)/len(v) for k,v in data.items()}
-        else: # count
-            result = {k: len(v) for k,v in data.items()}
-            
-        return result, None
\ No newline at end of file
+        with self._stage("measure", groups=len(counts)):
+            result = build_result(groups, [self.dimensions[d] for d in dims], apply_measure(sums, counts, measure))
+        return result, None
+
+    def _group(self, dims, filters):
+        """Acumuladores (grupos, somas, contagens) a partir do cubo materializado ou dos fatos."""
+
+        # 1. Consulta coberta pelo cubo materializado: roll-up sem varrer os fatos
+        if self.cube is not None and len(self.facts):
+            with self._stage("group", path="cube") as stage:
+                answer = self.cube.answer(dims, filters)
+                if answer is not None:
+                    stage.set(groups=len(answer[2]))
+            if answer is not None:
+                return answer
+
+        # 2. Aplica o filtro (Slice): plano de predicados -> posições dos fatos selecionados
+        return self._group_rows(dims, self._filter_rows(filters, {}))
+
+    def _group_rows(self, dims, rows, missing=False):
+        """
+        Acumuladores dos fatos nas posições `rows` (None = todos) agrupados por dimensões base.
+        Com `missing`, fatos sem valor em uma dimensão formam o grupo de código `cardinalidade`
+        (em vez de ficarem de fora), para que subtotais reagrupados incluam esses fatos.
+        """
+
+        # 3. Agrupar dados (só as linhas selecionadas): códigos -> índice único de grupo
+        code_arrays = [self.facts.codes(d) for d in dims]
+        values = self.facts.values
+        if rows is not None:
+            code_arrays = [codes[rows] for codes in code_arrays]
+            values = values[rows]
+        cardinalities = [len(self.dimensions[d]) for d in dims]
+        if missing:
+            code_arrays = [np.where(codes == MISSING, card, codes) for codes, card in zip(code_arrays, cardinalities)]
+            cardinalities = [card + 1 for card in cardinalities]
+        with self._stage("group", rows=len(values)) as stage:
+            if self.parallel is not None:
+                accumulators = self.parallel.aggregate(code_arrays, cardinalities, values)
+            else:
+                accumulators = aggregate_codes(code_arrays, cardinalities, values)
+            stage.set(groups=len(accumulators[2]), path="parallel" if self.parallel is not None else "scan")
+        return accumulators
+
+    def _group_levels(self, dims, filters, levels):
+        """
+        Agregação com níveis de hierarquia nas dimensões e/ou nos filtros.
+
+        Roll-up: o resultado no nível mais fino (acumuladores ativos ou uma varredura,
+        que passa a ser acompanhada) é reagrupado pelos arrays de mapeamento, sem
+        varrer os fatos de novo. Drill-down (filtro em um nível): só os fatos sob o
+        membro pai selecionado são varridos.
+        """
+        fine = list(dict.fromkeys(levels[d][0] if d in levels else d for d in dims))
+        return self._project(fine, self._group_fine(fine, filters, levels), dims, levels)
+
+    def _group_fine(self, fine, filters, levels):
+        """Acumuladores por dimensões base `fine`: acumuladores ativos, cubo, varredura ou GROUP BY no SQLite."""
+        if self.backend == "sqlite":
+            return self._group_sql(fine, filters, levels)
+        # Acumuladores e cubo só entendem igualdades em dimensões base
+        if not is_equality(filters) or any(d in levels for d in filters):
+            return self._group_rows(fine, self._filter_rows(filters, levels))
+        running = self.running.get(fine, filters)
+        if running is not None:
+            with self._stage("group", path="running") as stage:
+                accumulators = running.snapshot()
+                stage.set(groups=len(accumulators[2]))
+            return accumulators
+        groups, sums, counts = self._group(fine, filters)
+        self.running.track(fine, filters, groups, sums, counts)
+        return groups, sums, counts
+
+    def _group_sql(self, fine, filters, levels, missing=False):
+        """Acumuladores calculados pelo SQLite (WHERE + GROUP BY); `rows` = fatos agregados."""
+        with self._stage("group", path="sqlite") as stage:
+            accumulators = self.facts.group(fine, filters, levels, missing=missing)
+            stage.set(rows=int(accumulators[2].sum()), groups=len(accumulators[2]))
+        return accumulators
+
+    def _project(self, fine, accumulators, dims, levels, missing=False):
+        """
+        Reagrupa acumuladores por `fine` em `dims` (subconjunto de `fine` e/ou níveis acima dele).
+        `missing`: os acumuladores têm o grupo extra dos fatos sem valor (ver _group_rows).
+        """
+        groups, sums, counts = accumulators
+        if not dims:
+            return grand_total(sums, counts)
+        sources = [fine.index(levels[d][0] if d in levels else d) for d in dims]
+        # O mapeamento dos níveis já leva o código extra a MISSING; nas dimensões base é a identidade
+        mappings = [levels[d][2] if d in levels else
+                    np.append(np.arange(len(self.dimensions[d])), MISSING) if missing else None for d in dims]
+        with self._stage("rollup", rows=len(counts)) as stage:
+            projected = rollup(groups, sums, counts, sources, mappings, self._cardinalities(dims, levels))
+            stage.set(groups=len(projected[2]))
+        return projected
+
+    def _filter_rows(self, filters, levels):
+        """
+        Posições dos fatos selecionados pelos filtros (None = todos). O plano ordena os
+        predicados por seletividade e escolhe índice bitmap ou varredura para cada um;
+        membros de um nível viram o conjunto dos seus códigos na dimensão base (drill-down).
+        """
+        if not filters:
+            return None
+        with self._stage("filter", total=len(self.facts)) as stage:
+            rows = FilterPlan(self.facts, self.index, filters, levels, self.code_counts.at(self.version)).rows()
+            stage.set(rows=len(self.facts) if rows is None else len(rows))
+        return rows
+
+    def _codes(self, dim, levels):
+        """Coluna de códigos de uma dimensão base ou de um nível (traduzida pelo mapeamento)."""
+        if dim in levels:
+            base, _, mapping = levels[dim]
+            return mapping[self.facts.codes(base)]
+        return self.facts.codes(dim)
+
+    def _known_dims(self, dims, levels):
+        return all(d in self.dimensions or d in levels for d in dims)
+
+    def _cardinalities(self, dims, levels):
+        return [len(levels[d][1]) if d in levels else len(self.dimensions[d]) for d in dims]
+
+    def _dictionaries(self, dims, levels):
+        return [levels[d][1] if d in levels else self.dimensions[d] for d in dims]
+
+    def _sketch_group(self, dims, filters, spec, levels):
+        """(grupos, medida aproximada, contagens) a partir de sketches mescláveis por bloco/processo."""
+        if self.backend == "sqlite":
+            return self._sketch_sql(dims, filters, spec, levels)
+        rows = self._filter_rows(filters, levels)
+        code_arrays = [self._codes(d, levels) for d in dims]
+        column = self.facts.values if spec[0] == "quantile" else self._codes(spec[1], levels)
+        if rows is not None:
+            code_arrays = [codes[rows] for codes in code_arrays]
+            column = column[rows]
+        cardinalities = self._cardinalities(dims, levels)
+        with self._stage("sketch", rows=len(column)) as stage:
+            if self.parallel is not None:
+                answer = self.parallel.sketch(code_arrays, cardinalities, column, spec)
+            else:
+                answer = sketch_aggregate(code_arrays, cardinalities, column, spec)
+            stage.set(groups=len(answer[2]), path="parallel" if self.parallel is not None else "scan")
+        return answer
+
+    def _sketch_sql(self, dims, filters, spec, levels):
+        """Sketches sobre os fatos filtrados lidos do SQLite em blocos (memória limitada a um bloco)."""
+        bases = [levels[d][0] if d in levels else d for d in dims]
+        counted = spec[0] == "distinct" and spec[1] in levels
+        field = VALUE_FIELD if spec[0] == "quantile" else levels[spec[1]][0] if counted else spec[1]
+        cardinalities = self._cardinalities(dims, levels)
+        merged, rows = {}, 0
+        with self._stage("sketch", path="sqlite") as stage:
+            for code_arrays, column in self.facts.scan(bases, field, filters, levels):
+                self._check_cancel()
+                # Códigos da base -> códigos do nível (o elemento extra do mapeamento preserva MISSING)
+                code_arrays = [levels[d][2][codes] if d in levels else codes for d, codes in zip(dims, code_arrays)]
+                if counted:
+                    column = levels[spec[1]][2][column]
+                merged = merge_sketch_partials([merged, sketch_partials(code_arrays, cardinalities, column, spec)])
+                rows += len(column)
+            stage.set(rows=rows, groups=len(merged))
+        return sketch_result(merged, cardinalities, spec)
+
+    @synchronized
+    def set_filters(self, filters):
+        """
+        Substitui os filtros ativos (Slice & Dice): igualdade, lista, exclusão ou faixa
+        sobre "valor" (ver predicates.py). Levanta ValueError se algum predicado for inválido.
+        """
+        filters = parse_filters(filters)
+        self.filters.clear()
+        self.filters.update(filters)
+
+    @synchronized
+    def index_stats(self, filters=None):
+        """
+        Seletividade de cada filtro (e da combinação) e o plano de avaliação: predicados
+        na ordem executada, com o método escolhido (índice ou varredura) para cada um.
+        """
+        filters = self.filters if filters is None else parse_filters(filters)
+        levels = level_maps(self.dimensions, self.hierarchies) if self.hierarchies else {}
+        if self.backend == "sqlite":
+            return self._sql_stats(filters, levels)
+        plan = FilterPlan(self.facts, self.index, filters, levels, self.code_counts.at(self.version))
+        rows = plan.rows()
+        total = len(self.facts)
+        count = total if rows is None else len(rows)
+        return {
+            "total": total,
+            "filters": [{"dim": step.dim, "value": step.spec, "rows": int(round(step.selectivity * total)),
+                         "selectivity": step.selectivity, "method": step.method} for step in plan.steps],
+            "rows": count,
+            "selectivity": count / total if total else 0.0,
+            "nbytes": self.index.nbytes,
+        }
+
+    def _sql_stats(self, filters, levels):
+        """index_stats no SQLite: contagens de cada filtro e da combinação feitas pelo banco (com os índices)."""
+        total = len(self.facts)
+        steps = sorted(((dim, spec, self.facts.count({dim: spec}, levels)) for dim, spec in filters.items()),
+                       key=lambda step: step[2])
+        count = self.facts.count(filters, levels) if filters else total
+        return {
+            "total": total,
+            "filters": [{"dim": dim, "value": spec, "rows": rows, "selectivity": rows / total if total else 0.0,
+                         "method": "sql"} for dim, spec, rows in steps],
+            "rows": count,
+            "selectivity": count / total if total else 0.0,
+            # Os índices ficam no banco, fora da memória do processo
+            "nbytes": 0,
+        }
+
+    @synchronized
+    def save_cube(self, path, progress=None):
+        """
+        Salva dimensões e fatos. Arquivos `.olap` usam o formato binário colunar;
+        `.sqlite`/`.db`, um banco SQLite (abre sem carregar os fatos na memória);
+        os demais, JSON compacto gravado em blocos. Do SQLite para os outros formatos
+        os fatos passam pela memória. Sobrescrever o binário do qual o cubo atual está
+        mapeado copia antes as colunas para a memória (o mapeamento é liberado).
+        """
+        if is_sqlite_path(path):
+            if self.backend == "sqlite":
+                return self.facts.backup(path, progress=progress)
+            return self._write_sqlite(path, progress)
+        facts = self.facts
+        if self.backend == "sqlite":
+            facts = FactStore(self.dimensions)
+            self.facts.export(facts)
+        elif os.path.exists(path) and any(os.path.samefile(f, path) for f in facts.mapped_files()):
+            # O arquivo de destino é o próprio cubo mapeado: o Windows não substitui um arquivo
+            # aberto, então as colunas passam para a memória antes da gravação
+            facts.release_mapping()
+        if path.lower().endswith(BINARY_EXTENSION):
+            return write_binary_cube(path, self.dimensions, facts, progress=progress,
+                                     hierarchies=self.hierarchies)
+        return write_cube(path, self.dimensions, facts, progress=progress, hierarchies=self.hierarchies)
+
+    def _write_sqlite(self, path, progress=None):
+        """Grava os fatos em memória em um novo banco SQLite (arquivo temporário renomeado ao final)."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        store = SQLiteStore({dim: list(values) for dim, values in self.dimensions.items()}, tmp_path,
+                            hierarchies=self.hierarchies)
+        try:
+            self._copy_facts(self.facts, store, progress)
+        except BaseException:
+            store.close()
+            os.remove(tmp_path)
+            raise
+        store.close()
+        os.replace(tmp_path, path)
+        return len(self.facts)
+
+    @staticmethod
+    def _copy_facts(source, target, progress=None):
+        """Copia as colunas de um FactStore para outro armazenamento, em blocos."""
+        total = len(source)
+        for start in range(0, total, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, total)
+            target.append_columns({dim: source.codes(dim)[start:stop] for dim in source.dimensions},
+                                  source.values[start:stop])
+            if progress:
+                progress(stop, total)
+
+    @synchronized
+    def set_backend(self, backend, db_path=""):
+        """
+        Converte o cubo atual para outro armazenamento: "sqlite" grava os fatos em um
+        novo banco em `db_path` ("" = temporário em disco, apagado ao fechar) e as
+        agregações passam a ser feitas pelo banco; "memory" lê os fatos de volta.
+        Para abrir um banco existente, use load_cube.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Armazenamento desconhecido: {backend}.")
+        if backend == self.backend:
+            return len(self.facts)
+        if db_path and os.path.exists(db_path):
+            raise ValueError(f"O arquivo {db_path} já existe; para abri-lo, use Carregar Cubo.")
+        old = self.facts
+        if backend == "sqlite":
+            store = SQLiteStore(self.dimensions, db_path, hierarchies=self.hierarchies)
+            self._copy_facts(old, store)
+            store.flush()
+        else:
+            store = FactStore(self.dimensions)
+            old.export(store)
+            old.close()
+        self._bind_storage(store)
+        if self.backend == "memory":
+            # O índice é montado no primeiro filtro
+            self.index.invalidate()
+        self._invalidate()
+        return len(self.facts)
+
+    @synchronized
+    def close(self):
+        """Encerra processos auxiliares e grava/fecha o banco SQLite (o temporário é apagado)."""
+        self.disable_parallel()
+        if self.backend == "sqlite":
+            self.facts.close()
+
+    @synchronized
+    def load_cube(self, path, progress=None, verify=False, backend=None, db_path=""):
+        """
+        Carrega um cubo (binário mapeado em memória, JSON compacto, JSON antigo ou banco
+        SQLite), substituindo dimensões, hierarquias, fatos e filtros. `verify` confere os
+        checksums do binário. Bancos `.sqlite`/`.db` são abertos direto (os fatos ficam no
+        disco; com backend="memory", são lidos para a memória); os demais formatos vão para o armazenamento atual ou para `backend`
+        (com "sqlite", importados em blocos para um banco em `db_path`, "" = temporário).
+
+        O cubo é lido em um armazenamento novo, que só substitui o atual no fim: uma
+        falha ou um cancelamento (exceção levantada por `progress`) mantém o cubo anterior.
+        """
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError(f"Armazenamento desconhecido: {backend}.")
+        if is_sqlite_path(path) and not os.path.exists(path):
+            raise FileNotFoundError(f"Arquivo não encontrado: {path}")
+        dimensions, hierarchies = {}, {}
+        created = ""
+        if is_sqlite_path(path):
+            store = SQLiteStore(dimensions, path, hierarchies=hierarchies, create=False)
+        elif (backend or self.backend) == "sqlite":
+            created = db_path if db_path and not os.path.exists(db_path) else ""
+            store = SQLiteStore(dimensions, db_path, hierarchies=hierarchies)
+        else:
+            store = FactStore(dimensions)
+        try:
+            if is_sqlite_path(path):
+                if backend == "memory":
+                    memory = FactStore(dimensions)
+                    store.export(memory)
+                    store.close()
+                    store = memory
+            elif is_binary_cube(path):
+                read_binary_cube(path, dimensions, store, verify=verify, progress=progress, hierarchies=hierarchies)
+            else:
+                read_cube(path, dimensions, store, progress=progress, hierarchies=hierarchies)
+        except BaseException:
+            if isinstance(store, SQLiteStore):
+                store.close()
+                if created and os.path.exists(created):
+                    os.remove(created)
+            raise
+        self._replace_cube(store, dimensions, hierarchies)
+        return len(self.facts)
+
+    def _replace_cube(self, store, dimensions, hierarchies):
+        """Troca o cubo atual pelo recém-carregado em `store` (os dicts do modelo são preservados)."""
+        if self.backend == "sqlite" and self.facts is not store:
+            self.facts.close()
+        self.dimensions.clear()
+        self.dimensions.update(dimensions)
+        self.hierarchies.clear()
+        self.hierarchies.update(hierarchies)
+        store.dimensions = self.dimensions
+        if isinstance(store, SQLiteStore):
+            store.hierarchies = self.hierarchies
+        # O índice é montado no primeiro filtro (colunas mapeadas não são lidas agora)
+        self._bind_storage(store)
+        self.filters.clear()
+        self._invalidate()
+
+    def _invalidate(self):
+        """Chamado a cada mutação de dimensões/fatos: estruturas derivadas ficam desatualizadas."""
+        self.version += 1
+        self.cache.invalidate(self.version)
+        if self.cube is not None:
+            self.cube.invalidate()
@@ -0,0 +1,248 @@
+# fact_store.py
+
+import numpy as np
+
+# Código reservado para "valor ausente" (fato sem aquela dimensão)
+MISSING = -1
+
+_INITIAL_CAPACITY = 1024
+_ITER_CHUNK = 65536
+
+
+def code_dtype(cardinality):
+    """Retorna o menor tipo inteiro (com sinal) capaz de guardar os códigos de uma dimensão."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if cardinality <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+class FactStore:
+    """
+    Armazenamento colunar dos fatos.
+
+    Cada dimensão vira um array compacto de códigos inteiros, usando a lista de
+    valores da própria dimensão (em `dimensions`) como dicionário. A medida
+    "valor" fica em um array contíguo float64. Para a UI o objeto continua se
+    comportando como a antiga lista de dicts (len, iteração, append, clear).
+    """
+
+    def __init__(self, dimensions, facts=None):
+        self.dimensions = dimensions
+        self.reset()
+        if facts:
+            self.extend(facts)
+
+    # ----------------------------------------------------
+    # ---------- Interface de lista (compatibilidade) ----------
+    # ----------------------------------------------------
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError("índice de fato fora do intervalo")
+        fact = {}
+        for dim, codes in self._codes.items():
+            code = codes[i]
+            if code != MISSING:
+                fact[dim] = self.dimensions[dim][code]
+        fact["valor"] = float(self._valor[i])
+        return fact
+
+    def __iter__(self):
+        # Decodifica em blocos para não materializar todas as linhas de uma vez
+        for start in range(0, self._size, _ITER_CHUNK):
+            stop = min(start + _ITER_CHUNK, self._size)
+            columns = [(dim, self.dimensions[dim], codes[start:stop].tolist())
+                       for dim, codes in self._codes.items()]
+            valores = self._valor[start:stop].tolist()
+            for j, valor in enumerate(valores):
+                fact = {dim: values[col[j]] for dim, values, col in columns if col[j] != MISSING}
+                fact["valor"] = valor
+                yield fact
+
+    def append(self, fact):
+        """Adiciona um fato no formato dict {dimensão: valor, ..., "valor": float}."""
+        valor = float(fact["valor"])
+        row = {dim: self.encode(dim, value) for dim, value in fact.items() if dim != "valor"}
+
+        self._reserve(self._size + 1)
+        for dim, code in row.items():
+            self._codes[dim][self._size] = code
+        self._valor[self._size] = valor
+        self._size += 1
+
+    def extend(self, facts):
+        for fact in facts:
+            self.append(fact)
+
+    def append_columns(self, codes, values):
+        """
+        Anexa fatos em lote diretamente nas colunas, sem criar dicts por linha.
+        `codes` mapeia dimensão -> array de códigos (já no dicionário da dimensão);
+        dimensões omitidas ficam como ausentes.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        for dim, column in codes.items():
+            self._ensure_dimension(dim)
+            if len(column) != count:
+                raise ValueError(f"Coluna '{dim}' com {len(column)} linhas, esperado {count}.")
+            if count and (column.min() < MISSING or column.max() >= len(self.dimensions[dim])):
+                raise ValueError(f"Código fora do dicionário da dimensão '{dim}'.")
+
+        start, stop = self._size, self._size + count
+        self._reserve(stop)
+        for dim, column in codes.items():
+            self._codes[dim][start:stop] = column
+        self._valor[start:stop] = values
+        self._size = stop
+        return start, stop
+
+    def attach_columns(self, codes, values):
+        """
+        Substitui todo o conteúdo por colunas externas (ex.: np.memmap) sem copiá-las.
+        A primeira mutação posterior copia as colunas para a memória.
+        """
+        self._size = self._capacity = len(values)
+        self._lookup = {}
+        self._codes = {dim: column for dim, column in codes.items() if dim in self.dimensions}
+        self._valor = values
+        for dim in self.dimensions:
+            self._ensure_dimension(dim)
+
+    def reset(self):
+        """Descarta todos os fatos e reconstrói os dicionários a partir de `dimensions`."""
+        self._size = 0
+        self._capacity = _INITIAL_CAPACITY
+        self._lookup = {}
+        self._codes = {}
+        self._valor = np.zeros(self._capacity, dtype=np.float64)
+        for dim in self.dimensions:
+            self._ensure_dimension(dim)
+
+    clear = reset
+
+    # ----------------------------------------------------
+    # ---------- Acesso Colunar ----------
+    # ----------------------------------------------------
+
+    def codes(self, dim):
+        """
+        Array (view) com os códigos da dimensão para todos os fatos. Uma dimensão
+        inexistente não é criada: o resultado é uma view somente leitura toda MISSING.
+        """
+        if dim not in self.dimensions:
+            return np.broadcast_to(np.array(MISSING, dtype=np.int8), (self._size,))
+        self._ensure_dimension(dim)
+        return self._codes[dim][:self._size]
+
+    @property
+    def values(self):
+        """Array (view) float64 com a medida "valor" de todos os fatos."""
+        return self._valor[:self._size]
+
+    def encode(self, dim, value):
+        """Código do valor na dimensão; valores novos estendem o dicionário da dimensão."""
+        lookup = self._ensure_dimension(dim)
+        code = lookup.get(value)
+        if code is None:
+            values = self.dimensions[dim]
+            code = len(values)
+            values.append(value)
+            lookup[value] = code
+            self._fit_dtype(dim)
+        return code
+
+    def lookup(self, dim, value):
+        """Código do valor na dimensão, ou None se ele não existir (não altera o dicionário)."""
+        if dim not in self.dimensions:
+            return None
+        return self._ensure_dimension(dim).get(value)
+
+    def set_dimension(self, name, values):
+        """
+        Define (ou redefine) os valores de uma dimensão, remapeando os códigos já gravados.
+        Valores antigos que ainda são usados por algum fato são mantidos ao final da lista.
+        """
+        values = list(dict.fromkeys(values))
+        old_values = self.dimensions.get(name)
+
+        if old_values is None or not self._size:
+            self.dimensions[name] = values
+            self._lookup.pop(name, None)
+            self._codes.pop(name, None)
+            self._ensure_dimension(name)
+            return
+
+        codes = self.codes(name)
+        used = np.unique(codes[codes != MISSING])
+        kept = set(values)
+        merged = values + [old_values[c] for c in used if old_values[c] not in kept]
+        new_lookup = {v: i for i, v in enumerate(merged)}
+        remap = np.array([new_lookup.get(v, MISSING) for v in old_values], dtype=np.int64)
+
+        column = np.full(self._capacity, MISSING, dtype=code_dtype(len(merged)))
+        valid = codes != MISSING
+        column[:self._size][valid] = remap[codes[valid]]
+
+        self.dimensions[name] = merged
+        self._lookup[name] = new_lookup
+        self._codes[name] = column
+
+    def reserve(self, size):
+        """Pré-aloca capacidade para `size` fatos (evita cópias de crescimento em cargas grandes)."""
+        self._reserve(size)
+
+    def mapped_files(self):
+        """Arquivos dos quais há colunas mapeadas em memória (np.memmap, ver attach_columns)."""
+        columns = list(self._codes.values()) + [self._valor]
+        return {c.filename for c in columns if isinstance(c, np.memmap) and c.filename}
+
+    def release_mapping(self):
+        """Copia para a memória as colunas mapeadas, liberando o arquivo (ex.: para substituí-lo)."""
+        self._codes = {dim: np.array(c) if isinstance(c, np.memmap) else c for dim, c in self._codes.items()}
+        if isinstance(self._valor, np.memmap):
+            self._valor = np.array(self._valor)
+
+    def nbytes(self):
+        """Memória ocupada pelas colunas (incluindo capacidade reservada)."""
+        return self._valor.nbytes + sum(c.nbytes for c in self._codes.values())
+
+    # ----------------------------------------------------
+    # ---------- Funções Auxiliares ----------
+    # ----------------------------------------------------
+
+    def _ensure_dimension(self, dim):
+        values = self.dimensions.setdefault(dim, [])
+        lookup = self._lookup.get(dim)
+        if lookup is None or len(lookup) != len(values):
+            # Dicionário desatualizado (ex.: lista alterada diretamente): reconstrói
+            lookup = self._lookup[dim] = {v: i for i, v in enumerate(values)}
+        if dim not in self._codes:
+            self._codes[dim] = np.full(self._capacity, MISSING, dtype=code_dtype(len(values)))
+        else:
+            self._fit_dtype(dim)
+        return lookup
+
+    def _fit_dtype(self, dim):
+        dtype = code_dtype(len(self.dimensions[dim]))
+        if np.dtype(dtype).itemsize > self._codes[dim].dtype.itemsize:
+            self._codes[dim] = self._codes[dim].astype(dtype)
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        for dim, codes in self._codes.items():
+            column = np.full(capacity, MISSING, dtype=codes.dtype)
+            column[:self._size] = codes[:self._size]
+            self._codes[dim] = column
+        valor = np.zeros(capacity, dtype=np.float64)
+        valor[:self._size] = self._valor[:self._size]
+        self._valor = valor
+        self._capacity = capacity
@@ -0,0 +1,81 @@
+# generator.py
+
+import numpy as np
+
+# Fatos gerados por bloco: limita a memória temporária independentemente do total
+GENERATE_CHUNK = 1_000_000
+
+
+def generate_cube(facts, num_facts, dimensions, skew=None, values=("uniform", 50.0, 500.0),
+                  seed=None, chunk_size=GENERATE_CHUNK, progress=None):
+    """
+    Gera um cubo sintético direto nas colunas do FactStore, em blocos (vetorizado).
+
+    Args:
+        facts (FactStore): Destino; dimensões e fatos atuais são substituídos.
+        num_facts (int): Número de fatos a gerar.
+        dimensions (dict): Dimensão -> lista de valores, ou cardinalidade (int) para
+            gerar valores "DIM_0001", "DIM_0002", ...
+        skew (dict, optional): Dimensão -> "uniform" (padrão) ou expoente Zipf (float > 0).
+        values (tuple): Distribuição da medida: ("uniform", min, max), ("normal", média, desvio)
+            ou ("lognormal", média, sigma). Os valores são arredondados em 2 casas.
+        seed (int, optional): Semente; a mesma semente reproduz exatamente o mesmo cubo.
+        progress (callable, optional): progress(gerados, total) a cada bloco.
+
+    Returns:
+        int: número de fatos no FactStore.
+    """
+    skew = skew or {}
+    rng = np.random.default_rng(seed)
+
+    facts.dimensions.clear()
+    for name, spec in dimensions.items():
+        if isinstance(spec, int):
+            width = len(str(spec))
+            spec = [f"{name}_{i:0{width}d}" for i in range(1, spec + 1)]
+        facts.dimensions[name] = list(spec)
+    facts.reset()
+    facts.reserve(num_facts)
+
+    probabilities = {name: _probabilities(len(vals), skew.get(name, "uniform"))
+                     for name, vals in facts.dimensions.items()}
+
+    for start in range(0, num_facts, chunk_size):
+        size = min(chunk_size, num_facts - start)
+        codes = {name: _sample_codes(rng, len(facts.dimensions[name]), p, size)
+                 for name, p in probabilities.items()}
+        facts.append_columns(codes, _sample_values(rng, values, size))
+        if progress:
+            progress(start + size, num_facts)
+    return len(facts)
+
+
+def _probabilities(cardinality, skew):
+    """None para uniforme; senão as probabilidades Zipf (p_k ∝ 1/k^s) dos códigos."""
+    if skew in (None, "uniform") or cardinality == 0:
+        return None
+    weights = 1.0 / np.arange(1, cardinality + 1, dtype=np.float64) ** float(skew)
+    return weights / weights.sum()
+
+
+def _sample_codes(rng, cardinality, probabilities, size):
+    dtype = np.int32
+    if probabilities is None:
+        return rng.integers(0, cardinality, size, dtype=dtype)
+    # Busca binária na distribuição acumulada (equivalente a rng.choice com p, sem cópias extras)
+    cdf = np.cumsum(probabilities)
+    cdf[-1] = 1.0
+    return np.searchsorted(cdf, rng.random(size), side="right").astype(dtype)
+
+
+def _sample_values(rng, spec, size):
+    kind, a, b = spec
+    if kind == "uniform":
+        values = rng.uniform(a, b, size)
+    elif kind == "normal":
+        values = rng.normal(a, b, size)
+    elif kind == "lognormal":
+        values = rng.lognormal(a, b, size)
+    else:
+        raise ValueError(f"Distribuição de valores desconhecida: {kind}")
+    return np.round(values, 2)
@@ -0,0 +1,95 @@
+# hierarchy.py
+
+import numpy as np
+
+from aggregation import aggregate_codes
+from fact_store import MISSING
+
+# Hierarquias ficam em um dict serializável (persistido no arquivo do cubo):
+#
+#   {"MÊS": {"TRIMESTRE": {"JAN": "T1", "FEV": "T1", ...},
+#            "ANO": {"T1": "2024", "T2": "2024", ...}}}
+#
+# A chave externa é a dimensão base; cada nível mapeia os membros do nível
+# anterior (mais fino) para os seus membros, na ordem do mais fino ao mais grosso.
+
+
+def validate_level(dimensions, hierarchies, child, level, parents):
+    """
+    Confere um novo nível acima de `child` (dimensão base ou nível mais grosso de uma hierarquia).
+    Retorna a dimensão base da hierarquia. Levanta ValueError se a declaração for inválida.
+    """
+    levels = level_maps(dimensions, hierarchies)
+    if level in dimensions or level in levels:
+        raise ValueError(f"Já existe uma dimensão ou nível chamado '{level}'.")
+    if child in dimensions:
+        base = child
+        if hierarchies.get(base):
+            coarsest = list(hierarchies[base])[-1]
+            raise ValueError(f"'{base}' já tem hierarquia; acrescente níveis acima de '{coarsest}'.")
+        members = dimensions[base]
+    elif child in levels:
+        base, members, _ = levels[child]
+        if list(hierarchies[base])[-1] != child:
+            raise ValueError(f"'{child}' não é o nível mais alto da hierarquia de '{base}'.")
+    else:
+        raise ValueError(f"Dimensão ou nível inexistente: {child}.")
+
+    unmapped = [m for m in members if m not in parents]
+    if unmapped:
+        raise ValueError(f"Membros de '{child}' sem pai em '{level}': {', '.join(map(str, unmapped))}.")
+    return base
+
+
+def level_maps(dimensions, hierarchies):
+    """
+    Para cada nível: (dimensão base, membros do nível, mapeamento código base -> código do nível).
+    O mapeamento tem um elemento extra no fim (MISSING), então mapping[codes] preserva os ausentes.
+    """
+    maps = {}
+    for base, levels in hierarchies.items():
+        if base not in dimensions:
+            continue
+        members = list(dimensions[base])
+        mapping = np.arange(len(members), dtype=np.int64)
+        for level, parents in levels.items():
+            # Membros do nível na ordem em que aparecem subindo do nível anterior
+            level_members = list(dict.fromkeys(parents[m] for m in members if m in parents))
+            position = {m: i for i, m in enumerate(level_members)}
+            step = np.array([position.get(parents.get(m), MISSING) for m in members] + [MISSING], dtype=np.int64)
+            mapping = step[mapping]
+            members = level_members
+            maps[level] = (base, members, np.append(mapping, MISSING))
+    return maps
+
+
+def child_codes(levels, level, member):
+    """Códigos da dimensão base sob um membro do nível (usados no drill-down)."""
+    base, members, mapping = levels[level]
+    if member not in members:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(mapping[:-1] == members.index(member))
+
+
+def expand_levels(fact, hierarchies):
+    """Valores dos níveis para um fato (dict), subindo a cadeia de pais de cada dimensão base."""
+    values = {}
+    for base, levels in hierarchies.items():
+        member = fact.get(base)
+        for level, parents in levels.items():
+            member = parents.get(member)
+            if member is None:
+                break
+            values[level] = member
+    return values
+
+
+def rollup(groups, sums, counts, sources, mappings, cardinalities):
+    """
+    Reagrupa um resultado já calculado no nível mais fino (grupos, somas, contagens)
+    em níveis mais altos, sem varrer os fatos: cada dimensão de saída pega a coluna
+    `sources[i]` dos grupos, traduzida por `mappings[i]` (None = dimensão base).
+    """
+    code_arrays = [groups[src] if mapping is None else mapping[groups[src]]
+                   for src, mapping in zip(sources, mappings)]
+    return aggregate_codes(code_arrays, cardinalities, sums, counts=counts)
@@ -0,0 +1,211 @@
+# incremental.py
+
+from collections import OrderedDict
+
+import numpy as np
+
+from aggregation import dense_groups, group_partials, unravel_groups
+from fact_store import MISSING
+
+
+# Memória total (bytes) dos acumuladores mantidos por RunningAggregates; as agregações
+# usadas há mais tempo são descartadas primeiro quando o orçamento é ultrapassado
+RUNNING_MAX_BYTES = 32 << 20
+
+
+class RunningAggregate:
+    """
+    Acumuladores (soma, contagem) por grupo de uma agregação ativa, mantidos fato a fato.
+
+    Os grupos são identificados pelo índice plano (base mista, aggregation.group_index).
+    Quando o produto das cardinalidades é pequeno perto do número de fatos
+    (aggregation.dense_groups), somas e contagens ficam em arrays densos indexados por ele;
+    caso contrário, em arrays esparsos alinhados com os índices ordenados (`keys`) dos
+    grupos não vazios. Valores novos nos dicionários das dimensões ampliam o índice,
+    preservando os grupos já acumulados.
+    """
+
+    def __init__(self, facts, dims, filters, groups, sums, counts):
+        self.facts = facts
+        self.dims = tuple(dims)
+        self.filters = dict(filters)
+        self._filter_codes = {dim: facts.lookup(dim, val) for dim, val in self.filters.items()}
+        self.cards = self._cardinalities()
+        self.cells = _cells(self.cards)
+        flat = np.ravel_multi_index(groups, self.cards) if self.dims else np.zeros(len(counts), dtype=np.int64)
+        if dense_groups(self.cells, len(facts)):
+            self.keys = None
+            self.sums = np.zeros(self.cells, dtype=np.float64)
+            self.counts = np.zeros(self.cells, dtype=np.int64)
+            self.sums[flat] = sums
+            self.counts[flat] = counts
+        else:
+            order = np.argsort(flat, kind="stable")
+            self.keys = np.asarray(flat, dtype=np.int64)[order]
+            self.sums = np.asarray(sums, dtype=np.float64)[order]
+            self.counts = np.asarray(counts, dtype=np.int64)[order]
+
+    @property
+    def dense(self):
+        return self.keys is None
+
+    @property
+    def nbytes(self):
+        """Memória ocupada pelos acumuladores."""
+        return self.sums.nbytes + self.counts.nbytes + (0 if self.dense else self.keys.nbytes)
+
+    def add_row(self, row):
+        """Aplica um único fato (posição `row` do FactStore): O(1) denso, O(grupos) esparso."""
+        for dim, code in self._filter_codes.items():
+            if code is None:
+                # O valor do filtro pode ter surgido no dicionário depois do registro
+                code = self._filter_codes[dim] = self.facts.lookup(dim, self.filters[dim])
+            if code is None or self.facts.codes(dim)[row] != code:
+                return
+        key = tuple(int(self.facts.codes(d)[row]) for d in self.dims)
+        if MISSING in key:
+            return
+        self._fit()
+        flat = int(np.ravel_multi_index(key, self.cards)) if key else 0
+        value = float(self.facts.values[row])
+        if self.dense:
+            self.sums[flat] += value
+            self.counts[flat] += 1
+            return
+        pos = int(np.searchsorted(self.keys, flat))
+        if pos < len(self.keys) and self.keys[pos] == flat:
+            self.sums[pos] += value
+            self.counts[pos] += 1
+        else:
+            self.keys = np.insert(self.keys, pos, flat)
+            self.sums = np.insert(self.sums, pos, value)
+            self.counts = np.insert(self.counts, pos, 1)
+
+    def add_rows(self, start, stop):
+        """Aplica de uma vez os fatos das posições [start, stop) (anexação em lote)."""
+        mask = np.ones(stop - start, dtype=bool)
+        for dim, val in self.filters.items():
+            code = self._filter_codes[dim] = self.facts.lookup(dim, val)
+            if code is None:
+                return
+            mask &= self.facts.codes(dim)[start:stop] == code
+        self._fit()
+        groups, sums, counts = group_partials([self.facts.codes(d)[start:stop][mask] for d in self.dims],
+                                              self.cards, self.facts.values[start:stop][mask])
+        if self.dense:
+            self.sums[groups] += sums
+            self.counts[groups] += counts
+            return
+        keys = np.concatenate([self.keys, groups])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.sums = np.bincount(inverse, weights=np.concatenate([self.sums, sums]), minlength=len(self.keys))
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(self.keys)).astype(np.int64)
+
+    def snapshot(self):
+        """(grupos, somas, contagens) no mesmo formato de aggregation.aggregate_codes."""
+        if self.dense:
+            groups = np.flatnonzero(self.counts)
+            return unravel_groups(groups, self.cards), self.sums[groups], self.counts[groups]
+        return unravel_groups(self.keys, self.cards), self.sums.copy(), self.counts.copy()
+
+    def _cardinalities(self):
+        return tuple(len(self.facts.dimensions[d]) for d in self.dims)
+
+    def _fit(self):
+        """Reindexa os acumuladores se algum dicionário cresceu (passando a esparso se preciso)."""
+        cards = self._cardinalities()
+        if cards == self.cards:
+            return
+        cells = _cells(cards)
+        if self.dense and dense_groups(cells, len(self.facts)):
+            old = tuple(slice(0, c) for c in self.cards)
+            sums = np.zeros(cards, dtype=np.float64)
+            counts = np.zeros(cards, dtype=np.int64)
+            sums[old] = self.sums.reshape(self.cards)
+            counts[old] = self.counts.reshape(self.cards)
+            self.sums, self.counts = sums.ravel(), counts.ravel()
+        else:
+            if self.dense:
+                groups = np.flatnonzero(self.counts)
+                self.keys, self.sums, self.counts = groups, self.sums[groups], self.counts[groups]
+            # A base mista preserva a ordem lexicográfica dos códigos: as chaves seguem ordenadas
+            self.keys = np.ravel_multi_index(unravel_groups(self.keys, self.cards), cards).astype(np.int64)
+        self.cards, self.cells = cards, cells
+
+
+class RunningAggregates:
+    """
+    Conjunto (LRU) das agregações ativas mantidas incrementalmente, limitado a `max_bytes`
+    de acumuladores. Novos fatos são aplicados a cada acumulador; só mudanças de dimensões
+    exigem reconstrução.
+    """
+
+    def __init__(self, facts, max_bytes=RUNNING_MAX_BYTES):
+        self.facts = facts
+        self.max_bytes = max_bytes
+        self._active = OrderedDict()
+
+    @staticmethod
+    def make_key(dims, filters):
+        return (tuple(dims), tuple(sorted(filters.items())))
+
+    def get(self, dims, filters):
+        key = self.make_key(dims, filters)
+        running = self._active.get(key)
+        if running is not None:
+            self._active.move_to_end(key)
+        return running
+
+    def track(self, dims, filters, groups, sums, counts):
+        """
+        Passa a manter incrementalmente o resultado (grupos, somas, contagens) calculado.
+        Uma agregação cujos acumuladores sozinhos excedem `max_bytes` não é acompanhada (retorna None).
+        """
+        key = self.make_key(dims, filters)
+        self._active.pop(key, None)
+        running = RunningAggregate(self.facts, dims, filters, groups, sums, counts)
+        if running.nbytes > self.max_bytes:
+            return None
+        self._active[key] = running
+        self._evict()
+        return running
+
+    def add_row(self, row):
+        for running in self._active.values():
+            running.add_row(row)
+        self._evict()
+
+    def add_rows(self, start, stop):
+        if stop <= start:
+            return
+        for running in self._active.values():
+            running.add_rows(start, stop)
+        self._evict()
+
+    def clear(self):
+        self._active.clear()
+
+    @property
+    def nbytes(self):
+        return sum(running.nbytes for running in self._active.values())
+
+    def __iter__(self):
+        return iter(list(self._active.values()))
+
+    def __len__(self):
+        return len(self._active)
+
+    def _evict(self):
+        """Descarta as agregações usadas há mais tempo até caber em `max_bytes`."""
+        total = self.nbytes
+        while total > self.max_bytes and self._active:
+            _, running = self._active.popitem(last=False)
+            total -= running.nbytes
+
+
+def _cells(cards):
+    cells = 1
+    for card in cards:
+        cells *= card
+    return cells
@@ -2,13 +2,33 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 import os
 from datetime import datetime
 
+import numpy as np
+
 # Importa os módulos externos (Certifique-se de que data_model.py e visualizer.py estão na mesma pasta)
-from data_model import OLAPModel
-from visualizer import visualize_result 
+from aggregation import MEASURES, cube_sets, pivot_table
+from background import BackgroundRunner
+from data_model import OLAPModel, SAMPLE_DIMENSIONS
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+from predicates import VALUE_FIELD, describe, parse_filters
+from profiling import NULL_TRACE
+from result_grid import LogView, ResultGrid
+from sketches import SKETCH_MEASURES
+from visualizer import ResultChart
+
+# Formatos de cubo aceitos nos diálogos de Salvar/Carregar
+CUBE_FILETYPES = [("JSON", "*.json"), ("Cubo binário colunar", "*.olap"), ("Banco SQLite", "*.sqlite *.db")]
+# Armazenamentos dos fatos oferecidos na interface (ver OLAPModel.set_backend)
+BACKEND_LABELS = {"memory": "Memória (NumPy)", "sqlite": "SQLite (disco)"}
+# Intervalo mínimo entre redesenhos do gráfico: cliques rápidos mostram só o último resultado
+CHART_THROTTLE_MS = 50
+
+# Operadores do filtro por dimensão e rótulos dos métodos escolhidos pelo planejador
+FILTER_OPERATORS = ["=", "IN", "NOT IN"]
+METHOD_LABELS = {"index": "índice", "scan": "varredura", "none": "vazio", "sql": "SQLite"}
 
 class OLAPApp:
     def __init__(self, root):
@@ -37,14 +57,31 @@ class OLAPApp:
         
         # Inicializa o Modelo de Dados (Chamada simplificada, conforme data_model.py)
         self.model = OLAPModel(self.dimensions, self.facts, self.filters) 
+        # Os fatos passam a viver no armazenamento do modelo (self.model.facts: memória ou SQLite)
+        # Níveis de hierarquia -> membros (copiados no worker por snapshot_dimensions)
+        self.level_members = {}
 
         self.create_widgets()
 
+        # Operações do modelo rodam em uma thread de trabalho; resultados voltam via root.after
+        self.runner = BackgroundRunner(self.root, on_state=self.on_task_state, on_progress=self.on_task_progress)
+
     def create_widgets(self):
         # Título Principal
         tk.Label(self.root, text="Análise Multidimensional de Vendas (OLAP)", 
                  font=("Arial", 24, "bold"), bg="#e0e0e0", fg="#2c3e50").pack(pady=10)
 
+        # Barra de status (progresso e cancelamento de operações longas)
+        status_bar = tk.Frame(self.root, bg="#2c3e50")
+        status_bar.pack(side=tk.BOTTOM, fill="x")
+        self.status_var = tk.StringVar(value="Pronto.")
+        tk.Label(status_bar, textvariable=self.status_var, anchor="w", font=("Arial", 10),
+                 bg="#2c3e50", fg="white", padx=10).pack(side=tk.LEFT, fill="x", expand=True)
+        self.btn_cancel = ttk.Button(status_bar, text="✖ Cancelar", command=self.cancel_task, state="disabled")
+        self.btn_cancel.pack(side=tk.RIGHT, padx=5, pady=2)
+        self.progress_bar = ttk.Progressbar(status_bar, mode="indeterminate", length=220)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5, pady=2)
+
         # 1. Notebook (Abas) para Organização Principal
         notebook = ttk.Notebook(self.root)
         notebook.pack(pady=5, padx=10, fill="both", expand=True)
@@ -99,6 +136,48 @@ class OLAPApp:
         
         # Botão de Seed (com destaque)
         ttk.Button(frame_io, text="🌱 Gerar Dados de Exemplo (Seed)", command=self.generate_sample_data, style='Accent.TButton').grid(row=0, column=2, padx=5, pady=5, sticky="we") 
+        ttk.Button(frame_io, text="📥 Importar CSV (em massa)", command=self.import_csv).grid(row=1, column=0, columnspan=3, padx=5, pady=5, sticky="we")
+
+        # Gerador sintético (carga/benchmark): mesmas dimensões do seed, quantidade e semente livres
+        frame_gen = ttk.Frame(frame_io)
+        frame_gen.grid(row=2, column=0, columnspan=3, sticky="we", pady=5)
+        ttk.Label(frame_gen, text="Fatos:").pack(side=tk.LEFT, padx=5)
+        self.entry_gen_facts = ttk.Entry(frame_gen, width=12)
+        self.entry_gen_facts.insert(0, "1000000")
+        self.entry_gen_facts.pack(side=tk.LEFT)
+        ttk.Label(frame_gen, text="Semente:").pack(side=tk.LEFT, padx=5)
+        self.entry_gen_seed = ttk.Entry(frame_gen, width=8)
+        self.entry_gen_seed.pack(side=tk.LEFT)
+        ttk.Button(frame_gen, text="⚙ Gerar Cubo Sintético", command=self.generate_synthetic).pack(side=tk.LEFT, padx=5, fill="x", expand=True)
+
+        # Armazenamento dos fatos: memória ou SQLite (banco temporário; salve como .sqlite para mantê-lo)
+        frame_backend = ttk.Frame(frame_io)
+        frame_backend.grid(row=3, column=0, columnspan=3, sticky="we", pady=5)
+        ttk.Label(frame_backend, text="Armazenamento:").pack(side=tk.LEFT, padx=5)
+        self.backend_var = tk.StringVar(value=BACKEND_LABELS[self.model.backend])
+        combo_backend = ttk.Combobox(frame_backend, textvariable=self.backend_var, state="readonly",
+                                     values=list(BACKEND_LABELS.values()), width=18)
+        combo_backend.pack(side=tk.LEFT, padx=5)
+        combo_backend.bind("<<ComboboxSelected>>", lambda e: self.change_backend())
+
+        # Agrupamento: Hierarquias (níveis acima de uma dimensão, para roll-up e drill-down)
+        frame_hier = ttk.LabelFrame(tab_data_entry, text="Hierarquias (Roll-up / Drill-down)", padding=15)
+        frame_hier.grid(row=3, column=0, sticky="ew", pady=10)
+        frame_hier.columnconfigure(1, weight=1)
+
+        ttk.Label(frame_hier, text="Dimensão/nível filho:").grid(row=0, column=0, sticky="w", pady=5, padx=5)
+        self.entry_level_child = ttk.Entry(frame_hier, width=20)
+        self.entry_level_child.grid(row=0, column=1, padx=5, sticky="we")
+
+        ttk.Label(frame_hier, text="Novo nível:").grid(row=1, column=0, sticky="w", pady=5, padx=5)
+        self.entry_level_name = ttk.Entry(frame_hier, width=20)
+        self.entry_level_name.grid(row=1, column=1, padx=5, sticky="we")
+
+        ttk.Label(frame_hier, text="Pais (filho:pai, vírgula):").grid(row=2, column=0, sticky="w", pady=5, padx=5)
+        self.entry_level_parents = ttk.Entry(frame_hier)
+        self.entry_level_parents.grid(row=2, column=1, padx=5, sticky="we")
+
+        ttk.Button(frame_hier, text="➕ Adicionar Nível", command=self.add_level).grid(row=3, column=0, columnspan=2, pady=10, sticky="we")
 
         # ----------------------------------------------------------------------
         # --- B. Aba de ANÁLISE (Filtros, Agregação e Log) ---
@@ -118,12 +197,13 @@ class OLAPApp:
         self.frame_filter = ttk.LabelFrame(control_frame, text="4. Filtro (Slice & Dice)", padding=15)
         # O pack() foi mantido aqui pois está no frame_control e não conflita com o grid interno.
         self.frame_filter.pack(fill="x", pady=10) 
-        self.frame_filter.columnconfigure(1, weight=1)
+        self.frame_filter.columnconfigure(2, weight=1)
         self.filter_combos = {} 
+        self.filter_text = {}
         self.refresh_filter_inputs() 
 
         # CORREÇÃO CRÍTICA DO LAYOUT: Usar grid no botão de filtro para evitar conflito com os combos
-        ttk.Button(self.frame_filter, text="🔄 Aplicar Filtros", command=self.update_filters, style='Accent.TButton').grid(row=99, column=0, columnspan=2, pady=10, padx=5, sticky="we")
+        ttk.Button(self.frame_filter, text="🔄 Aplicar Filtros", command=self.update_filters, style='Accent.TButton').grid(row=99, column=0, columnspan=3, pady=10, padx=5, sticky="we")
 
         # Agrupamento: Agregação (Roll-up / Drill-down - Passo 5)
         frame_agg = ttk.LabelFrame(control_frame, text="5. Agregação e Visualização", padding=15)
@@ -136,26 +216,90 @@ class OLAPApp:
         self.entry_agg_dims.grid(row=0, column=1, padx=5, sticky="we")
         
         ttk.Label(frame_agg, text="Medida:").grid(row=1, column=0, sticky="w", pady=5, padx=5)
-        self.combo_measure = ttk.Combobox(frame_agg, values=["sum","avg","count"], state="readonly", width=10)
+        # Exatas (sum, avg, count) + aproximadas por sketch (median, p95, distinct:<dimensão>)
+        self.combo_measure = ttk.Combobox(frame_agg, values=MEASURES + SKETCH_MEASURES, state="readonly", width=18)
         self.combo_measure.current(0)
         self.combo_measure.grid(row=1, column=1, padx=5, sticky="we")
         
         ttk.Button(frame_agg, text="📊 Agregar e Plotar", command=self.aggregate, style='Accent.TButton').grid(row=2, column=0, columnspan=2, pady=10, sticky="we")
 
-
-        # Coluna 1: Resultados / Log
-        frame_result = ttk.LabelFrame(tab_analysis, text="Log e Resultados da Agregação", padding=10)
-        frame_result.grid(row=0, column=1, sticky="nsew", padx=10, pady=5)
-        frame_result.columnconfigure(0, weight=1)
-        frame_result.rowconfigure(0, weight=1)
-        
-        # Área de Texto com Scrollbar
-        scrollbar = ttk.Scrollbar(frame_result)
+        ttk.Button(frame_agg, text="🧮 Pivot com Subtotais (CUBE)", command=self.aggregate_pivot).grid(row=4, column=0, columnspan=2, pady=(0, 10), sticky="we")
+
+        self.parallel_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame_agg, text=f"Agregação paralela ({os.cpu_count() or 1} núcleos)", variable=self.parallel_var,
+                        command=self.toggle_parallel).grid(row=3, column=0, columnspan=2, sticky="w", padx=5)
+
+        # Perfil por estágio (tempo, linhas, grupos) no log; memória e cProfile opcionais
+        frame_profile = ttk.Frame(frame_agg)
+        frame_profile.grid(row=5, column=0, columnspan=2, sticky="we")
+        self.profile_var = tk.BooleanVar(value=False)
+        self.profile_memory_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame_profile, text="Perfil por estágio", variable=self.profile_var,
+                        command=self.toggle_profiling).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(frame_profile, text="memória", variable=self.profile_memory_var,
+                        command=self.toggle_profiling).pack(side=tk.LEFT)
+        ttk.Button(frame_profile, text="🔬 cProfile (próxima consulta)",
+                   command=self.profile_next_query).pack(side=tk.RIGHT, padx=5)
+
+        # Agrupamento: Cubo Materializado (opcional - Passo 6)
+        frame_cube = ttk.LabelFrame(control_frame, text="6. Cubo Materializado (Opcional)", padding=15)
+        frame_cube.pack(fill="x", pady=10)
+        frame_cube.columnconfigure(1, weight=1)
+
+        ttk.Label(frame_cube, text="Cuboides (';' entre conjuntos):").grid(row=0, column=0, sticky="w", pady=5, padx=5)
+        self.entry_cuboids = ttk.Entry(frame_cube)
+        self.entry_cuboids.grid(row=0, column=1, padx=5, sticky="we")
+
+        ttk.Label(frame_cube, text="Orçamento (MB):").grid(row=1, column=0, sticky="w", pady=5, padx=5)
+        self.entry_cube_budget = ttk.Entry(frame_cube, width=10)
+        self.entry_cube_budget.grid(row=1, column=1, padx=5, sticky="we")
+
+        ttk.Button(frame_cube, text="🧊 Materializar", command=self.materialize_cube).grid(row=2, column=0, pady=10, padx=5, sticky="we")
+        ttk.Button(frame_cube, text="✖ Descartar", command=self.drop_cube).grid(row=2, column=1, pady=10, padx=5, sticky="we")
+
+
+        # Coluna 1: Gráfico embutido (em cima) e Resultados / Log (embaixo)
+        result_panes = ttk.PanedWindow(tab_analysis, orient=tk.VERTICAL)
+        result_panes.grid(row=0, column=1, sticky="nsew", padx=10, pady=5)
+
+        frame_chart = ttk.LabelFrame(result_panes, text="Gráfico", padding=5)
+        result_panes.add(frame_chart, weight=3)
+        # Uma única figura (fora do pyplot) reaproveitada por todas as consultas
+        self.chart = ResultChart(Figure(figsize=(8, 6), dpi=100))
+        self.chart_canvas = FigureCanvasTkAgg(self.chart.figure, master=frame_chart)
+        NavigationToolbar2Tk(self.chart_canvas, frame_chart).pack(side=tk.BOTTOM, fill="x")
+        self.chart_canvas.get_tk_widget().pack(fill="both", expand=True)
+        self._pending_chart = None
+
+        # Grade de resultados virtualizada (ordenação no cabeçalho, top-N)
+        frame_result = ttk.LabelFrame(result_panes, text="Resultados da Agregação", padding=10)
+        result_panes.add(frame_result, weight=2)
+        frame_top = ttk.Frame(frame_result)
+        frame_top.pack(fill="x", pady=(0, 5))
+        ttk.Label(frame_top, text="Top N (0 = todos):").pack(side=tk.LEFT)
+        self.spin_top_n = ttk.Spinbox(frame_top, from_=0, to=1_000_000, increment=10, width=8,
+                                      command=self.apply_top_n)
+        self.spin_top_n.set(0)
+        self.spin_top_n.bind("<Return>", lambda event: self.apply_top_n())
+        self.spin_top_n.pack(side=tk.LEFT, padx=5)
+        self.grid_status = tk.StringVar(value="")
+        ttk.Label(frame_top, textvariable=self.grid_status).pack(side=tk.RIGHT)
+        self.result_grid = ResultGrid(frame_result)
+        self.result_grid.on_change = lambda shown, total: self.grid_status.set(
+            f"{shown:,} de {total:,} linhas" if total else "")
+        self.result_grid.pack(fill="both", expand=True)
+
+        frame_log = ttk.LabelFrame(result_panes, text="Log", padding=10)
+        result_panes.add(frame_log, weight=1)
+
+        # Área de Texto com Scrollbar (limitada a LOG_MAX_LINES linhas)
+        scrollbar = ttk.Scrollbar(frame_log)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.text_result = tk.Text(frame_result, wrap="word", font=("Consolas", 10), 
-                                   yscrollcommand=scrollbar.set, bg="#f9f9f9", fg="#333", height=30)
+        self.text_result = tk.Text(frame_log, wrap="word", font=("Consolas", 10), 
+                                   yscrollcommand=scrollbar.set, bg="#f9f9f9", fg="#333", height=6)
         self.text_result.pack(fill="both", expand=True)
         scrollbar.config(command=self.text_result.yview)
+        self.log_view = LogView(self.text_result)
 
     # ----------------------------------------------------
     # ---------- Métodos do Controller (Controller) ----------
@@ -168,18 +312,44 @@ class OLAPApp:
             messagebox.showerror("Erro", "Informe nome e valores da dimensão.")
             return
         
-        if name in self.dimensions:
+        if name in self.fact_entries:
              messagebox.showwarning("Aviso", f"Dimensão '{name}' já existe. Valores serão mesclados/substituídos.")
         
-        self.dimensions[name] = values
-        self.refresh_fact_inputs()
-        self.refresh_filter_inputs()
+        def job(task):
+            return self.model.add_dimension(name, values), self.snapshot_dimensions()
+
+        def done(answer):
+            merged, dimensions = answer
+            self.refresh_inputs(dimensions)
+            self.log(f"Dimensão adicionada: **{name}** = {merged}")
+
         self.entry_dim.delete(0, tk.END) 
         self.entry_values.delete(0, tk.END)
-        self.log(f"Dimensão adicionada: **{name}** = {values}")
+        self.runner.submit("Adicionando dimensão", job, on_done=done, on_error=self.task_error("Erro"))
+
+    def add_level(self):
+        child = self.entry_level_child.get().strip()
+        level = self.entry_level_name.get().strip()
+        pairs = [p.split(":", 1) for p in self.entry_level_parents.get().split(",") if ":" in p]
+        parents = {c.strip(): p.strip() for c, p in pairs if c.strip() and p.strip()}
+        if not child or not level or not parents:
+            messagebox.showerror("Erro", "Informe o filho, o novo nível e os pares filho:pai.")
+            return
+
+        def job(task):
+            return self.model.add_level(child, level, parents), self.snapshot_dimensions()
+
+        def done(answer):
+            base, dimensions = answer
+            self.refresh_inputs(dimensions)
+            self.log(f"Nível **{level}** adicionado à hierarquia de {base}: {self.level_members.get(level, [])}")
+
+        self.entry_level_name.delete(0, tk.END)
+        self.entry_level_parents.delete(0, tk.END)
+        self.runner.submit("Adicionando nível", job, on_done=done, on_error=self.task_error("Erro na Hierarquia"))
 
     def add_fact(self):
-        if not self.dimensions:
+        if not self.fact_entries:
             messagebox.showerror("Erro", "Crie dimensões primeiro.")
             return
         try:
@@ -195,80 +365,262 @@ class OLAPApp:
             return
         
         fact["valor"] = value
-        self.facts.append(fact)
-        self.log(f"Fato adicionado: {fact}")
+        self.runner.submit("Adicionando fato", lambda task: self.model.add_fact(fact),
+                           on_done=lambda n: self.log(f"Fato adicionado: {fact}"),
+                           on_error=self.task_error("Erro"))
         self.entry_value.delete(0, tk.END) 
 
-    def aggregate(self):
+    def selected_dims(self):
+        """Dimensões (ou níveis de hierarquia) e medida escolhidas; None após exibir o erro."""
         dims = [d.strip() for d in self.entry_agg_dims.get().split(",") if d.strip()]
         measure = self.combo_measure.get()
         
         if not (1 <= len(dims) <= 3) or not measure:
-            messagebox.showerror("Erro", "Escolha 1-3 dimensões e a medida (sum, avg, count).")
-            return
+            messagebox.showerror("Erro", "Escolha 1-3 dimensões e a medida (sum, avg, count, median, p95, distinct).")
+            return None
         for d in dims:
-            if d not in self.dimensions:
+            if d not in self.fact_entries and d not in self.level_members:
                 # O Erro de "Dimensão inexistente: 1" ocorre aqui. O usuário deve inserir NOMES de dimensão, não números.
                 messagebox.showerror("Erro", f"Dimensão inexistente: {d}. Use NOMES de dimensão como PRODUTO, REGIÃO, MÊS.")
-                return
-        
-        result, error = self.model.aggregate_data(dims, measure)
+                return None
+        return dims, measure
+
+    def aggregate(self):
+        selected = self.selected_dims()
+        if selected is None:
+            return
+        dims, measure = selected
 
+        def job(task):
+            with self.model.lock:
+                result, error = self.model.aggregate_data(dims, measure, cancel=task.check)
+                return result, error, dict(self.filters), self.model.cache_stats(), self.model.last_trace
+
+        self.runner.submit(f"Agregando {measure.upper()} por {', '.join(dims)}", job,
+                           on_done=lambda answer: self.show_aggregation(dims, measure, *answer),
+                           on_error=self.task_error("Erro de Agregação"),
+                           on_cancel=lambda: self.log("Agregação cancelada."))
+
+    def show_aggregation(self, dims, measure, result, error, filters, stats, trace):
+        """Exibe (na thread do Tk) o relatório e o gráfico de uma agregação concluída."""
         if error:
+            self.log_profile(trace)
             messagebox.showerror("Erro de Agregação", error)
             return
 
-        txt = f"--- RESULTADO DA AGREGAÇÃO: {measure.upper()} por {', '.join(dims)} ---\n"
-        if self.filters:
-            txt += f"--- FILTROS ATIVOS: {', '.join([f'{d}={v}' for d,v in self.filters.items()])} ---\n"
-        
-        max_key_len = max(len(str(k)) for k in result) if result else 0
-        for k,v in result.items():
-            key_str = str(k) if len(dims) > 1 else k[0] 
-            txt += f"{key_str.ljust(max_key_len)}: {v:,.2f}\n" 
+        # A grade só formata as linhas visíveis; o log recebe apenas o resumo
+        with trace.stage("report", groups=len(result)):
+            self.result_grid.show_result(dims, measure, result)
+            txt = f"RESULTADO DA AGREGAÇÃO: {measure.upper()} por {', '.join(dims)} ({len(result):,} grupos)"
+            if filters:
+                txt += f" | FILTROS ATIVOS: {', '.join(describe(d, v) for d, v in filters.items())}"
+            self.log(txt)
 
-        self.text_result.delete(1.0, tk.END)
-        self.text_result.insert(tk.END, txt)
-        self.log("\n" + txt)
+            self.log(f"Cache: {stats['hits']} acertos / {stats['misses']} falhas ({stats['hit_rate']:.0%}), "
+                     f"{stats['entries']} entradas, {stats['bytes'] / 1024:,.1f} KB")
 
         # CORREÇÃO: Passando o dicionário de filtros para o visualizer
-        visualize_result(dims, result, measure, filters=self.filters)
+        self.plot_result(dims, result, measure, filters, trace)
 
+    def aggregate_pivot(self):
+        """Tabela dinâmica com subtotais: todos os conjuntos do CUBE em uma única chamada (uma varredura)."""
+        selected = self.selected_dims()
+        if selected is None:
+            return
+        dims, measure = selected
 
-    def generate_sample_data(self):
-        """Invoca a geração de dados do modelo e atualiza a UI."""
+        def job(task):
+            with self.model.lock:
+                answers = self.model.aggregate_sets(cube_sets(dims), [measure], cancel=task.check)
+                return answers, dict(self.filters), self.model.last_trace
+
+        self.runner.submit(f"Pivot {measure.upper()} por {', '.join(dims)}", job,
+                           on_done=lambda answer: self.show_pivot(dims, measure, *answer),
+                           on_error=self.task_error("Erro de Agregação"),
+                           on_cancel=lambda: self.log("Agregação cancelada."))
+
+    def show_pivot(self, dims, measure, answers, filters, trace):
+        """Exibe a tabela dinâmica (subtotais e total geral) e o gráfico do conjunto mais fino."""
+        result, error = answers[tuple(dims), measure]
+        if error:
+            self.log_profile(trace)
+            messagebox.showerror("Erro de Agregação", error)
+            return
+
+        with trace.stage("report") as stage:
+            header, rows = pivot_table(dims, measure, answers)
+            values = [[np.nan if v is None else v for v in row_values] for _, row_values, _ in rows]
+            # Subtotais destacados; a ordem da tabela dinâmica é fixa (sem ordenação por coluna)
+            self.result_grid.show(header, [tuple(labels) for labels, _, _ in rows], values,
+                                  subtotals=[subtotal for _, _, subtotal in rows], sortable=False)
+            stage.set(groups=len(rows))
+
+            txt = f"PIVOT: {measure.upper()} por {', '.join(dims)} ({len(rows):,} linhas com subtotais e total geral)"
+            if filters:
+                txt += f" | FILTROS ATIVOS: {', '.join(describe(d, v) for d, v in filters.items())}"
+            self.log(txt)
+        self.plot_result(dims, result, measure, filters, trace)
+
+    def apply_top_n(self):
+        try:
+            n = int(self.spin_top_n.get() or 0)
+        except ValueError:
+            messagebox.showerror("Erro", "Top N deve ser um número inteiro.")
+            return
+        self.result_grid.set_limit(n)
+
+    def plot_result(self, dims, result, measure, filters, trace=NULL_TRACE):
+        """Agenda o desenho no gráfico embutido; resultados que chegam em sequência rápida substituem o pendente."""
+        if self._pending_chart is not None:
+            # A consulta substituída não chega a ser desenhada: o perfil dela termina aqui
+            self.log_profile(self._pending_chart[-1])
+        scheduled = self._pending_chart is not None
+        self._pending_chart = (dims, result, measure, filters, trace)
+        if not scheduled:
+            self.root.after(CHART_THROTTLE_MS, self.flush_chart)
+
+    def flush_chart(self):
+        dims, result, measure, filters, trace = self._pending_chart
+        self._pending_chart = None
+        with trace.stage("plot", groups=len(result)):
+            # Mesmo formato da consulta anterior: artistas atualizados no lugar
+            self.chart.update(dims, result, measure, filters)
+            if trace.enabled:
+                # Com perfil, desenha já (o tempo de renderização entra no estágio)
+                self.chart_canvas.draw()
+            else:
+                self.chart_canvas.draw_idle()
+        self.log_profile(trace)
+
+    def log_profile(self, trace):
+        """Resumo por estágio da consulta no log (e o relatório do cProfile, se capturado)."""
+        if not trace.enabled:
+            return
+        self.log(trace.summary())
+        if trace.profile:
+            for line in trace.profile.strip().splitlines():
+                if line.strip():
+                    self.log_view.append(line)
+
+    def toggle_profiling(self):
+        """Liga/desliga o perfil por estágio (com ou sem medição de memória)."""
+        if self.profile_var.get():
+            memory = self.profile_memory_var.get()
+            self.runner.submit("Ativando perfil", lambda task: self.model.enable_profiling(memory),
+                               on_done=lambda _: self.log("Perfil por estágio ativado" +
+                                                          (" (com memória, via tracemalloc)." if memory else ".")))
+        else:
+            self.runner.submit("Desativando perfil", lambda task: self.model.disable_profiling(),
+                               on_done=lambda _: self.log("Perfil por estágio desativado."))
+
+    def profile_next_query(self):
+        self.runner.submit("Preparando cProfile", lambda task: self.model.profile_next_query(),
+                           on_done=lambda _: self.log("A próxima consulta será capturada pelo cProfile."))
+
+
+    def toggle_parallel(self):
+        """Liga/desliga a agregação em vários processos (pequenas consultas seguem seriais)."""
+        if self.parallel_var.get():
+            self.runner.submit("Ativando agregação paralela", lambda task: self.model.enable_parallel(),
+                               on_done=lambda p: self.log(f"Agregação paralela ativada: {p.workers} processos, "
+                                                          f"a partir de {p.threshold:,} fatos."))
+        else:
+            self.runner.submit("Desativando agregação paralela", lambda task: self.model.disable_parallel(),
+                               on_done=lambda _: self.log("Agregação paralela desativada."))
+
+    def materialize_cube(self):
+        """Materializa os cuboides informados (vazio = reticulado completo) dentro do orçamento."""
+        cuboids = []
+        for group in self.entry_cuboids.get().split(";"):
+            dims = tuple(d.strip() for d in group.split(",") if d.strip())
+            if not dims:
+                continue
+            missing = [d for d in dims if d not in self.fact_entries]
+            if missing:
+                messagebox.showerror("Erro", f"Dimensão inexistente: {', '.join(missing)}.")
+                return
+            cuboids.append(dims)
+
+        budget = self.entry_cube_budget.get().strip()
         try:
-            num_facts = self.model.generate_sample_data()
+            budget_mb = float(budget) if budget else None
+        except ValueError:
+            messagebox.showerror("Erro", "Orçamento inválido (informe MB).")
+            return
+
+        def done(cube):
+            names = [', '.join(dims) for dims in cube.cuboids]
+            self.log(f"Cubo materializado: {len(names)} cuboides ({cube.nbytes / 1024:,.1f} KB): {' | '.join(names)}")
+
+        self.runner.submit("Materializando cubo", lambda task: self.model.materialize_cube(cuboids or None, budget_mb),
+                           on_done=done, on_error=self.task_error("Erro ao Materializar"))
+
+    def drop_cube(self):
+        self.runner.submit("Descartando cubo", lambda task: self.model.drop_cube(),
+                           on_done=lambda _: self.log("Cubo materializado descartado. Consultas voltam a varrer os fatos."))
+
+    def generate_sample_data(self):
+        """Invoca a geração de dados do modelo (no worker) e atualiza a UI ao final."""
+        def job(task):
+            return self.model.generate_sample_data(), self.snapshot_dimensions()
 
-            self.refresh_fact_inputs()
-            self.refresh_filter_inputs()
+        def done(answer):
+            num_facts, dimensions = answer
+            self.refresh_inputs(dimensions)
 
-            self.log(f"Seed de dados criado: {len(self.dimensions)} dimensões e {num_facts} fatos gerados.")
+            self.log(f"Seed de dados criado: {len(dimensions)} dimensões e {num_facts} fatos gerados.")
             messagebox.showinfo("Seed Criado", f"{num_facts} fatos de vendas gerados e prontos para análise.")
 
-        except Exception as e:
-             messagebox.showerror("Erro de Geração", f"Não foi possível gerar dados de exemplo.\nDetalhe: {e}")
+        self.runner.submit("Gerando dados de exemplo", job, on_done=done,
+                           on_error=self.task_error("Erro de Geração", "Não foi possível gerar dados de exemplo."))
 
 
+    def generate_synthetic(self):
+        """Gera um cubo sintético reproduzível (vetorizado, em blocos) com as dimensões do seed."""
+        try:
+            num_facts = int(self.entry_gen_facts.get().replace(".", "").replace("_", ""))
+            seed = self.entry_gen_seed.get().strip()
+            seed = int(seed) if seed else None
+        except ValueError:
+            messagebox.showerror("Erro", "Informe a quantidade de fatos e a semente como números inteiros.")
+            return
+
+        def job(task):
+            def progress(done, total):
+                task.progress(f"Gerando fatos... {done:,} de {total:,}", done / max(total, 1))
+            count = self.model.generate_data(num_facts, SAMPLE_DIMENSIONS, seed=seed, progress=progress)
+            return count, self.snapshot_dimensions()
+
+        def done(answer):
+            count, dimensions = answer
+            self.refresh_inputs(dimensions)
+            self.log(f"Cubo sintético gerado: {count:,} fatos (semente: {seed if seed is not None else 'aleatória'}).")
+
+        self.runner.submit("Gerando cubo sintético", job, on_done=done,
+                           on_error=self.task_error("Erro de Geração", "Não foi possível gerar o cubo."),
+                           on_cancel=self.refresh_after_mutation)
+
     # ----------------------------------------------------
     # ---------- Funções Auxiliares (View/Refresh) ----------
     # ----------------------------------------------------
 
-    def refresh_fact_inputs(self):
+    def refresh_fact_inputs(self, dimensions=None):
+        dimensions = self.dimensions if dimensions is None else dimensions
         for widget in self.frame_facts.winfo_children():
             if int(widget.grid_info().get('row', 101)) < 99:
                 widget.destroy()
         
         self.fact_entries.clear()
         
-        for i, dim in enumerate(self.dimensions):
+        for i, dim in enumerate(dimensions):
             ttk.Label(self.frame_facts, text=f"{dim}:").grid(row=i, column=0, sticky="w", pady=2, padx=5)
-            cb = ttk.Combobox(self.frame_facts, values=self.dimensions[dim], state="readonly")
+            cb = ttk.Combobox(self.frame_facts, values=dimensions[dim], state="readonly")
             cb.grid(row=i, column=1, padx=5, sticky="we")
-            cb.set(self.dimensions[dim][0] if self.dimensions[dim] else '') 
+            cb.set(dimensions[dim][0] if dimensions[dim] else '') 
             self.fact_entries[dim] = cb
 
-    def refresh_filter_inputs(self):
+    def refresh_filter_inputs(self, dimensions=None):
+        dimensions = self.dimensions if dimensions is None else dimensions
         # NOTA: O botão "Aplicar Filtros" agora está fixado na row 99 no create_widgets.
         for widget in self.frame_filter.winfo_children():
             # Apenas destrói os combos dinâmicos (aqueles com row < 99)
@@ -277,74 +629,252 @@ class OLAPApp:
         
         self.filter_combos.clear()
         
-        for i, dim in enumerate(self.dimensions):
+        for i, dim in enumerate(dimensions):
             ttk.Label(self.frame_filter, text=f"{dim}:").grid(row=i, column=0, sticky="w", pady=2, padx=5)
-            
-            filter_values = ["TODOS"] + self.dimensions[dim]
-            cb = ttk.Combobox(self.frame_filter, values=filter_values, state="readonly")
-            cb.set(self.filters.get(dim, "TODOS")) 
-            cb.grid(row=i, column=1, padx=5, sticky="we")
-            self.filter_combos[dim] = cb
+
+            # Operador + valor(es): "=" usa um valor; "IN"/"NOT IN" acumulam os escolhidos na lista
+            op = ttk.Combobox(self.frame_filter, values=FILTER_OPERATORS, state="readonly", width=7)
+            filter_values = ["TODOS"] + dimensions[dim]
+            cb = ttk.Combobox(self.frame_filter, values=filter_values)
+            spec = self.filters.get(dim, "TODOS")
+            if isinstance(spec, tuple):
+                op.set("IN" if spec[0] == "in" else "NOT IN")
+                cb.set(", ".join(map(str, spec[1])))
+            else:
+                op.set("=")
+                cb.set(spec)
+            # Texto anterior guardado ao abrir a lista, para acumular os valores escolhidos
+            cb.configure(postcommand=lambda cb=cb: self.filter_text.__setitem__(cb, cb.get()))
+            cb.bind("<<ComboboxSelected>>", lambda event, op=op, cb=cb: self.pick_filter_value(op, cb))
+            op.grid(row=i, column=1, padx=5, sticky="w")
+            cb.grid(row=i, column=2, padx=5, sticky="we")
+            self.filter_combos[dim] = (op, cb)
+
+        # Faixa sobre a medida (valor): mínimo e/ou máximo
+        row = len(dimensions)
+        ttk.Label(self.frame_filter, text=f"{VALUE_FIELD} (mín / máx):").grid(row=row, column=0, sticky="w", pady=2, padx=5)
+        frame_range = ttk.Frame(self.frame_filter)
+        frame_range.grid(row=row, column=1, columnspan=2, padx=5, sticky="we")
+        low, high = (self.filters[VALUE_FIELD][1:] if VALUE_FIELD in self.filters else (None, None))
+        self.entry_value_min = ttk.Entry(frame_range, width=10)
+        self.entry_value_min.pack(side=tk.LEFT, fill="x", expand=True)
+        self.entry_value_max = ttk.Entry(frame_range, width=10)
+        self.entry_value_max.pack(side=tk.LEFT, fill="x", expand=True, padx=(5, 0))
+        for entry, bound in ((self.entry_value_min, low), (self.entry_value_max, high)):
+            if bound is not None:
+                entry.insert(0, f"{bound:g}")
+
+    def pick_filter_value(self, op, cb):
+        """Valor escolhido na lista: com IN/NOT IN é acrescentado aos já escolhidos."""
+        value = cb.get()
+        if op.get() == "=" or value == "TODOS":
+            return
+        previous = [v.strip() for v in self.filter_text.pop(cb, "").split(",")]
+        chosen = [v for v in previous if v and v not in ("TODOS", value)] + [value]
+        cb.set(", ".join(chosen))
+
+    def read_filters(self):
+        """Predicados montados a partir dos controles (ver predicates.py); None após exibir o erro."""
+        filters = {}
+        for dim, (op, cb) in self.filter_combos.items():
+            text = cb.get().strip()
+            if not text or text == "TODOS":
+                continue
+            if op.get() == "=":
+                filters[dim] = text
+            else:
+                values = [v.strip() for v in text.split(",") if v.strip()]
+                filters[dim] = ("in" if op.get() == "IN" else "not_in", tuple(values))
+        try:
+            bounds = [float(e.get().replace(",", ".")) if e.get().strip() else None
+                      for e in (self.entry_value_min, self.entry_value_max)]
+            if any(b is not None for b in bounds):
+                filters[VALUE_FIELD] = bounds
+            return parse_filters(filters)
+        except ValueError as e:
+            messagebox.showerror("Erro no Filtro", str(e))
+            return None
 
     def update_filters(self):
-        self.filters.clear()
-        log_msg = ["Filtros Ativos:"]
-        
-        for dim, cb in self.filter_combos.items():
-            value = cb.get()
-            if value != "TODOS":
-                self.filters[dim] = value
-                log_msg.append(f" {dim} = '{value}'")
-        
-        if not self.filters:
-            self.log("Nenhum filtro aplicado. Analisando todos os fatos.")
-        else:
-            self.log(" ".join(log_msg))
-            
-        messagebox.showinfo("Filtro", "Filtros atualizados. Agora execute a Agregação.")
+        filters = self.read_filters()
+        if filters is None:
+            return
+        log_msg = ["Filtros Ativos:"] + [f" {describe(dim, spec)}" for dim, spec in filters.items()]
+
+        def job(task):
+            self.model.set_filters(filters)
+            return self.model.index_stats() if filters else None
+
+        def done(stats):
+            if not filters:
+                self.log("Nenhum filtro aplicado. Analisando todos os fatos.")
+            else:
+                self.log(" ".join(log_msg))
+                # Ordem de execução do plano: do predicado mais seletivo ao menos seletivo
+                parts = [f"{describe(s['dim'], s['value'])}: {s['selectivity']:.1%} ({METHOD_LABELS[s['method']]})"
+                         for s in stats["filters"]]
+                self.log(f"Plano de filtros: {' → '.join(parts)} | combinada: {stats['rows']} de {stats['total']} fatos ({stats['selectivity']:.1%})")
+            messagebox.showinfo("Filtro", "Filtros atualizados. Agora execute a Agregação.")
+
+        self.runner.submit("Aplicando filtros", job, on_done=done, on_error=self.task_error("Erro"))
 
     # ----------------------------------------------------
     # ---------- Salvar/Carregar & Log (I/O) ----------
     # ----------------------------------------------------
 
     def save_cube(self):
-        if not self.dimensions or not self.facts:
+        if not self.fact_entries or not len(self.model.facts):
             messagebox.showwarning("Aviso", "Nenhum cubo disponível para salvar.")
             return
-        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON","*.json")])
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=CUBE_FILETYPES)
         if not path: return
-        data = {"dimensions": self.dimensions, "facts": self.facts}
-        try:
-            with open(path,"w",encoding="utf-8") as f:
-                json.dump(data,f,indent=4)
-            self.log(f"Cubo salvo com sucesso: **{os.path.basename(path)}**")
-        except Exception as e:
-            messagebox.showerror("Erro ao Salvar", f"Não foi possível salvar: {e}")
+
+        def job(task):
+            def progress(done, total):
+                task.progress(f"Salvando cubo... {done / max(total, 1):.0%}", done / max(total, 1))
+            return self.model.save_cube(path, progress=progress)
+
+        self.runner.submit("Salvando cubo", job,
+                           on_done=lambda n: self.log(f"Cubo salvo com sucesso: **{os.path.basename(path)}**"),
+                           on_error=self.task_error("Erro ao Salvar", "Não foi possível salvar."),
+                           on_cancel=lambda: self.log("Gravação cancelada; o arquivo anterior foi mantido."))
 
     def load_cube(self):
-        path = filedialog.askopenfilename(filetypes=[("JSON","*.json")])
+        path = filedialog.askopenfilename(filetypes=CUBE_FILETYPES)
         if not path: return
-        try:
-            with open(path,"r",encoding="utf-8") as f:
-                data = json.load(f)
-            self.dimensions.clear()
-            self.dimensions.update(data.get("dimensions",{}))
-            self.facts = data.get("facts",[])
-            self.filters = {} 
-            self.model = OLAPModel(self.dimensions, self.facts, self.filters) 
-
-            self.refresh_fact_inputs()
-            self.refresh_filter_inputs()
-            self.log(f"Cubo carregado com sucesso: **{os.path.basename(path)}**. Fatos: {len(self.facts)}")
-        except Exception as e:
-            messagebox.showerror("Erro ao Carregar", f"Não foi possível carregar o arquivo: {e}")
+
+        def job(task):
+            def progress(done, total):
+                task.progress(f"Carregando cubo... {done / max(total, 1):.0%}", done / max(total, 1))
+            return self.model.load_cube(path, progress=progress), self.snapshot_dimensions()
+
+        def done(answer):
+            num_facts, dimensions = answer
+            self.refresh_inputs(dimensions)
+            self.backend_var.set(BACKEND_LABELS[self.model.backend])
+            self.log(f"Cubo carregado com sucesso: **{os.path.basename(path)}**. Fatos: {num_facts}")
+
+        def failed(e):
+            messagebox.showerror("Erro ao Carregar", f"Não foi possível carregar o arquivo: {e}\nO cubo anterior foi mantido.")
+
+        self.runner.submit("Carregando cubo", job, on_done=done, on_error=failed,
+                           on_cancel=lambda: self.log("Carregamento cancelado; o cubo anterior foi mantido."))
+
+    def change_backend(self):
+        """Converte o cubo atual para o armazenamento escolhido (SQLite: banco temporário em disco)."""
+        backend = next(key for key, label in BACKEND_LABELS.items() if label == self.backend_var.get())
+
+        def done(num_facts):
+            if backend == "sqlite":
+                self.log(f"Armazenamento: SQLite ({num_facts:,} fatos). Filtros e agrupamentos passam a ser "
+                         "feitos pelo banco; salve como .sqlite para reabrir sem carregar os fatos na memória.")
+            else:
+                self.log(f"Armazenamento: memória ({num_facts:,} fatos).")
+
+        def failed(e):
+            self.backend_var.set(BACKEND_LABELS[self.model.backend])
+            messagebox.showerror("Erro no Armazenamento", str(e))
+
+        self.runner.submit("Convertendo armazenamento", lambda task: self.model.set_backend(backend),
+                           on_done=done, on_error=failed)
+
+    def import_csv(self):
+        """Importa fatos de um CSV (cabeçalho = dimensões + coluna 'valor')."""
+        path = filedialog.askopenfilename(filetypes=[("CSV", "*.csv"), ("Texto delimitado", "*.txt *.tsv")])
+        if not path: return
+
+        def job(task):
+            def progress(read, rejected):
+                task.progress(f"Importando... {read:,} linhas lidas, {rejected:,} rejeitadas")
+            return self.model.import_csv(path, progress=progress), self.snapshot_dimensions()
+
+        def done(answer):
+            report, dimensions = answer
+            self.refresh_inputs(dimensions)
+            self.log(f"Importação de **{os.path.basename(path)}**: {report['imported']:,} fatos importados, "
+                     f"{report['rejected']:,} linhas rejeitadas, {report['rows_per_sec']:,.0f} linhas/s")
+            if report["new_values"]:
+                novos = ', '.join(f"{d}: +{n}" for d, n in report["new_values"].items())
+                self.log(f"Valores novos descobertos nas dimensões: {novos}")
+
+        def failed(e):
+            self.refresh_after_mutation()
+            messagebox.showerror("Erro na Importação", f"Não foi possível importar: {e}")
+
+        def cancelled():
+            self.refresh_after_mutation()
+            self.log("Importação cancelada; os blocos já lidos foram mantidos.")
+
+        self.runner.submit("Importando CSV", job, on_done=done, on_error=failed, on_cancel=cancelled)
+
+    # ----------------------------------------------------
+    # ---------- Execução em Segundo Plano ----------
+    # ----------------------------------------------------
+
+    def snapshot_dimensions(self):
+        """
+        Cópia das dimensões feita no worker, para a UI não ler o dict enquanto ele muda.
+        Os níveis de hierarquia (e seus membros) são copiados junto, em `self.level_members`.
+        """
+        with self.model.lock:
+            self.level_members = self.model.level_members()
+            return {dim: list(values) for dim, values in self.dimensions.items()}
+
+    def refresh_inputs(self, dimensions):
+        # Níveis de hierarquia também podem ser filtrados (drill-down) e contados
+        analysable = dict(dimensions, **self.level_members)
+        self.refresh_fact_inputs(dimensions)
+        self.refresh_filter_inputs(analysable)
+        self.combo_measure["values"] = MEASURES + SKETCH_MEASURES + [f"distinct:{d}" for d in analysable]
+
+    def refresh_after_mutation(self):
+        """Atualiza os controles após uma operação interrompida (snapshot obtido também no worker)."""
+        self.runner.submit("Atualizando controles", lambda task: self.snapshot_dimensions(),
+                           on_done=self.refresh_inputs)
+
+    def task_error(self, title, prefix=None):
+        """Callback de erro padrão: exibe a exceção da tarefa em uma messagebox."""
+        def show(e):
+            detail = f"{prefix}\nDetalhe: {e}" if prefix else str(e)
+            messagebox.showerror(title, detail)
+        return show
+
+    def cancel_task(self):
+        self.runner.cancel()
+        self.status_var.set("Cancelando...")
+
+    def on_task_state(self, task):
+        """Tarefa atual mudou (None = ocioso): atualiza barra de progresso e botão Cancelar."""
+        if task is None:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="indeterminate", value=0)
+            self.btn_cancel.configure(state="disabled")
+            self.status_var.set("Pronto.")
+        else:
+            self.progress_bar.configure(mode="indeterminate")
+            self.progress_bar.start(15)
+            self.btn_cancel.configure(state="normal")
+            self.status_var.set(f"{task.description}...")
+
+    def on_task_progress(self, task, message, fraction):
+        self.status_var.set(message)
+        if fraction is not None:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate", value=fraction * 100)
 
     def log(self, msg):
         timestamp = datetime.now().strftime("[%H:%M:%S]")
-        self.text_result.insert(tk.END, f"{timestamp} {msg.replace('**', '').replace('\n', ' ')}\n")
-        self.text_result.see(tk.END)
+        msg = msg.replace('**', '').replace('\n', ' ')
+        self.log_view.append(f"{timestamp} {msg}")
 
 if __name__=="__main__":
     root = tk.Tk()
     app = OLAPApp(root)
+
+    def on_close():
+        app.runner.shutdown()
+        app.model.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,198 @@
+# olap_cli.py
+
+"""
+Consultas em lote sem interface gráfica (relatórios agendados, cron, pipelines).
+
+    python3 olap_cli.py vendas.olap consultas.json --format csv --output relatorios/
+    python3 olap_cli.py vendas.olap consultas.json --plot graficos/ > resultados.json
+    python3 olap_cli.py vendas.sqlite consultas.json -o relatorios/    (fatos ficam no disco)
+
+O arquivo de consultas é uma lista JSON (ou uma consulta JSON por linha):
+
+    [{"name": "vendas_regiao", "dims": ["REGIÃO"], "measure": "sum"},
+     {"dims": "PRODUTO, MÊS", "measure": "avg", "filters": {"REGIÃO": "SUL"}},
+     {"dims": ["MÊS"], "filters": {"REGIÃO": ["SUL", "NORTE"], "PRODUTO": {"not_in": ["CAMISA"]},
+                                   "valor": {"min": 100, "max": 500}}}]
+
+Tkinter nunca é importado; Matplotlib só quando `--plot` é usado.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from data_model import BACKENDS, OLAPModel
+from predicates import VALUE_FIELD, filter_json, parse_filter
+
+FORMATS = ("json", "csv")
+
+
+def load_queries(path):
+    """Lê as consultas (lista JSON ou JSON Lines; "-" = entrada padrão) já normalizadas."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        raw = json.loads(text)
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    queries = []
+    for i, query in enumerate(raw, start=1):
+        dims = query.get("dims", [])
+        if isinstance(dims, str):
+            dims = [d.strip() for d in dims.split(",") if d.strip()]
+        measure = query.get("measure", "sum")
+        try:
+            filters = {d: parse_filter(d, v) for d, v in (query.get("filters") or {}).items() if v != "TODOS"}
+        except ValueError as e:
+            raise ValueError(f"Consulta {i}: {e}") from None
+        name = query.get("name") or f"q{i:03d}_{'_'.join(dims)}_{measure}"
+        queries.append({"name": _safe_name(name), "dims": dims, "measure": measure, "filters": filters})
+    return queries
+
+
+def run_queries(model, queries):
+    """
+    Executa as consultas no modelo, uma a uma (os filtros de cada consulta substituem os anteriores).
+
+    Returns:
+        list: dicts com name, dims, measure, filters, result ({chave: valor} ou None), error, seconds
+        e trace (perfil por estágio, quando a instrumentação do modelo está ligada).
+    """
+    answers = []
+    for query in queries:
+        started = time.perf_counter()
+        trace = None
+        dims, measure = query["dims"], query["measure"]
+        levels = model.level_members()
+        unknown = [d for d in list(dims) + [f for f in query["filters"] if f != VALUE_FIELD]
+                   if d not in model.dimensions and d not in levels]
+        if not 1 <= len(dims) <= 3:
+            result, error = None, "Escolha de 1 a 3 dimensões."
+        elif unknown:
+            result, error = None, f"Dimensão inexistente: {', '.join(unknown)}."
+        else:
+            model.set_filters(query["filters"])
+            result, error = model.aggregate_data(dims, measure)
+            # Só consultas que chegaram ao modelo têm perfil (as recusadas acima não)
+            if model.last_trace.enabled:
+                trace = model.last_trace
+        answers.append(dict(query, result=result, error=error, seconds=time.perf_counter() - started,
+                            trace=trace))
+    return answers
+
+
+def write_csv(path, answer):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(answer["dims"] + [answer["measure"]])
+        for key, value in (answer["result"] or {}).items():
+            writer.writerow(list(key) + [value])
+
+
+def to_json(answer):
+    dims, measure = answer["dims"], answer["measure"]
+    rows = [dict(zip(dims, key), **{measure: value}) for key, value in (answer["result"] or {}).items()]
+    filters = {d: filter_json(v) for d, v in answer["filters"].items()}
+    return {"name": answer["name"], "dims": dims, "measure": measure, "filters": filters,
+            "error": answer["error"], "rows": rows}
+
+
+class PngWriter:
+    """Gráficos PNG off-screen (Agg), reaproveitando uma única figura para todas as consultas."""
+
+    def __init__(self):
+        # Importações pesadas só quando há gráficos a gerar
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from visualizer import FIGURE_SIZES, ResultChart
+
+        self._sizes = FIGURE_SIZES
+        self.chart = ResultChart(Figure())
+        FigureCanvasAgg(self.chart.figure)
+
+    def write(self, path, answer):
+        figure = self.chart.figure
+        figure.set_size_inches(self._sizes[len(answer["dims"])])
+        self.chart.update(answer["dims"], answer["result"], answer["measure"], answer["filters"])
+        figure.savefig(path, dpi=100)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa consultas OLAP em lote sobre um cubo salvo (sem interface gráfica).")
+    parser.add_argument("cube", help="cubo salvo (.olap binário, JSON ou banco .sqlite/.db)")
+    parser.add_argument("queries", help="arquivo de consultas (lista JSON ou JSON Lines; '-' = entrada padrão)")
+    parser.add_argument("--format", choices=FORMATS, default="json")
+    parser.add_argument("--output", "-o",
+                        help="diretório de saída (um arquivo por consulta); sem ele, JSON na saída padrão")
+    parser.add_argument("--plot", metavar="DIR", help="grava também um gráfico PNG por consulta neste diretório")
+    parser.add_argument("--verify", action="store_true", help="confere os checksums do cubo binário")
+    parser.add_argument("--profile", action="store_true",
+                        help="mostra na saída de erro o perfil por estágio de cada consulta (tempo, linhas, grupos)")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="armazenamento dos fatos (padrão: SQLite para .sqlite/.db, memória para os demais); "
+                             "'sqlite' importa JSON/.olap para um banco temporário")
+    args = parser.parse_args(argv)
+
+    if args.format == "csv" and not args.output:
+        parser.error("--format csv requer --output (um arquivo CSV por consulta).")
+
+    started = time.perf_counter()
+    model = OLAPModel({}, [], {})
+    model.load_cube(args.cube, verify=args.verify, backend=args.backend)
+    if args.profile:
+        model.enable_profiling()
+    try:
+        answers = run_queries(model, load_queries(args.queries))
+    finally:
+        model.close()
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for answer in answers:
+            path = os.path.join(args.output, f"{answer['name']}.{args.format}")
+            if args.format == "csv":
+                # Consultas inválidas só aparecem no relatório de erros (stderr)
+                if answer["result"] is not None:
+                    write_csv(path, answer)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(to_json(answer), f, ensure_ascii=False, indent=2)
+    else:
+        json.dump([to_json(a) for a in answers], sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+
+    if args.plot:
+        os.makedirs(args.plot, exist_ok=True)
+        writer = PngWriter()
+        for answer in answers:
+            if answer["result"]:
+                writer.write(os.path.join(args.plot, f"{answer['name']}.png"), answer)
+
+    for answer in answers:
+        if answer["trace"] is not None:
+            print(answer["trace"].summary(), file=sys.stderr)
+    failed = [a for a in answers if a["error"]]
+    for answer in failed:
+        print(f"{answer['name']}: {answer['error']}", file=sys.stderr)
+    print(f"{len(answers)} consultas ({len(failed)} com erro) sobre {len(model.facts):,} fatos "
+          f"em {time.perf_counter() - started:.2f} s.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _safe_name(name):
+    """Nome utilizável como arquivo (sem separadores de caminho)."""
+    return re.sub(r"[^\w\-.]+", "_", name).strip("._") or "consulta"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# parallel.py
+
+import os
+import time
+
+import numpy as np
+
+from aggregation import aggregate_codes, group_partials, merge_partials
+from sketches import merge_sketch_partials, sketch_aggregate, sketch_partials, sketch_result
+
+# Abaixo deste número de fatos o custo de distribuir supera o ganho: caminho serial
+DEFAULT_THRESHOLD = 2_000_000
+
+
+class ParallelAggregator:
+    """
+    Agregação particionada em vários processos.
+
+    Os fatos são divididos em fatias; cada processo calcula o estado parcial
+    (grupos, soma, contagem) da sua fatia e o processo principal mescla as partes.
+    A média só é derivada no final, então o resultado é exato. As colunas chegam
+    aos workers por memória compartilhada (ou pelo próprio arquivo, quando já estão
+    mapeadas de um cubo binário), nunca serializadas com pickle.
+    """
+
+    def __init__(self, workers=None, threshold=DEFAULT_THRESHOLD):
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self._pool = None
+
+    def aggregate(self, code_arrays, cardinalities, values):
+        """Mesmo contrato de aggregation.aggregate_codes (grupos, somas, contagens)."""
+        n = len(values)
+        if self.workers <= 1 or n < self.threshold:
+            return aggregate_codes(code_arrays, cardinalities, values)
+
+        partials = self._map(_partial, list(code_arrays) + [values], n, cardinalities)
+        return merge_partials(partials, cardinalities)
+
+    def sketch(self, code_arrays, cardinalities, column, spec):
+        """Medidas aproximadas (sketches.sketch_aggregate): sketches por fatia, mesclados no final."""
+        n = len(column)
+        if self.workers <= 1 or n < self.threshold:
+            return sketch_aggregate(code_arrays, cardinalities, column, spec)
+        partials = self._map(_sketch_partial, list(code_arrays) + [column], n, cardinalities, spec)
+        return sketch_result(merge_sketch_partials(partials), cardinalities, spec)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, fn, columns, n, *args):
+        """Executa fn(specs, *args, start, stop) em uma fatia dos fatos por worker."""
+        shared = []
+        try:
+            specs = [_export(column, shared) for column in columns]
+            bounds = np.linspace(0, n, self.workers + 1, dtype=np.int64)
+            pool = self._ensure_pool()
+            futures = [pool.submit(fn, specs, *args, int(start), int(stop))
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            return [f.result() for f in futures]
+        finally:
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            # Importados só quando o modo paralelo é usado (custo de inicialização da CLI/GUI)
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+
+            # "spawn": o processo principal tem threads (Tk/worker), fork não seria seguro
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+
+def _export(column, shared):
+    """Descreve uma coluna para os workers: arquivo mapeado (sem cópia) ou memória compartilhada."""
+    from multiprocessing import shared_memory
+
+    root = column
+    while isinstance(root.base, np.memmap):
+        root = root.base
+    if isinstance(root, np.memmap) and root.filename and column.flags.c_contiguous:
+        offset = root.offset + (column.ctypes.data - root.ctypes.data)
+        return ("file", root.filename, offset, column.dtype.str, len(column))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+    shared.append(shm)
+    np.ndarray(column.shape, dtype=column.dtype, buffer=shm.buf)[:] = column
+    return ("shm", shm.name, 0, column.dtype.str, len(column))
+
+
+def _partial(specs, cardinalities, start, stop):
+    """Executado no worker: estado parcial (grupos, somas, contagens) da fatia [start, stop)."""
+    return _with_columns(specs, start, stop, lambda columns: group_partials(columns[:-1], cardinalities, columns[-1]))
+
+
+def _sketch_partial(specs, cardinalities, spec, start, stop):
+    """Executado no worker: sketches por grupo da fatia [start, stop)."""
+    return _with_columns(specs, start, stop, lambda columns: sketch_partials(columns[:-1], cardinalities, columns[-1], spec))
+
+
+def _with_columns(specs, start, stop, fn):
+    """Abre as colunas descritas por _export (fatia [start, stop)) e aplica fn à lista."""
+    from multiprocessing import shared_memory
+
+    handles = []
+    columns = []
+    for kind, name, offset, dtype, length in specs:
+        if kind == "file":
+            column = np.memmap(name, dtype=dtype, mode="r", offset=offset, shape=(length,))
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            handles.append(shm)
+            column = np.ndarray((length,), dtype=dtype, buffer=shm.buf)
+        columns.append(column[start:stop])
+    try:
+        return fn(columns)
+    finally:
+        # As views precisam sumir antes de fechar a memória compartilhada
+        del columns, column
+        for shm in handles:
+            shm.close()
+
+
+def benchmark_scaling(num_facts=10_000_000, max_workers=None, cardinalities=(50, 20, 12), repeat=3):
+    """
+    Mede a agregação em 1..N workers sobre fatos sintéticos.
+    Retorna a lista de (workers, segundos, aceleração em relação a 1 worker).
+    """
+    rng = np.random.default_rng(0)
+    codes = [rng.integers(0, card, num_facts, dtype=np.int16) for card in cardinalities]
+    values = rng.uniform(50.0, 500.0, num_facts)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    rows = []
+    for workers in range(1, max_workers + 1):
+        aggregator = ParallelAggregator(workers, threshold=0)
+        aggregator.aggregate(codes, list(cardinalities), values)  # aquece o pool
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            aggregator.aggregate(codes, list(cardinalities), values)
+            best = min(best, time.perf_counter() - started)
+        aggregator.shutdown()
+        rows.append((workers, best, rows[0][1] / best if rows else 1.0))
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Escalabilidade da agregação particionada (1..N workers).")
+    parser.add_argument("--facts", type=int, default=10_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'segundos':>10} {'aceleração':>11}")
+    for workers, seconds, speedup in benchmark_scaling(args.facts, args.workers):
+        print(f"{workers:>8} {seconds:>10.3f} {speedup:>10.2f}x")
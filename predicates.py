@@ -0,0 +1,290 @@
+# predicates.py
+
+"""
+Predicados de filtro (Slice & Dice) e o planejador que os avalia sobre as colunas.
+
+Formas aceitas em `filters` (dimensão -> predicado); todas são hasheáveis, então
+continuam servindo de chave para o cache de resultados:
+
+    "SUL"                          igualdade (forma original)
+    ("in", ("SUL", "NORTE"))       valor em uma lista
+    ("not_in", ("CAMISA",))        exclusão (fatos sem valor na dimensão passam)
+    ("range", 100.0, None)         faixa fechada [mín, máx] sobre "valor" (None = aberta)
+
+Dimensões e níveis de hierarquia aceitam igualdade, lista e exclusão; "valor" só faixa.
+"""
+
+import numpy as np
+
+from fact_store import MISSING
+from hierarchy import child_codes
+
+# Campo da medida: único alvo de filtros por faixa
+VALUE_FIELD = "valor"
+
+# Estimativa de seletividade das faixas: amostra espaçada de até este número de valores
+RANGE_SAMPLE = 10_000
+
+# Custo (bytes lidos por fato) de avaliar um predicado varrendo a coluna: código + máscara;
+# sobre posições já selecionadas soma-se a posição (int64) usada para buscar o código
+_MASK_BYTES = 1
+_ROW_BYTES = 8
+
+
+def parse_filter(dim, spec):
+    """
+    Normaliza um predicado vindo da interface ou de JSON para a forma canônica.
+
+    Listas (["SUL", "NORTE"]) viram "in"; dicts aceitam {"in": [...]}, {"not_in": [...]}
+    e, para "valor", {"min": x, "max": y}. Levanta ValueError se o predicado for inválido.
+    """
+    if dim == VALUE_FIELD:
+        if isinstance(spec, dict):
+            low, high = spec.get("min"), spec.get("max")
+        elif isinstance(spec, (list, tuple)) and len(spec) == 3 and spec[0] == "range":
+            low, high = spec[1], spec[2]
+        elif isinstance(spec, (list, tuple)) and len(spec) == 2:
+            low, high = spec
+        else:
+            raise ValueError(f"O filtro de '{VALUE_FIELD}' deve ser uma faixa (mín, máx).")
+        low = None if low is None else float(low)
+        high = None if high is None else float(high)
+        if low is None and high is None:
+            raise ValueError(f"Informe o mínimo e/ou o máximo do filtro de '{VALUE_FIELD}'.")
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"Faixa de '{VALUE_FIELD}' inválida: mínimo {low} maior que o máximo {high}.")
+        return "range", low, high
+
+    if isinstance(spec, dict):
+        if len(spec) != 1 or next(iter(spec)) not in ("in", "not_in"):
+            raise ValueError(f"Filtro de '{dim}' inválido: use {{\"in\": [...]}} ou {{\"not_in\": [...]}}.")
+        op, members = next(iter(spec.items()))
+    elif isinstance(spec, (list, tuple)):
+        if len(spec) == 2 and spec[0] in ("in", "not_in") and isinstance(spec[1], (list, tuple)):
+            op, members = spec
+        else:
+            op, members = "in", spec
+    else:
+        return spec
+
+    members = tuple(dict.fromkeys(members))
+    if not members:
+        raise ValueError(f"Lista de valores vazia no filtro de '{dim}'.")
+    if op == "in" and len(members) == 1:
+        return members[0]
+    return op, members
+
+
+def parse_filters(filters):
+    return {dim: parse_filter(dim, spec) for dim, spec in filters.items()}
+
+
+def is_equality(filters):
+    """True se todos os filtros são igualdades em dimensões (a forma que cubo e acumuladores entendem)."""
+    return all(not isinstance(spec, tuple) and dim != VALUE_FIELD for dim, spec in filters.items())
+
+
+def matches(fact, dim, spec):
+    """Avalia o predicado em um fato (dict); usado pela implementação de referência em Python."""
+    value = fact.get(dim)
+    if not isinstance(spec, tuple):
+        return value == spec
+    if spec[0] == "in":
+        return value in spec[1]
+    if spec[0] == "not_in":
+        return value not in spec[1]
+    low, high = spec[1:]
+    return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+
+def describe(dim, spec):
+    """Texto do predicado para logs e títulos (ex.: "REGIÃO ∈ {SUL, NORTE}")."""
+    if not isinstance(spec, tuple):
+        return f"{dim}={spec}"
+    if spec[0] in ("in", "not_in"):
+        return f"{dim} {'∈' if spec[0] == 'in' else '∉'} {{{', '.join(map(str, spec[1]))}}}"
+    low, high = spec[1:]
+    if high is None:
+        return f"{dim} ≥ {low:g}"
+    if low is None:
+        return f"{dim} ≤ {high:g}"
+    return f"{low:g} ≤ {dim} ≤ {high:g}"
+
+
+def filter_json(spec):
+    """Forma JSON do predicado (inversa de parse_filter)."""
+    if not isinstance(spec, tuple):
+        return spec
+    if spec[0] == "range":
+        return {"min": spec[1], "max": spec[2]}
+    return {spec[0]: list(spec[1])}
+
+
+class PlanStep:
+    """Um predicado compilado: códigos aceitos (ou faixa), seletividade estimada e método escolhido."""
+
+    def __init__(self, dim, spec, column, codes=None, negate=False):
+        self.dim = dim
+        self.spec = spec
+        # Dimensão base (níveis de hierarquia viram conjuntos de códigos da base) ou "valor"
+        self.column = column
+        self.codes = codes
+        self.negate = negate
+        self.selectivity = 1.0
+        self.method = "scan"
+
+    def bitmap(self, index):
+        """Bitmap compactado dos fatos aceitos (OR dos bitmaps dos códigos listados)."""
+        selected = index.select_codes(self.column, self.codes)
+        return np.invert(selected) if self.negate else selected
+
+    def mask(self, facts, rows=None):
+        """Máscara vetorizada dos fatos aceitos (todos, ou só as posições `rows`)."""
+        if self.codes is None:
+            return _range_mask(facts.values if rows is None else facts.values[rows], *self.spec[1:])
+        # Tabela código -> aceito, com um elemento extra no fim: o código MISSING (-1) cai nele
+        table = np.zeros(len(facts.dimensions[self.column]) + 1, dtype=bool)
+        table[self.codes] = True
+        if self.negate:
+            table = ~table
+        codes = facts.codes(self.column)
+        return table[codes if rows is None else codes[rows]]
+
+    def __repr__(self):
+        return f"{describe(self.dim, self.spec)} [{self.method}, {self.selectivity:.1%}]"
+
+
+class CodeCounts:
+    """
+    Número de fatos por código de cada dimensão (estatística do planejador), calculado
+    com np.bincount direto na coluna e guardado enquanto a versão dos fatos não muda.
+    """
+
+    def __init__(self, facts):
+        self.facts = facts
+        self.version = None
+        self._counts = {}
+
+    def at(self, version):
+        """As contagens valem para `version`; uma versão nova descarta as anteriores."""
+        if version != self.version:
+            self.version = version
+            self._counts = {}
+        return self
+
+    def __getitem__(self, dim):
+        counts = self._counts.get(dim)
+        if counts is None:
+            codes = self.facts.codes(dim)
+            counts = np.bincount(codes[codes != MISSING], minlength=len(self.facts.dimensions[dim]))
+            self._counts[dim] = counts
+        return counts
+
+
+class FilterPlan:
+    """
+    Plano de avaliação dos filtros: um passo por predicado, do mais seletivo ao menos
+    seletivo (seletividade exata das contagens por código; amostra para faixas).
+
+    Cada passo usa o índice bitmap (OR dos bitmaps dos códigos listados) ou uma
+    varredura vetorizada da coluna, o que ler menos bytes para as linhas que ainda
+    restam naquele ponto: depois de um predicado muito seletivo, os seguintes só
+    examinam as posições já selecionadas. Só os passos que escolhem o índice montam
+    (no primeiro uso) os bitmaps dos seus códigos.
+    """
+
+    def __init__(self, facts, index, filters, levels=None, counts=None):
+        self.facts = facts
+        self.index = index
+        self.total = len(facts)
+        # Contagens por código (CodeCounts do modelo, reaproveitadas entre consultas)
+        self.counts = CodeCounts(facts) if counts is None else counts
+        levels = levels or {}
+        steps = [self._compile(dim, spec, levels) for dim, spec in filters.items()]
+        steps.sort(key=lambda step: step.selectivity)
+
+        remaining = float(self.total)
+        for step in steps:
+            step.method = self._choose(step, remaining)
+            remaining *= step.selectivity
+        self.steps = steps
+        self.estimated_rows = int(round(remaining))
+
+    def rows(self):
+        """Posições (int64) dos fatos que satisfazem todos os predicados; None = todos."""
+        # Enquanto só há passos de índice o estado é um bitmap; depois, as posições restantes
+        selected, rows = None, None
+        for step in self.steps:
+            if step.method == "none":
+                # Dimensão inexistente: a exclusão aceita tudo, os demais não aceitam nada
+                if step.negate:
+                    continue
+                return np.empty(0, dtype=np.int64)
+            if rows is None and step.method == "index":
+                bits = step.bitmap(self.index)
+                selected = bits if selected is None else np.bitwise_and(selected, bits, out=selected)
+                continue
+            if rows is None and selected is not None:
+                rows, selected = self.index.positions(selected), None
+            if rows is None:
+                rows = np.flatnonzero(step.mask(self.facts))
+            elif step.method == "index":
+                rows = rows[self.index.contains(step.bitmap(self.index), rows)]
+            else:
+                rows = rows[step.mask(self.facts, rows)]
+            if not len(rows):
+                break
+        if rows is None and selected is not None:
+            return self.index.positions(selected)
+        return rows
+
+    def _compile(self, dim, spec, levels):
+        if dim == VALUE_FIELD:
+            step = PlanStep(dim, spec, VALUE_FIELD)
+            values = self.facts.values
+            sample = values[::max(1, len(values) // RANGE_SAMPLE)]
+            step.selectivity = float(_range_mask(sample, *spec[1:]).mean()) if len(sample) else 0.0
+            return step
+
+        op, members = ("in", (spec,)) if not isinstance(spec, tuple) else spec
+        if dim in levels:
+            # Membros de um nível -> códigos da dimensão base sob eles
+            column = levels[dim][0]
+            codes = [child_codes(levels, dim, member) for member in members]
+            codes = np.unique(np.concatenate(codes)) if codes else np.empty(0, dtype=np.int64)
+        elif dim in self.facts.dimensions:
+            column = dim
+            codes = [self.facts.lookup(dim, member) for member in members]
+            codes = np.array(sorted({c for c in codes if c is not None}), dtype=np.int64)
+        else:
+            # Dimensão inexistente: nenhum fato tem valor nela
+            step = PlanStep(dim, spec, None, np.empty(0, dtype=np.int64), negate=op == "not_in")
+            step.selectivity = 1.0 if step.negate else 0.0
+            step.method = "none"
+            return step
+
+        step = PlanStep(dim, spec, column, codes, negate=op == "not_in")
+        if self.total:
+            listed = int(self.counts[column][codes].sum())
+            step.selectivity = (self.total - listed if step.negate else listed) / self.total
+        return step
+
+    def _choose(self, step, remaining):
+        """Índice ou varredura: o que ler menos bytes para as `remaining` linhas ainda candidatas."""
+        if step.method == "none" or step.codes is None:
+            return step.method
+        if not self.index.indexed(step.column):
+            return "scan"
+        index_bytes = len(step.codes) * self.total / 8
+        item = self.facts.codes(step.column).itemsize + _MASK_BYTES
+        scan_bytes = self.total * item if remaining >= self.total else remaining * (item + _ROW_BYTES)
+        return "index" if index_bytes <= scan_bytes else "scan"
+
+
+def _range_mask(values, low, high):
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
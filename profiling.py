@@ -0,0 +1,213 @@
+# profiling.py
+
+"""
+Instrumentação das consultas por estágio (filtro, agrupamento, roll-up, medida,
+relatório, gráfico).
+
+Cada consulta vira um QueryTrace; cada estágio, um registro (dict) com a consulta,
+o estágio, o tempo e os campos informados pelo código instrumentado (linhas
+varridas, grupos produzidos, caminho usado):
+
+    {"query": 12, "label": "SUM por PRODUTO", "stage": "group", "seconds": 0.0031,
+     "rows": 250000, "groups": 40, "path": "scan"}
+
+Com memória ligada, `peak_bytes` é o pico de memória alocada (tracemalloc) acima
+do início do estágio. Opcionalmente, uma consulta é capturada inteira pelo cProfile.
+
+Desligado, o Profiler devolve sempre o mesmo trace nulo, cujos estágios não medem
+nada: o custo é o de uma chamada de método por estágio.
+"""
+
+import cProfile
+import io
+import itertools
+import pstats
+import time
+import tracemalloc
+from collections import deque
+
+# Registros mantidos (os mais antigos são descartados)
+PROFILE_MAX_RECORDS = 5000
+# Funções listadas no relatório do cProfile (ordenadas por tempo acumulado)
+CPROFILE_LINES = 15
+
+
+class _NullStage:
+    """Estágio e trace sem efeito (instrumentação desligada)."""
+
+    enabled = False
+    id = None
+
+    def stage(self, name, **fields):
+        return self
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_TRACE = _NullStage()
+
+
+class _Stage:
+    """Cronômetro de um estágio; `set` acrescenta campos ao registro (linhas, grupos...)."""
+
+    __slots__ = ("trace", "record", "_start", "_memory", "_base", "_peak")
+
+    def __init__(self, trace, record):
+        self.trace = trace
+        self.record = record
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def __enter__(self):
+        self._memory = self.trace.memory and tracemalloc.is_tracing()
+        if self._memory:
+            # reset_peak zera o pico global: antes, o pico até aqui é repassado aos estágios abertos
+            current, peak = tracemalloc.get_traced_memory()
+            for stage in self.trace.open_stages:
+                stage._peak = max(stage._peak, peak)
+            tracemalloc.reset_peak()
+            self._base = self._peak = current
+            self.trace.open_stages.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["seconds"] = time.perf_counter() - self._start
+        if self._memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            self.trace.open_stages.remove(self)
+            for stage in self.trace.open_stages:
+                stage._peak = max(stage._peak, self._peak)
+            self.record["peak_bytes"] = self._peak - self._base
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.trace.records.append(self.record)
+        self.trace.profiler.records.append(self.record)
+        return False
+
+
+class QueryTrace:
+    """
+    Registros de uma consulta. Como contexto, delimita a parte do modelo (registro
+    "total" e, se pedido, a captura do cProfile); estágios posteriores da interface
+    (relatório, gráfico) continuam no mesmo trace.
+    """
+
+    enabled = True
+
+    def __init__(self, profiler, query_id, label, memory=False, capture=False):
+        self.profiler = profiler
+        self.id = query_id
+        self.label = label
+        self.memory = memory
+        self.capture = capture
+        self.records = []
+        # Estágios medindo memória ainda abertos (os externos recebem o pico dos aninhados)
+        self.open_stages = []
+        # Relatório do cProfile (texto), quando a consulta foi capturada
+        self.profile = None
+        self._total = None
+        self._cprofile = None
+
+    def stage(self, name, **fields):
+        return _Stage(self, dict(query=self.id, label=self.label, stage=name, **fields))
+
+    def __enter__(self):
+        if self.capture:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._total = self.stage("total").__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(CPROFILE_LINES)
+            self.profile = out.getvalue()
+            self._total.set(profile=self.profile)
+            self._cprofile = None
+        return self._total.__exit__(exc_type, exc, tb)
+
+    def summary(self):
+        """Uma linha para o log: estágios na ordem, com tempo, linhas, grupos e memória."""
+        parts, total = [], None
+        for record in self.records:
+            if record["stage"] == "total":
+                total = record
+                continue
+            details = [f"{record['seconds'] * 1000:,.1f} ms"]
+            if "rows" in record:
+                details.append(f"{record['rows']:,} linhas")
+            if "groups" in record:
+                details.append(f"{record['groups']:,} grupos")
+            if "path" in record:
+                details.append(record["path"])
+            if "hit" in record:
+                details.append("acerto" if record["hit"] else "falha")
+            if "peak_bytes" in record:
+                details.append(f"pico {record['peak_bytes'] / 2**20:,.1f} MB")
+            parts.append(f"{record['stage']} ({', '.join(details)})")
+        text = f"Perfil #{self.id} {self.label}: {' → '.join(parts)}"
+        if total is not None:
+            text += f" | modelo: {total['seconds'] * 1000:,.1f} ms"
+        return text
+
+
+class Profiler:
+    """Liga/desliga a instrumentação e guarda os registros de todas as consultas (buffer circular)."""
+
+    def __init__(self, max_records=PROFILE_MAX_RECORDS):
+        self.enabled = False
+        self.memory = False
+        self.records = deque(maxlen=max_records)
+        self._ids = itertools.count(1)
+        self._capture_next = False
+        self._started_tracemalloc = False
+
+    def enable(self, memory=False):
+        """Liga a instrumentação; `memory` também mede o pico por estágio (tracemalloc, mais lento)."""
+        self.enabled = True
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif not memory and self._started_tracemalloc:
+            self._stop_tracemalloc()
+        self.memory = memory
+
+    def disable(self):
+        self.enabled = False
+        self.memory = False
+        self._capture_next = False
+        if self._started_tracemalloc:
+            self._stop_tracemalloc()
+
+    def capture_next(self):
+        """Captura a próxima consulta inteira com o cProfile (mesmo com a instrumentação desligada)."""
+        self._capture_next = True
+
+    def trace(self, label):
+        """Trace para uma nova consulta, ou NULL_TRACE quando não há nada a medir."""
+        if not self.enabled and not self._capture_next:
+            return NULL_TRACE
+        capture, self._capture_next = self._capture_next, False
+        return QueryTrace(self, next(self._ids), label, memory=self.memory, capture=capture)
+
+    def read(self, query=None):
+        """Cópia dos registros (todos, ou só os de uma consulta)."""
+        return [dict(r) for r in list(self.records) if query is None or r["query"] == query]
+
+    def clear(self):
+        self.records.clear()
+
+    def _stop_tracemalloc(self):
+        tracemalloc.stop()
+        self._started_tracemalloc = False
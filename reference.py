@@ -0,0 +1,84 @@
+# reference.py
+
+"""
+Implementação de referência da agregação, em Python puro: uma passada por etapa sobre
+os fatos como dicts, sem códigos, índices, cubo nem acumuladores. É lenta, mas simples
+o bastante para servir de oráculo nos testes (test_aggregation.py), que comparam com ela
+o motor vetorizado, o SQLite, os GROUPING SETS e os acumuladores ativos.
+"""
+
+from collections import defaultdict
+import math
+
+import numpy as np
+
+from hierarchy import expand_levels
+from predicates import matches
+from sketches import parse_measure
+
+
+def aggregate_python(facts, dims, measure, filters=None, hierarchies=None):
+    """
+    Mesmo contrato de OLAPModel.aggregate_data: (resultado, erro), com o resultado no
+    formato {(valor_dim1, ...): medida}. `facts` é qualquer iterável de fatos (dicts).
+    """
+
+    # 0. Níveis de hierarquia viram campos do fato (subindo a cadeia de pais)
+    if hierarchies:
+        facts = [dict(f, **expand_levels(f, hierarchies)) for f in facts]
+
+    # 1. Aplica o filtro (Slice)
+    filters = filters or {}
+    filtered_facts = [f for f in facts if all(matches(f, dim, spec) for dim, spec in filters.items())]
+
+    if not filtered_facts:
+        return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+
+    # 2. Agrupar dados (contagem distinta: valores da dimensão contada)
+    spec = parse_measure(measure)
+    field = spec[1] if spec and spec[0] == "distinct" else "valor"
+    data = defaultdict(list)
+    for f in filtered_facts:
+        if not all(d in f for d in dims):
+            continue
+        key = tuple(f[d] for d in dims)
+        data[key].append(f.get(field))
+
+    if not data:
+        return None, "Nenhum fato corresponde aos filtros e/ou dimensões selecionadas."
+
+    # 3. Calcular a Medida
+    if spec and spec[0] == "quantile":
+        result = {k: float(np.quantile(v, spec[1])) for k, v in data.items()}
+    elif spec:
+        result = {k: len({x for x in v if x is not None}) for k, v in data.items()}
+    elif measure == "sum":
+        result = {k: sum(v) for k, v in data.items()}
+    elif measure == "avg":
+        result = {k: sum(v) / len(v) for k, v in data.items()}
+    else: # count
+        result = {k: len(v) for k, v in data.items()}
+
+    return result, None
+
+
+def running_python(facts, running):
+    """Acumuladores {(valor_dim1, ...): (soma, contagem)} esperados para uma agregação ativa."""
+    sums, _ = aggregate_python(facts, running.dims, "sum", running.filters)
+    counts, _ = aggregate_python(facts, running.dims, "count", running.filters)
+    return {k: (sums[k], counts[k]) for k in sums or {}}
+
+
+def compare(result, expected, rel_tol=1e-9):
+    """
+    Divergências entre dois resultados {grupo: valor} (valores numéricos ou tuplas):
+    lista vazia quando coincidem.
+    """
+    result, expected = result or {}, expected or {}
+    mismatches = [("grupo", k, result.get(k), expected.get(k)) for k in set(result) ^ set(expected)]
+    for k in set(result) & set(expected):
+        got, want = result[k], expected[k]
+        pairs = zip(got, want) if isinstance(got, tuple) else [(got, want)]
+        if not all(math.isclose(a, b, rel_tol=rel_tol) for a, b in pairs):
+            mismatches.append((k, got, want))
+    return mismatches
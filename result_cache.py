@@ -0,0 +1,94 @@
+# result_cache.py
+
+from collections import OrderedDict
+import sys
+
+# Custo de cada grupo de um resultado, além da tupla-chave: float da medida e slot do dict
+_ENTRY_BYTES = 24 + 16
+
+
+class ResultCache:
+    """
+    Cache LRU dos resultados de agregação.
+
+    A chave combina os filtros normalizados, as dimensões (em ordem), a medida e a
+    versão dos fatos do modelo; qualquer mutação incrementa a versão, o que torna
+    as entradas antigas inalcançáveis (e elas são descartadas em `invalidate`).
+    O despejo acontece por número de entradas e/ou por bytes estimados.
+
+    Os resultados são copiados na entrada e na saída: quem recebe um resultado pode
+    alterá-lo sem corromper o cache.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def make_key(filters, dims, measure, version):
+        return (tuple(sorted(filters.items())), tuple(dims), measure, version)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return _copy(entry[0])
+
+    def put(self, key, value):
+        value = _copy(value)
+        size = _estimate_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, version):
+        """Descarta as entradas calculadas sobre versões anteriores dos fatos."""
+        for key in [k for k in self._entries if k[-1] != version]:
+            self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _copy(value):
+    """Cópia rasa do par (resultado, erro): chaves e medidas são imutáveis."""
+    result, error = value
+    return (None if result is None else dict(result)), error
+
+
+def _estimate_size(value):
+    """Estimativa da memória de um par (resultado, erro): custo fixo por grupo, em O(1)."""
+    result, error = value
+    size = sys.getsizeof(value) + sys.getsizeof(error)
+    if result:
+        key = next(iter(result))
+        size += sys.getsizeof(result) + len(result) * (_ENTRY_BYTES + sys.getsizeof(key))
+    return size
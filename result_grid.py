@@ -0,0 +1,197 @@
+# result_grid.py
+
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+# Linhas mantidas no widget de log; as mais antigas são descartadas (buffer circular)
+LOG_MAX_LINES = 2000
+# Rolagem da roda do mouse, em linhas da grade
+WHEEL_ROWS = 3
+
+
+class ResultTable:
+    """
+    Dados da grade de resultados, independentes do Tk: rótulos por linha, matriz de
+    valores (NaN = célula vazia), ordenação por coluna e limite top-N. Só as linhas
+    de uma janela (`rows`) são formatadas em texto.
+    """
+
+    def __init__(self):
+        self.set([], [], np.empty((0, 0)))
+
+    def set(self, columns, labels, values, subtotals=None, sortable=True):
+        """
+        Substitui os dados. `columns`: nomes (rótulos e depois valores); `labels`: uma tupla
+        de rótulos por linha; `values`: matriz (linhas x colunas de valor); `subtotals`: linhas
+        destacadas (pivot). Tabelas com subtotais não são ordenáveis (a estrutura se perderia).
+        """
+        self.columns = list(columns)
+        self.labels = labels
+        values = np.asarray(values, dtype=np.float64)
+        self.values = values[:, None] if values.ndim == 1 else values
+        self.subtotals = np.zeros(len(labels), dtype=bool) if subtotals is None else np.asarray(subtotals, dtype=bool)
+        self.sortable = sortable
+        self.sort_column = None
+        self.descending = False
+        self.limit = 0
+        self._order = np.arange(len(labels))
+
+    @property
+    def total(self):
+        return len(self.labels)
+
+    @property
+    def label_columns(self):
+        return len(self.columns) - self.values.shape[1]
+
+    def __len__(self):
+        return min(self.limit, self.total) if self.limit else self.total
+
+    def sort(self, column, descending=None):
+        """Ordena por uma coluna (rótulo: texto; valor: numérico, vazios no fim). Sem `descending`, alterna."""
+        if not self.sortable:
+            return
+        if descending is None:
+            descending = not self.descending if column == self.sort_column else column >= self.label_columns
+        self.sort_column, self.descending = column, descending
+        if column < self.label_columns:
+            keys = [str(label[column]) for label in self.labels]
+            self._order = np.array(sorted(range(self.total), key=keys.__getitem__, reverse=descending), dtype=np.intp)
+        else:
+            values = self.values[:, column - self.label_columns]
+            # argsort estável deixa NaN no fim; na ordem decrescente ordena-se o valor negado
+            self._order = np.argsort(-values if descending else values, kind="stable")
+
+    def set_limit(self, n):
+        """Top-N: só as N primeiras linhas da ordem atual (0 = todas). Sem ordenação, ordena pela medida."""
+        self.limit = max(0, int(n))
+        if self.limit and self.sort_column is None and self.sortable and self.values.shape[1]:
+            self.sort(len(self.columns) - 1, descending=True)
+
+    def rows(self, start, stop):
+        """Linhas [start, stop) da vista: (células formatadas, subtotal?)."""
+        stop = min(stop, len(self))
+        out = []
+        for i in self._order[start:stop].tolist():
+            cells = [str(label) for label in self.labels[i]]
+            cells += ["" if np.isnan(v) else f"{v:,.2f}" for v in self.values[i].tolist()]
+            out.append((cells, bool(self.subtotals[i])))
+        return out
+
+
+class ResultGrid(ttk.Frame):
+    """
+    Grade virtualizada sobre ttk.Treeview: o widget só contém as linhas visíveis
+    (uma janela da ResultTable), recriadas ao rolar. Inserir dezenas de milhares de
+    itens no Treeview custaria segundos; aqui o custo é proporcional à altura da tela.
+    Clique no cabeçalho ordena (de novo inverte); `set_limit` aplica o top-N.
+    """
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.table = ResultTable()
+        self.offset = 0
+        self.page = 20
+        self.on_change = None
+
+        self.tree = ttk.Treeview(self, show="headings", selectmode="browse")
+        self.tree.tag_configure("subtotal", background="#e8eef5", font=("Arial", 10, "bold"))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self._scroll_by(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.tree.bind("<Button-4>", lambda e: self._scroll_by(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_by(WHEEL_ROWS))
+
+    def show(self, columns, labels, values, subtotals=None, sortable=True):
+        """Exibe novos dados (ver ResultTable.set); o limite top-N atual é mantido."""
+        limit = self.table.limit
+        self.table.set(columns, labels, values, subtotals, sortable)
+        self.table.set_limit(limit)
+        self.tree.configure(columns=[f"c{i}" for i in range(len(columns))])
+        for i, name in enumerate(self.table.columns):
+            numeric = i >= self.table.label_columns
+            self.tree.heading(f"c{i}", text=name, command=lambda i=i: self.sort(i))
+            self.tree.column(f"c{i}", anchor="e" if numeric else "w", width=110 if numeric else 130, stretch=True)
+        self.offset = 0
+        self._render()
+
+    def show_result(self, dims, measure, result):
+        """Atalho para o dict de aggregate_data: uma linha por grupo, a medida como única coluna de valor."""
+        values = np.fromiter(result.values(), dtype=np.float64, count=len(result))
+        self.show(list(dims) + [measure], list(result.keys()), values)
+
+    def sort(self, column):
+        self.table.sort(column)
+        self.offset = 0
+        self._render()
+
+    def set_limit(self, n):
+        self.table.set_limit(n)
+        self.offset = 0
+        self._render()
+
+    def _render(self):
+        self.tree.delete(*self.tree.get_children())
+        for cells, subtotal in self.table.rows(self.offset, self.offset + self.page):
+            self.tree.insert("", tk.END, values=cells, tags=("subtotal",) if subtotal else ())
+        for i, name in enumerate(self.table.columns):
+            arrow = ""
+            if i == self.table.sort_column:
+                arrow = " ▼" if self.table.descending else " ▲"
+            self.tree.heading(f"c{i}", text=name + arrow)
+
+        total = len(self.table)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.page) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self.on_change is not None:
+            self.on_change(total, self.table.total)
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * len(self.table)))
+        else:
+            self._scroll_by(int(amount) * (self.page if unit == "pages" else 1))
+
+    def _scroll_by(self, rows):
+        self._scroll_to(self.offset + rows)
+        return "break"
+
+    def _scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.table) - self.page))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _on_resize(self, event):
+        # Quantas linhas cabem na altura atual (descontado o cabeçalho)
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        page = max(1, (event.height - row_height) // row_height)
+        if page != self.page:
+            self.page = page
+            self.offset = max(0, min(self.offset, len(self.table) - page))
+            self._render()
+
+
+class LogView:
+    """Log em um tk.Text limitado a `max_lines` linhas: as mais antigas são descartadas."""
+
+    def __init__(self, text, max_lines=LOG_MAX_LINES):
+        self.text = text
+        self.max_lines = max_lines
+
+    def append(self, line):
+        self.text.insert(tk.END, line + "\n")
+        # "end-1c" é o fim do texto; a linha vazia final não conta
+        lines = int(self.text.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.text.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        self.text.see(tk.END)
@@ -0,0 +1,289 @@
+# sketches.py
+
+"""
+Medidas aproximadas com resumos (sketches) mescláveis e de memória limitada por grupo.
+
+- Percentis (median, p95, pNN): sketch KLL. Com k=200 o erro de posto (rank) fica
+  abaixo de ~1,7% com 99% de confiança: o valor retornado para p95 está entre os
+  percentis ~93,3 e ~96,7 dos dados. Memória: algumas centenas de valores (~2 KB) por grupo.
+- Contagem distinta (distinct:DIM): HyperLogLog com 2^12 registradores; erro relativo
+  padrão 1,04/√4096 ≈ 1,6% (≈5% com 99% de confiança). Memória: 4 KB por grupo.
+
+Grupos pequenos ficam em modo exato (todos os valores / todos os hashes), dentro do
+mesmo limite de memória; o resultado só passa a ser aproximado acima dele. Os sketches
+se mesclam sem perda adicional, então podem ser calculados por bloco ou por processo.
+"""
+
+import re
+
+import numpy as np
+
+from aggregation import group_index, unravel_groups
+from fact_store import MISSING
+
+# Medidas aproximadas oferecidas na interface (além de distinct:<dimensão>)
+SKETCH_MEASURES = ["median", "p95"]
+
+# Parâmetros: precisão do KLL e limite do modo exato de cada sketch
+KLL_K = 200
+QUANTILE_EXACT_LIMIT = 1000
+# Semente padrão das compactações do KLL: o mesmo cubo dá sempre o mesmo percentil
+KLL_SEED = 0
+HLL_PRECISION = 12
+DISTINCT_EXACT_LIMIT = 512
+
+# Fatos processados por bloco (limita a memória temporária da ordenação)
+SKETCH_CHUNK = 1_000_000
+
+_PERCENTILE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+
+
+def parse_measure(measure):
+    """
+    ("quantile", q) para median/pNN, ("distinct", dimensão) para distinct:DIM,
+    None para as medidas exatas (sum, avg, count).
+    """
+    if measure == "median":
+        return "quantile", 0.5
+    match = _PERCENTILE.match(measure)
+    if match:
+        return "quantile", float(match.group(1)) / 100
+    if measure.startswith("distinct:"):
+        return "distinct", measure.split(":", 1)[1]
+    return None
+
+
+class QuantileSketch:
+    """
+    Sketch KLL de quantis. Até `exact_limit` valores guarda tudo (quantil exato, com
+    interpolação linear como np.quantile); acima disso compacta os níveis: cada nível h
+    guarda itens de peso 2^h, com capacidade k·(2/3)^(profundidade). A semente fixa
+    torna as compactações (e o resultado) reproduzíveis.
+    """
+
+    def __init__(self, k=KLL_K, exact_limit=QUANTILE_EXACT_LIMIT, seed=KLL_SEED):
+        self.k = k
+        self.exact_limit = exact_limit
+        self.n = 0
+        self.exact = True
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        self.n += other.n
+        self.exact = self.exact and other.exact
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        if not self.n:
+            return float("nan")
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 1 << h, dtype=np.int64)
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = min(np.searchsorted(cumulative, q * cumulative[-1], side="left"), len(items) - 1)
+        return float(items[order][position])
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        if self.exact:
+            if self.n <= self.exact_limit:
+                return
+            self.exact = False
+        while True:
+            for h, items in enumerate(self.levels):
+                if len(items) > self._capacity(h):
+                    break
+            else:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            # Compactação: ordena o nível e promove um a cada dois itens (deslocamento aleatório)
+            items = np.sort(items)
+            odd = len(items) % 2
+            self.levels[h] = items[:odd]
+            promoted = items[odd + int(self._rng.integers(2))::2]
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+
+class DistinctSketch:
+    """
+    HyperLogLog sobre hashes de 64 bits. Até `exact_limit` hashes distintos guarda o
+    conjunto (contagem exata); acima disso mantém só os 2^p registradores.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, exact_limit=DISTINCT_EXACT_LIMIT):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.registers = None
+
+    @property
+    def exact(self):
+        return self.registers is None
+
+    @property
+    def nbytes(self):
+        return self.hashes.nbytes if self.exact else self.registers.nbytes
+
+    def update(self, hashes):
+        """Adiciona hashes (uint64, ver hash64); repetidos não alteram a contagem."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if self.exact:
+            self.hashes = np.union1d(self.hashes, hashes)
+            if len(self.hashes) > self.exact_limit:
+                self._to_registers()
+        else:
+            self._add(hashes)
+
+    def merge(self, other):
+        if other.exact:
+            self.update(other.hashes)
+        else:
+            if self.exact:
+                self._to_registers()
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Número (inteiro) de itens distintos: exato no modo exato, arredondado no HyperLogLog."""
+        if self.exact:
+            return len(self.hashes)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Correção para cardinalidades pequenas (contagem linear)
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+    def _to_registers(self):
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._add(self.hashes)
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def _add(self, hashes):
+        index, rank = _register_ranks(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+
+def hash64(values):
+    """Hash de 64 bits (finalizador splitmix64) de inteiros, vetorizado."""
+    x = np.asarray(values).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _register_ranks(hashes, precision):
+    """Registrador (p bits mais altos) e posição do primeiro bit 1 no restante do hash."""
+    rest_bits = 64 - precision
+    index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    # rest < 2^52 cabe exatamente em float64: o expoente de frexp é o número de bits
+    bit_length = np.frexp(rest.astype(np.float64))[1]
+    return index, (rest_bits - bit_length + 1).astype(np.uint8)
+
+
+def sketch_partials(code_arrays, cardinalities, column, spec, chunk_size=SKETCH_CHUNK):
+    """
+    Sketches por grupo de um conjunto de fatos, processados em blocos.
+    `column` são os valores (quantis) ou os códigos da dimensão contada (distinct).
+
+    Returns:
+        dict: índice do grupo (misto) -> sketch; mesclável com merge_sketch_partials.
+    """
+    kind = spec[0]
+    partial = {}
+    for start in range(0, len(column), chunk_size):
+        stop = start + chunk_size
+        items = column[start:stop]
+        if code_arrays:
+            flat, valid = group_index([c[start:stop] for c in code_arrays], cardinalities)
+        else:
+            # Sem dimensões (total geral): um único grupo
+            flat, valid = np.zeros(len(items), dtype=np.int64), np.ones(len(items), dtype=bool)
+        if not valid.all():
+            items = items[valid]
+        present = None
+        if kind == "distinct":
+            # Fatos sem valor na dimensão contada não entram na contagem distinta, mas o
+            # grupo continua no resultado (contagem 0 se nenhum fato tiver o valor)
+            present = items != MISSING
+            items = hash64(items)
+
+        # Ordena por (grupo, item): cada grupo vira uma fatia contígua
+        order = np.lexsort((items, flat))
+        flat, items = flat[order], items[order]
+        if present is not None:
+            present = present[order]
+        groups, starts = np.unique(flat, return_index=True)
+        bounds = np.append(starts, len(flat))
+        for group, lo, hi in zip(groups.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            # Semente derivada do grupo: reproduzível e sem correlação entre os grupos
+            sketch = QuantileSketch(seed=group) if kind == "quantile" else DistinctSketch()
+            sketch.update(items[lo:hi] if present is None else items[lo:hi][present[lo:hi]])
+            if group in partial:
+                partial[group].merge(sketch)
+            else:
+                partial[group] = sketch
+    return partial
+
+
+def merge_sketch_partials(partials):
+    """Mescla os sketches de várias partes (blocos, processos) grupo a grupo."""
+    merged = {}
+    for partial in partials:
+        for group, sketch in partial.items():
+            if group in merged:
+                merged[group].merge(sketch)
+            else:
+                merged[group] = sketch
+    return merged
+
+
+def sketch_result(partial, cardinalities, spec):
+    """
+    Converte os sketches por grupo no mesmo contrato de aggregate_codes:
+    (códigos dos grupos por dimensão, valores da medida, contagens de fatos).
+    """
+    groups = np.array(sorted(partial), dtype=np.int64)
+    sketches = [partial[g] for g in groups.tolist()]
+    kind, param = spec
+    if kind == "quantile":
+        values = np.array([s.quantile(param) for s in sketches], dtype=np.float64)
+        counts = [s.n for s in sketches]
+    else:
+        values = np.array([s.estimate() for s in sketches], dtype=np.int64)
+        counts = [1] * len(sketches)
+    return unravel_groups(groups, cardinalities), values, np.array(counts, dtype=np.int64)
+
+
+def sketch_aggregate(code_arrays, cardinalities, column, spec, chunk_size=SKETCH_CHUNK):
+    """Atalho serial: sketches por bloco, mesclados, e o resultado por grupo."""
+    return sketch_result(sketch_partials(code_arrays, cardinalities, column, spec, chunk_size),
+                         cardinalities, spec)
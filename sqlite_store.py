@@ -0,0 +1,428 @@
+# sqlite_store.py
+
+"""
+Armazenamento dos fatos em SQLite (módulo sqlite3 da biblioteca padrão), para
+cubos que não cabem na memória.
+
+Os fatos ficam na tabela `facts`: uma coluna INTEGER por dimensão com o código
+do valor (mesmo dicionário de `dimensions`; NULL = fato sem a dimensão), mais a
+medida `valor` REAL, e um índice por dimensão. Dicionários, colunas e hierarquias
+ficam em JSON na tabela `meta`, então o arquivo .sqlite é um cubo completo.
+
+Filtros e GROUP BY vão para o SQL (WHERE + SUM/COUNT); o Python só recebe uma
+linha por grupo. Para a escrita, o objeto tem a mesma interface do FactStore
+(append, append_columns, encode, set_dimension, reset), então gerador, importação
+de CSV e leitores de cubo gravam nele sem mudanças. Fatos avulsos são inseridos
+em lotes (executemany), gravados antes de cada consulta.
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from fact_store import MISSING
+from hierarchy import child_codes
+from predicates import VALUE_FIELD
+
+# Extensões de arquivo abertas direto no SQLite (em vez de lidas para a memória)
+SQLITE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+# Fatos avulsos acumulados antes de cada executemany
+BATCH_SIZE = 10_000
+# Fatos por bloco nas cargas em massa e nas leituras em bloco (sketches, exportação)
+CHUNK_SIZE = 100_000
+
+
+def is_sqlite_path(path):
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+class SQLiteStore:
+    """
+    Fatos em um banco SQLite. `path` vazio cria um banco temporário em disco,
+    apagado ao fechar. Um arquivo que já contém um cubo é aberto: `dimensions` e
+    `hierarchies` (dicts do modelo, alterados no lugar) recebem os do banco. Com
+    `create=False`, um banco sem cubo é recusado (ValueError) em vez de inicializado.
+    """
+
+    def __init__(self, dimensions, path="", hierarchies=None, create=True, batch_size=BATCH_SIZE):
+        self.dimensions = dimensions
+        self.hierarchies = {} if hierarchies is None else hierarchies
+        self.path = path
+        self.batch_size = batch_size
+        # A conexão é usada pela thread de trabalho da UI; o lock do modelo serializa o acesso
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._pending = []
+        self._lookup = {}
+        self._saved_meta = None
+        try:
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            tables = {name for name, in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if {"facts", "meta"} <= tables:
+                self._load_meta()
+            elif create:
+                self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                self.reset()
+            else:
+                raise ValueError("O banco SQLite não contém um cubo (tabelas facts/meta).")
+        except Exception:
+            self.conn.close()
+            raise
+
+    # ----------------------------------------------------
+    # ---------- Interface do FactStore (escrita) ----------
+    # ----------------------------------------------------
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """Fatos como dicts (implementação de referência e exportação), lidos em blocos."""
+        self.flush()
+        dims = list(self.columns)
+        cursor = self.conn.execute(f"SELECT {', '.join(list(self.columns.values()) + ['valor'])} FROM facts ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            for *codes, valor in rows:
+                fact = {dim: self.dimensions[dim][code] for dim, code in zip(dims, codes) if code is not None}
+                fact["valor"] = valor
+                yield fact
+
+    def append(self, fact):
+        """Adiciona um fato (dict) ao lote pendente; o lote é gravado ao encher ou antes de uma consulta."""
+        valor = float(fact["valor"])
+        codes = {dim: self.encode(dim, value) for dim, value in fact.items() if dim != "valor"}
+        self._pending.append(tuple(codes.get(dim) for dim in self.columns) + (valor,))
+        self._size += 1
+        if len(self._pending) >= self.batch_size:
+            self._insert_pending()
+
+    def extend(self, facts):
+        for fact in facts:
+            self.append(fact)
+
+    def append_columns(self, codes, values):
+        """Anexa fatos em lote a partir de colunas de códigos (ver FactStore.append_columns)."""
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        for dim, column in codes.items():
+            self._ensure_dimension(dim)
+            if len(column) != count:
+                raise ValueError(f"Coluna '{dim}' com {len(column)} linhas, esperado {count}.")
+            if count and (column.min() < MISSING or column.max() >= len(self.dimensions[dim])):
+                raise ValueError(f"Código fora do dicionário da dimensão '{dim}'.")
+
+        self._insert_pending()
+        start = self._size
+        for lo in range(0, count, CHUNK_SIZE):
+            hi = min(lo + CHUNK_SIZE, count)
+            columns = [_sql_codes(codes[dim][lo:hi]) if dim in codes else itertools.repeat(None, hi - lo)
+                       for dim in self.columns]
+            self.conn.executemany(self._insert_sql(), zip(*columns, values[lo:hi].tolist()))
+        self._size += count
+        return start, self._size
+
+    def attach_columns(self, codes, values):
+        """Substitui todo o conteúdo por colunas externas (ex.: np.memmap), copiadas em blocos."""
+        self.reset()
+        self.append_columns({dim: column for dim, column in codes.items() if dim in self.dimensions}, values)
+
+    def reset(self):
+        """Descarta todos os fatos e recria a tabela com uma coluna por dimensão de `dimensions`."""
+        self._pending = []
+        self._lookup = {}
+        self.conn.execute("DROP TABLE IF EXISTS facts")
+        self.columns = {dim: f"d{i}" for i, dim in enumerate(self.dimensions)}
+        columns = "".join(f"{column} INTEGER, " for column in self.columns.values())
+        self.conn.execute(f"CREATE TABLE facts ({columns}valor REAL NOT NULL)")
+        # Índices são criados na primeira consulta: cargas em massa inserem sem mantê-los
+        self._indexed = False
+        self._size = 0
+        self.conn.commit()
+
+    clear = reset
+
+    def reserve(self, size):
+        """Sem efeito: o banco cresce sob demanda (mantido pela interface do FactStore)."""
+
+    def encode(self, dim, value):
+        """Código do valor na dimensão; valores novos estendem o dicionário da dimensão."""
+        lookup = self._ensure_dimension(dim)
+        code = lookup.get(value)
+        if code is None:
+            values = self.dimensions[dim]
+            code = len(values)
+            values.append(value)
+            lookup[value] = code
+        return code
+
+    def lookup(self, dim, value):
+        """Código do valor na dimensão, ou None se ele não existir (não altera o dicionário)."""
+        if dim not in self.dimensions:
+            return None
+        return self._dictionary(dim).get(value)
+
+    def set_dimension(self, name, values):
+        """
+        Define (ou redefine) os valores de uma dimensão. Como no FactStore, valores antigos
+        ainda usados por algum fato ficam ao final da lista; os códigos mudam com um UPDATE.
+        """
+        values = list(dict.fromkeys(values))
+        old_values = self.dimensions.get(name)
+
+        if old_values is None or not self._size:
+            self.dimensions[name] = values
+            self._lookup.pop(name, None)
+            self._ensure_dimension(name)
+            return
+
+        self._insert_pending()
+        self._ensure_dimension(name)
+        column = self._column(name)
+        used = sorted(code for code, in self.conn.execute(
+            f"SELECT DISTINCT {column} FROM facts WHERE {column} IS NOT NULL"))
+        kept = set(values)
+        merged = values + [old_values[c] for c in used if old_values[c] not in kept]
+        new_lookup = {v: i for i, v in enumerate(merged)}
+        remap = [(old, new_lookup[old_values[old]]) for old in used if new_lookup[old_values[old]] != old]
+
+        if remap:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            self.conn.execute("DELETE FROM remap")
+            self.conn.executemany("INSERT INTO remap VALUES (?, ?)", remap)
+            self.conn.execute(f"UPDATE facts SET {column} = (SELECT new FROM remap WHERE old = facts.{column}) "
+                              f"WHERE {column} IN (SELECT old FROM remap)")
+        self.dimensions[name] = merged
+        self._lookup[name] = new_lookup
+        self.conn.commit()
+
+    # ----------------------------------------------------
+    # ---------- Consultas (pushdown) ----------
+    # ----------------------------------------------------
+
+    def group(self, dims, filters, levels, missing=False):
+        """
+        Acumuladores (grupos, somas, contagens) por dimensões base, no formato de
+        aggregation.aggregate_codes, calculados pelo SQLite com WHERE + GROUP BY.
+        Níveis de hierarquia nos filtros viram listas de códigos da dimensão base.
+        Com `missing`, fatos sem valor formam o grupo de código `cardinalidade` (ver
+        OLAPModel._group_rows); sem, ficam de fora. Sem dimensões: o total geral.
+        """
+        self._prepare()
+        where, params = self._where(filters, levels, [] if missing else dims)
+        if where is None:
+            return [np.empty(0, dtype=np.int64) for _ in dims], np.empty(0), np.empty(0, dtype=np.int64)
+
+        columns = [f"COALESCE({self._column(d)}, {len(self.dimensions.get(d, ()))})" if missing else self._column(d)
+                   for d in dims]
+        sql = f"SELECT {', '.join(columns + ['TOTAL(valor)', 'COUNT(*)'])} FROM facts{where}"
+        if dims:
+            positions = ", ".join(str(i + 1) for i in range(len(dims)))
+            sql += f" GROUP BY {positions} ORDER BY {positions}"
+        rows = self.conn.execute(sql, params).fetchall()
+
+        columns = list(zip(*rows)) if rows else [()] * (len(dims) + 2)
+        groups = [np.array(column, dtype=np.int64) for column in columns[:-2]]
+        return groups, np.array(columns[-2], dtype=np.float64), np.array(columns[-1], dtype=np.int64)
+
+    def scan(self, dims, field, filters, levels, chunk_size=CHUNK_SIZE):
+        """
+        Percorre em blocos os fatos filtrados com valor em todas as `dims`: gera
+        (códigos por dimensão, coluna), em que a coluna é "valor" ou os códigos de
+        `field` (MISSING quando ausente). Usado pelas medidas aproximadas (sketches).
+        """
+        self._prepare()
+        where, params = self._where(filters, levels, dims)
+        if where is None:
+            return
+        column = "valor" if field == VALUE_FIELD else f"COALESCE({self._column(field)}, {MISSING})"
+        columns = [self._column(d) for d in dims] + [column]
+        cursor = self.conn.execute(f"SELECT {', '.join(columns)} FROM facts{where}", params)
+        dtype = np.float64 if field == VALUE_FIELD else np.int64
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield [np.array(c, dtype=np.int64) for c in columns[:-1]], np.array(columns[-1], dtype=dtype)
+
+    def count(self, filters, levels):
+        """Número de fatos que satisfazem os filtros."""
+        self._prepare()
+        where, params = self._where(filters, levels, [])
+        if where is None:
+            return 0
+        return self.conn.execute(f"SELECT COUNT(*) FROM facts{where}", params).fetchone()[0]
+
+    def _where(self, filters, levels, dims):
+        """
+        Cláusula WHERE (e parâmetros) dos filtros, mais "IS NOT NULL" nas `dims`.
+        Retorna (None, None) quando nenhum fato pode passar (ex.: valor inexistente).
+        """
+        clauses, params = [], []
+        for dim, spec in filters.items():
+            if dim == VALUE_FIELD:
+                low, high = spec[1:]
+                if low is not None:
+                    clauses.append("valor >= ?")
+                    params.append(low)
+                if high is not None:
+                    clauses.append("valor <= ?")
+                    params.append(high)
+                continue
+
+            op, members = ("in", (spec,)) if not isinstance(spec, tuple) else spec
+            if dim in levels:
+                column = self._column(levels[dim][0])
+                codes = sorted({c for member in members for c in child_codes(levels, dim, member).tolist()})
+            elif dim in self.dimensions:
+                column = self._column(dim)
+                codes = sorted({c for c in (self.lookup(dim, m) for m in members) if c is not None})
+            else:
+                column, codes = None, []
+            # Códigos são inteiros do próprio dicionário: vão literais (sem limite de parâmetros)
+            listed = ", ".join(map(str, codes))
+            if op == "not_in":
+                if codes:
+                    clauses.append(f"({column} IS NULL OR {column} NOT IN ({listed}))")
+            elif codes:
+                clauses.append(f"{column} IN ({listed})")
+            else:
+                return None, None
+        clauses += [f"{self._column(d)} IS NOT NULL" for d in dict.fromkeys(dims)]
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    # ----------------------------------------------------
+    # ---------- Persistência ----------
+    # ----------------------------------------------------
+
+    def flush(self):
+        """Grava o lote pendente e os metadados (dicionários, hierarquias) e confirma a transação."""
+        self._insert_pending()
+        meta = json.dumps({"dimensions": self.dimensions, "columns": self.columns,
+                           "hierarchies": self.hierarchies}, ensure_ascii=False)
+        if meta != self._saved_meta:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('cube', ?)", (meta,))
+            self._saved_meta = meta
+        self.conn.commit()
+
+    def backup(self, path, progress=None):
+        """Copia o banco para `path` (API de backup do SQLite, página a página)."""
+        self.flush()
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            report = (lambda status, remaining, total: progress(total - remaining, total)) if progress else None
+            self.conn.backup(target, pages=4096, progress=report)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+        return self._size
+
+    def export(self, facts, progress=None):
+        """Copia os fatos, em blocos, para outro armazenamento (ex.: FactStore vazio com as mesmas dimensões)."""
+        self.flush()
+        dims = list(self.columns)
+        columns = list(self.columns.values()) + ["valor"]
+        cursor = self.conn.execute(f"SELECT {', '.join(f'COALESCE({c}, {MISSING})' for c in columns[:-1])}"
+                                   f"{', ' if dims else ''}valor FROM facts ORDER BY rowid")
+        facts.reserve(self._size)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            data = list(zip(*rows))
+            facts.append_columns({dim: np.array(data[i], dtype=np.int64) for i, dim in enumerate(dims)},
+                                 np.array(data[-1], dtype=np.float64))
+            if progress:
+                progress(len(facts), self._size)
+        return len(facts)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # ----------------------------------------------------
+    # ---------- Funções Auxiliares ----------
+    # ----------------------------------------------------
+
+    def _load_meta(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'cube'").fetchone()
+        if row is None:
+            raise ValueError("Banco SQLite sem os metadados do cubo.")
+        meta = json.loads(row[0])
+        self.dimensions.clear()
+        self.dimensions.update(meta["dimensions"])
+        self.hierarchies.clear()
+        self.hierarchies.update(meta.get("hierarchies", {}))
+        self.columns = meta["columns"]
+        self._saved_meta = row[0]
+        self._indexed = False
+        self._size = self.conn.execute("SELECT COUNT(*) FROM facts").fetchone()[0]
+
+    def _dictionary(self, dim):
+        """Valor -> código da dimensão (cache reconstruído se a lista de valores mudou)."""
+        values = self.dimensions.get(dim, [])
+        lookup = self._lookup.get(dim)
+        if lookup is None or len(lookup) != len(values):
+            lookup = self._lookup[dim] = {v: i for i, v in enumerate(values)}
+        return lookup
+
+    def _ensure_dimension(self, dim):
+        """Cria a dimensão (dicionário e coluna) se preciso; só nos caminhos de escrita."""
+        self.dimensions.setdefault(dim, [])
+        lookup = self._dictionary(dim)
+        if dim not in self.columns:
+            # Dimensão nova: coluna nova (fatos anteriores ficam NULL); o lote pendente tem a largura antiga
+            self._insert_pending()
+            column = self.columns[dim] = f"d{len(self.columns)}"
+            self.conn.execute(f"ALTER TABLE facts ADD COLUMN {column} INTEGER")
+            if self._indexed:
+                self.conn.execute(f"CREATE INDEX ix_{column} ON facts ({column})")
+        return lookup
+
+    def _column(self, dim):
+        """Coluna SQL da dimensão; sem coluna (dimensão inexistente), NULL: todos os fatos ausentes."""
+        return self.columns.get(dim, "NULL")
+
+    def _insert_sql(self):
+        names = list(self.columns.values()) + ["valor"]
+        return f"INSERT INTO facts ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+
+    def _insert_pending(self):
+        if self._pending:
+            self.conn.executemany(self._insert_sql(), self._pending)
+            self._pending = []
+
+    def _prepare(self):
+        """Antes de uma consulta: grava o lote pendente e cria os índices que faltam (com estatísticas)."""
+        self.flush()
+        if self._indexed:
+            return
+        existing = {name for name, in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        created = False
+        for column in self.columns.values():
+            if f"ix_{column}" not in existing:
+                self.conn.execute(f"CREATE INDEX ix_{column} ON facts ({column})")
+                created = True
+        if created:
+            # Estatísticas para o planejador do SQLite escolher entre índice e varredura
+            self.conn.execute("ANALYZE")
+        self.conn.commit()
+        self._indexed = True
+
+
+def _sql_codes(codes):
+    """Códigos de um bloco como lista Python, com MISSING -> None (NULL)."""
+    codes = np.asarray(codes)
+    values = codes.tolist()
+    if len(codes) and codes.min() == MISSING:
+        values = [None if c == MISSING else c for c in values]
+    return values
@@ -0,0 +1,134 @@
+# test_aggregation.py
+
+"""
+Confere o motor de agregação (memória e SQLite), os GROUPING SETS e os acumuladores
+ativos contra a implementação de referência em Python puro (reference.py).
+
+Execute com: python -m pytest -q
+"""
+
+import random
+
+import pytest
+
+from data_model import SAMPLE_DIMENSIONS, SAMPLE_HIERARCHY, OLAPModel
+from reference import aggregate_python, compare, running_python
+
+MEASURES = ["sum", "avg", "count", "distinct:REGIÃO"]
+
+DIMS = [
+    ["PRODUTO"],
+    ["REGIÃO", "MÊS"],
+    ["PRODUTO", "REGIÃO", "MÊS"],
+    ["TRIMESTRE"],
+    ["PRODUTO", "TRIMESTRE"],
+]
+
+FILTERS = [
+    {},
+    {"PRODUTO": "CAMISA"},
+    {"REGIÃO": ["SUL", "NORTE"]},
+    {"MÊS": {"not_in": ["JAN", "FEV"]}},
+    {"valor": {"min": 100, "max": 300}},
+    {"TRIMESTRE": "T1"},
+    {"PRODUTO": ["CAMISA", "TENIS"], "REGIÃO": {"not_in": ["SUL"]}, "valor": {"min": 150}},
+]
+
+
+def sample_facts(n, seed, dimensions=SAMPLE_DIMENSIONS):
+    """Fatos aleatórios em que parte deles não tem valor em alguma dimensão."""
+    rng = random.Random(seed)
+    facts = []
+    for _ in range(n):
+        fact = {dim: rng.choice(values) for dim, values in dimensions.items() if rng.random() > 0.1}
+        fact["valor"] = round(rng.uniform(50.0, 500.0), 2)
+        facts.append(fact)
+    return facts
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def model(request):
+    model = OLAPModel({}, sample_facts(400, seed=1), {}, backend=request.param)
+    model.add_level(*SAMPLE_HIERARCHY)
+    yield model
+    model.close()
+
+
+def reference(model, dims, measure):
+    return aggregate_python(model.facts, dims, measure, model.filters, model.hierarchies)
+
+
+def assert_matches(answer, expected):
+    (result, error), (want, want_error) = answer, expected
+    assert (result is None) == (want is None), (error, want_error)
+    assert compare(result, want) == []
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("dims", DIMS)
+def test_aggregate_data(model, dims, filters):
+    model.set_filters(filters)
+    for measure in MEASURES:
+        assert_matches(model.aggregate_data(dims, measure), reference(model, dims, measure))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_aggregate_sets(model, filters):
+    model.set_filters(filters)
+    sets = [(), ("PRODUTO",), ("REGIÃO", "MÊS"), ("TRIMESTRE",), ("PRODUTO", "TRIMESTRE")]
+    answers = model.aggregate_sets(sets, MEASURES)
+    for dims in sets:
+        for measure in MEASURES:
+            assert_matches(answers[dims, measure], reference(model, dims, measure))
+
+
+@pytest.mark.parametrize("filters", [{}, {"PRODUTO": "CAMISA"}, {"REGIÃO": ["SUL", "NORTE"]}])
+def test_aggregate_after_appending(model, filters):
+    model.set_filters(filters)
+    for dims in DIMS:
+        model.aggregate_data(dims, "sum")
+
+    # Fatos novos com valores inéditos nas dimensões, um a um e em lote
+    extra = dict(SAMPLE_DIMENSIONS, PRODUTO=SAMPLE_DIMENSIONS["PRODUTO"] + ["MEIA"])
+    for fact in sample_facts(50, seed=2, dimensions=extra):
+        model.add_fact(fact)
+    model.add_facts(sample_facts(200, seed=3, dimensions=dict(extra, REGIÃO=["SUL", "ILHAS"])))
+
+    for dims in DIMS:
+        for measure in ["sum", "avg", "count"]:
+            assert_matches(model.aggregate_data(dims, measure), reference(model, dims, measure))
+
+
+def test_unknown_dimension(model):
+    dimensions = list(model.dimensions)
+    assert_matches(model.aggregate_data(["NOPE"], "sum"), reference(model, ["NOPE"], "sum"))
+    assert list(model.dimensions) == dimensions
+
+
+@pytest.mark.parametrize("cardinalities", [(4, 3, 2), (1000, 100, 40)])
+def test_running_aggregates(cardinalities):
+    # Cardinalidades altas perto do número de fatos: acumuladores esparsos
+    model = OLAPModel({}, [], {})
+    model.generate_data(600, dict(zip("ABC", cardinalities)), seed=4)
+    values = {dim: list(members) for dim, members in model.dimensions.items()}
+    queries = [(["A"], {}), (["A", "B"], {}), (["A", "B", "C"], {}), (["B", "C"], {"A": values["A"][0]})]
+    for dims, filters in queries:
+        model.set_filters(filters)
+        model.aggregate_data(dims, "sum")
+    assert len(model.running) == len(queries)
+
+    extra = dict(values, A=values["A"] + ["A_NOVO"], C=values["C"] + ["C_NOVO"])
+    for fact in sample_facts(100, seed=5, dimensions=extra):
+        model.add_fact(fact)
+    model.add_facts(sample_facts(300, seed=6, dimensions=extra))
+
+    for running in model.running:
+        groups, sums, counts = running.snapshot()
+        keys = zip(*([model.dimensions[d][c] for c in codes.tolist()] for d, codes in zip(running.dims, groups)))
+        incremental = {k: (s, c) for k, s, c in zip(keys, sums.tolist(), counts.tolist())}
+        assert compare(incremental, running_python(model.facts, running)) == []
+
+    for dims, filters in queries:
+        model.set_filters(filters)
+        for measure in ["sum", "avg", "count"]:
+            assert_matches(model.aggregate_data(dims, measure), reference(model, dims, measure))
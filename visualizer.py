@@ -1,171 +1,278 @@
 # visualizer.py
 
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import matplotlib
 import numpy as np
-import matplotlib.cm as cm 
-import matplotlib.colors as colors 
+
+from predicates import describe
+
+# Acima destes tamanhos os valores não são escritos em cada barra/célula/ponto:
+# o custo de desenho cresce com o número de textos e eles ficariam ilegíveis
+ANNOTATE_MAX_BARS = 60
+ANNOTATE_MAX_CELLS = 625
+ANNOTATE_MAX_POINTS = 150
+# Máximo de rótulos por eixo; acima disso só um a cada k valores é rotulado
+MAX_TICK_LABELS = 40
+
+# Janela única reaproveitada entre consultas (tamanho por número de dimensões)
+FIGURE_NUM = "Resultado OLAP"
+FIGURE_SIZES = {1: (10, 7), 2: (12, 9), 3: (14, 10)}
+
+# Pesos da luminância (Rec. 601) para escolher texto preto/branco sobre a cor da célula
+_LUMA = np.array([0.299, 0.587, 0.114])
+
+_chart = None
+
 
 def visualize_result(dims, result, measure, filters=None):
     """
     Cria e exibe o gráfico (1D, 2D ou 3D) a partir do resultado da agregação.
-    
+    A figura é reaproveitada entre chamadas (não é fechada e recriada a cada consulta)
+    e consultas de mesmo formato só atualizam os artistas existentes.
+
     Args:
         dims (list): Lista de nomes das dimensões usadas na agregação.
         result (dict): Dicionário com os resultados da agregação.
         measure (str): A medida calculada (e.g., 'sum', 'avg', 'count').
         filters (dict, optional): Dicionário de filtros ativos, para incluir no título.
     """
+    global _chart
+    # pyplot (e o backend de janela) só é carregado por quem exibe a janela avulsa
+    import matplotlib.pyplot as plt
 
-    plt.close('all') 
+    fig = plt.figure(num=FIGURE_NUM)
+    if _chart is None or _chart.figure is not fig:
+        _chart = ResultChart(fig)
+    if len(dims) in FIGURE_SIZES:
+        fig.set_size_inches(FIGURE_SIZES[len(dims)], forward=True)
+    _chart.update(dims, result, measure, filters)
+    plt.show()
 
-    # Base para o título, pode ser estendido com filtros
-    title_base = f"{measure.upper()} por {', '.join(dims)}"
-    if filters and any(filters.values()):
-        filter_str = ', '.join([f"{d}: {v}" for d, v in filters.items() if v != "TODOS"])
-        if filter_str:
-            title_base += f"\n(Filtros: {filter_str})"
 
-    # --- 1D Plot: Gráfico de Barras ---
-    if len(dims) == 1:
-        labels = [str(k) if isinstance(k, tuple) else k for k in result.keys()]
-        values = list(result.values())
+class ResultChart:
+    """
+    Desenha resultados de agregação sempre na mesma figura Matplotlib.
+
+    `update` reaproveita os artistas quando a consulta tem o mesmo formato da anterior
+    (mesmas dimensões e mesmos valores nos eixos): só alturas das barras, dados da
+    imagem, cores/tamanhos dos pontos e textos mudam. Caso contrário a figura é refeita.
+    """
 
-        fig, ax = plt.subplots(figsize=(10, 7))
-        
-        colors = plt.cm.viridis(np.linspace(0, 1, len(labels))) 
-        bars = ax.bar(labels, values, color=colors)
+    def __init__(self, figure):
+        self.figure = figure
+        self._shape = None
+        self._artists = {}
 
-        ax.set_title(title_base, fontsize=16, fontweight='bold', pad=20)
+    def update(self, dims, result, measure, filters=None):
+        """Atualiza o gráfico; retorna True se foi feito no lugar (sem recriar os artistas)."""
+        shape = (tuple(dims), tuple(result.keys()))
+        if shape != self._shape or not self._artists:
+            self.draw(dims, result, measure, filters)
+            return False
+
+        values = np.fromiter(result.values(), dtype=np.float64, count=len(result))
+        artists = self._artists
+        artists["title"].set_text(_title(dims, measure, filters))
+        if "label" in artists:
+            artists["label"].set_text(_measure_label(measure, len(dims)))
+        if len(dims) == 1:
+            self._update_bars(values)
+        elif len(dims) == 2:
+            self._update_heatmap(values)
+        else:
+            self._update_scatter(values)
+        return True
+
+    def draw(self, dims, result, measure, filters=None):
+        """Refaz a figura inteira para o resultado."""
+        self.figure.clf()
+        self._artists = {}
+        self._shape = (tuple(dims), tuple(result.keys()))
+        title = _title(dims, measure, filters)
+
+        # --- 1D Plot: Gráfico de Barras ---
+        if len(dims) == 1:
+            self._draw_bars(dims, result, measure, title)
+        # --- 2D Plot: Mapa de Calor (Heatmap) ---
+        elif len(dims) == 2:
+            self._draw_heatmap(dims, result, measure, title)
+        # --- 3D Plot: Gráfico de Dispersão 3D ---
+        elif len(dims) == 3:
+            self._draw_scatter(dims, result, measure, title)
+        self.figure.tight_layout()
+
+    def _draw_bars(self, dims, result, measure, title):
+        labels = [k[0] if isinstance(k, tuple) and len(k) == 1 else k for k in result.keys()]
+        values = np.fromiter(result.values(), dtype=np.float64, count=len(result))
+
+        ax = self.figure.add_subplot(111)
+        positions = np.arange(len(labels))
+        bars = ax.bar(positions, values, color=matplotlib.colormaps["viridis"](np.linspace(0, 1, len(labels))))
+
+        self._artists.update(ax=ax, bars=bars, bar_labels=[],
+                             title=ax.set_title(title, fontsize=16, fontweight='bold', pad=20),
+                             label=ax.set_ylabel(_measure_label(measure, 1), fontsize=13, labelpad=10))
         ax.set_xlabel(dims[0], fontsize=13, labelpad=10)
-        ax.set_ylabel(measure.upper(), fontsize=13, labelpad=10)
-        
-        ax.tick_params(axis='x', rotation=45, ha='right', labelsize=10)
+
+        _set_ticks(ax.xaxis, labels, rotation=45, ha='right', fontsize=10)
         ax.tick_params(axis='y', labelsize=10)
-        
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:,.2f}',
-                        xy=(bar.get_x() + bar.get_width() / 2, height),
-                        xytext=(0, 3), 
-                        textcoords="offset points",
-                        ha='center', va='bottom',
-                        fontsize=9, color='gray')
-
-        plt.grid(axis='y', linestyle='--', alpha=0.7) 
-        plt.tight_layout()
-        plt.show()
-        
-    # --- 2D Plot: Mapa de Calor (Heatmap) ---
-    elif len(dims) == 2:
-        dim0_values = sorted(list({k[0] for k in result.keys()}))
-        dim1_values = sorted(list({k[1] for k in result.keys()}))
-        
+        self._label_bars(values)
+
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    def _update_bars(self, values):
+        ax = self._artists["ax"]
+        for bar, height in zip(self._artists["bars"], values.tolist()):
+            bar.set_height(height)
+        ax.relim()
+        ax.autoscale_view()
+        self._label_bars(values)
+
+    def _label_bars(self, values):
+        for label in self._artists["bar_labels"]:
+            label.remove()
+        self._artists["bar_labels"] = []
+        if len(values) <= ANNOTATE_MAX_BARS:
+            self._artists["bar_labels"] = self._artists["ax"].bar_label(
+                self._artists["bars"], labels=[f'{v:,.2f}' for v in values.tolist()],
+                padding=3, fontsize=9, color='gray')
+
+    def _draw_heatmap(self, dims, result, measure, title):
+        keys = list(result.keys())
+        dim0_values, rows = _axis_positions(keys, 0)
+        dim1_values, cols = _axis_positions(keys, 1)
+
+        # Matriz preenchida de uma vez (combinações ausentes ficam 0)
         data_matrix = np.zeros((len(dim0_values), len(dim1_values)))
-        for i, val0 in enumerate(dim0_values):
-            for j, val1 in enumerate(dim1_values):
-                data_matrix[i, j] = result.get((val0, val1), 0) 
-
-        fig, ax = plt.subplots(figsize=(12, 9)) 
-        
-        # ALTERAÇÃO PRINCIPAL: Trocado para 'magma'
-        cmap = 'magma' 
-        im = ax.imshow(data_matrix, cmap=cmap, aspect='auto', origin='lower') 
-        
+        data_matrix[rows, cols] = np.fromiter(result.values(), dtype=np.float64, count=len(keys))
+
+        ax = self.figure.add_subplot(111)
+        im = ax.imshow(data_matrix, cmap='magma', aspect='auto', origin='lower')
+
         # Rótulos dos eixos
-        ax.set_xticks(np.arange(len(dim1_values)))
-        ax.set_yticks(np.arange(len(dim0_values)))
-        ax.set_xticklabels(dim1_values, rotation=45, ha='right', fontsize=10)
-        ax.set_yticklabels(dim0_values, fontsize=10)
-        
+        _set_ticks(ax.xaxis, dim1_values, rotation=45, ha='right', fontsize=10)
+        _set_ticks(ax.yaxis, dim0_values, fontsize=10)
+
         ax.set_xlabel(dims[1], fontsize=13, labelpad=10)
         ax.set_ylabel(dims[0], fontsize=13, labelpad=10)
-        ax.set_title(title_base, fontsize=16, fontweight='bold', pad=20)
-        
-        # Lógica de Contraste (Mantida, pois é essencial para UX)
-        cmap_obj = cm.get_cmap(cmap)
-        
-        for i in range(len(dim0_values)):
-            for j in range(len(dim1_values)):
-                value = data_matrix[i, j]
-                
-                norm_value = (value - data_matrix.min()) / (data_matrix.max() - data_matrix.min() + 1e-9)
-                
-                rgb_color = cmap_obj(norm_value)[:3] 
-                
-                # Calcula a luminância para escolher a cor do texto
-                luminance = np.dot(rgb_color, [0.299, 0.587, 0.114])
-                
-                text_color = "black" if luminance > 0.5 else "white" 
-                
-                # Adicionar valores nas células (negrito e contraste)
-                ax.text(j, i, f'{value:,.0f}',
-                        ha="center", va="center", color=text_color, fontsize=10, fontweight='bold')
-
-        cbar = fig.colorbar(im, ax=ax, shrink=0.7, pad=0.02)
-        cbar.set_label(f"{measure.upper()} da Medida", rotation=-90, labelpad=15, fontsize=12)
-        
-        plt.tight_layout()
-        plt.show()
-            
-    # --- 3D Plot: Gráfico de Dispersão 3D ---
-    elif len(dims) == 3:
-        fig = plt.figure(figsize=(14, 10)) 
-        ax = fig.add_subplot(111, projection='3d')
-        
-        dim1_values = sorted(list({k[0] for k in result.keys()}))
-        dim2_values = sorted(list({k[1] for k in result.keys()}))
-        dim3_values = sorted(list({k[2] for k in result.keys()}))
-
-        dim1_map = {v: i for i, v in enumerate(dim1_values)}
-        dim2_map = {v: i for i, v in enumerate(dim2_values)}
-        dim3_map = {v: i for i, v in enumerate(dim3_values)}
-
-        xs, ys, zs, vals = [], [], [], []
-        for (a,b,c), v in result.items():
-            xs.append(dim1_map[a])
-            ys.append(dim2_map[b])
-            zs.append(dim3_map[c])
-            vals.append(v)
-        
-        vals_array = np.array(vals)
-        
-        if vals:
-            norm_vals = (vals_array - vals_array.min()) / (vals_array.max() - vals_array.min() + 1e-9)
-            point_sizes = 100 + norm_vals * 400 
-            
-            scatter = ax.scatter(xs, ys, zs, 
-                                 s=point_sizes,       
-                                 c=vals_array,        
-                                 cmap='plasma',       
-                                 alpha=0.8,           
-                                 marker='o',          
-                                 edgecolors='w',      
+
+        texts = None
+        if data_matrix.size <= ANNOTATE_MAX_CELLS:
+            texts = np.empty(data_matrix.shape, dtype=object)
+            for (i, j), value in np.ndenumerate(data_matrix):
+                texts[i, j] = ax.text(j, i, f'{value:,.0f}', ha="center", va="center",
+                                      fontsize=10, fontweight='bold')
+
+        cbar = self.figure.colorbar(im, ax=ax, shrink=0.7, pad=0.02)
+        cbar.set_label(_measure_label(measure, 2), rotation=-90, labelpad=15, fontsize=12)
+        self._artists.update(image=im, matrix=data_matrix, cells=(rows, cols), texts=texts,
+                             title=ax.set_title(title, fontsize=16, fontweight='bold', pad=20),
+                             label=cbar.ax.yaxis.label)
+        self._color_cells()
+
+    def _update_heatmap(self, values):
+        matrix = self._artists["matrix"]
+        matrix[self._artists["cells"]] = values
+        image = self._artists["image"]
+        image.set_data(matrix)
+        # Nova escala de cores; a barra de cores acompanha a imagem
+        image.autoscale()
+        self._color_cells()
+
+    def _color_cells(self):
+        texts = self._artists["texts"]
+        if texts is None:
+            return
+        # Contraste: normalização e luminância calculadas para a matriz inteira de uma vez
+        image, matrix = self._artists["image"], self._artists["matrix"]
+        rgba = image.cmap(image.norm(matrix))
+        dark = rgba[..., :3] @ _LUMA <= 0.5
+        for (i, j), value in np.ndenumerate(matrix):
+            texts[i, j].set_text(f'{value:,.0f}')
+            texts[i, j].set_color("white" if dark[i, j] else "black")
+
+    def _draw_scatter(self, dims, result, measure, title):
+        # A projeção '3d' (mpl_toolkits.mplot3d) é carregada pelo Matplotlib no primeiro uso
+        ax = self.figure.add_subplot(111, projection='3d')
+
+        keys = list(result.keys())
+        dim1_values, xs = _axis_positions(keys, 0)
+        dim2_values, ys = _axis_positions(keys, 1)
+        dim3_values, zs = _axis_positions(keys, 2)
+        vals_array = np.fromiter(result.values(), dtype=np.float64, count=len(keys))
+
+        if len(vals_array):
+            scatter = ax.scatter(xs, ys, zs,
+                                 s=_point_sizes(vals_array),
+                                 c=vals_array,
+                                 cmap='plasma',
+                                 alpha=0.8,
+                                 marker='o',
+                                 edgecolors='w',
                                  linewidth=0.5)
 
-            cbar = fig.colorbar(scatter, shrink=0.6, aspect=20, pad=0.08) 
-            cbar.set_label(f"{measure.upper()} da Medida", rotation=-90, labelpad=18, fontsize=12)
+            cbar = self.figure.colorbar(scatter, shrink=0.6, aspect=20, pad=0.08)
+            cbar.set_label(_measure_label(measure, 3), rotation=-90, labelpad=18, fontsize=12)
+            self._artists.update(scatter=scatter, label=cbar.ax.yaxis.label)
+
+        self._artists["title"] = ax.set_title(title, fontsize=16, fontweight='bold', pad=30)
 
-        ax.set_title(title_base, fontsize=16, fontweight='bold', pad=30) 
-        
         ax.set_xlabel(f"{dims[0]}", fontsize=13, labelpad=15)
         ax.set_ylabel(f"{dims[1]}", fontsize=13, labelpad=15)
-        ax.set_zlabel(f"{dims[2]}", fontsize=13, labelpad=15) 
-        
-        ax.set_xticks(list(dim1_map.values()))
-        ax.set_xticklabels(dim1_values, rotation=20, ha='right', fontsize=9) 
-        
-        ax.set_yticks(list(dim2_map.values()))
-        ax.set_yticklabels(dim2_values, rotation=-20, ha='left', fontsize=9) 
-        
-        ax.set_zticks(list(dim3_map.values()))
-        ax.set_zticklabels(dim3_values, rotation=90, va='center', fontsize=9)
-
-        if vals:
-            for x, y, z, v in zip(xs, ys, zs, vals):
-                ax.text(x, y, z + 0.1, f'{v:,.0f}', color='black', size=8, ha='center', va='bottom', weight='bold') 
-        
-        ax.view_init(elev=20, azim=-60) 
-        
-        plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        ax.set_zlabel(f"{dims[2]}", fontsize=13, labelpad=15)
+
+        _set_ticks(ax.xaxis, dim1_values, rotation=20, ha='right', fontsize=9)
+        _set_ticks(ax.yaxis, dim2_values, rotation=-20, ha='left', fontsize=9)
+        _set_ticks(ax.zaxis, dim3_values, rotation=90, va='center', fontsize=9)
+
+        self._artists["texts"] = []
+        if 0 < len(vals_array) <= ANNOTATE_MAX_POINTS:
+            self._artists["texts"] = [
+                ax.text(x, y, z + 0.1, f'{v:,.0f}', color='black', size=8, ha='center', va='bottom', weight='bold')
+                for x, y, z, v in zip(xs.tolist(), ys.tolist(), zs.tolist(), vals_array.tolist())]
+
+        ax.view_init(elev=20, azim=-60)
+
+    def _update_scatter(self, values):
+        scatter = self._artists.get("scatter")
+        if scatter is None:
+            return
+        # Mesmos pontos (mesmas chaves): só cor, tamanho e textos mudam
+        scatter.set_array(values)
+        scatter.set_sizes(_point_sizes(values))
+        scatter.autoscale()
+        for text, v in zip(self._artists["texts"], values.tolist()):
+            text.set_text(f'{v:,.0f}')
+
+
+def _title(dims, measure, filters):
+    # Base para o título, pode ser estendido com filtros
+    title_base = f"{measure.upper()} por {', '.join(dims)}"
+    if filters and any(filters.values()):
+        filter_str = ', '.join([describe(d, v) for d, v in filters.items() if v != "TODOS"])
+        if filter_str:
+            title_base += f"\n(Filtros: {filter_str})"
+    return title_base
+
+
+def _measure_label(measure, ndims):
+    return measure.upper() if ndims == 1 else f"{measure.upper()} da Medida"
+
+
+def _point_sizes(values):
+    norm_vals = (values - values.min()) / (values.max() - values.min() + 1e-9)
+    return 100 + norm_vals * 400
+
+
+def _axis_positions(keys, position):
+    """Valores distintos (ordenados) de uma posição das chaves e o índice de cada chave neles."""
+    column = [k[position] for k in keys]
+    labels = sorted(set(column))
+    index = {v: i for i, v in enumerate(labels)}
+    return labels, np.fromiter((index[v] for v in column), dtype=np.intp, count=len(column))
+
+
+def _set_ticks(axis, labels, **text_kwargs):
+    """Rótulos do eixo, no máximo MAX_TICK_LABELS (um a cada k valores quando há mais)."""
+    step = max(1, -(-len(labels) // MAX_TICK_LABELS))
+    positions = list(range(0, len(labels), step))
+    axis.set_ticks(positions, [str(labels[p]) for p in positions], **text_kwargs)